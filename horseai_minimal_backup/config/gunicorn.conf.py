@@ -0,0 +1,10 @@
+# Запуск: gunicorn -c config/gunicorn.conf.py config.wsgi:application
+import os
+
+bind = os.environ.get('HORSEAI_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('HORSEAI_WORKERS', 8))
+timeout = 600
+
+# Приложение и модель загружаются в мастере до fork (config/wsgi.py),
+# воркеры делят страницы модели по copy-on-write
+preload_app = True
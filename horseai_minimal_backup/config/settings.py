@@ -163,3 +163,12 @@ VIDEO_PROCESSING = {
     'OUTPUT_PRESET': 'fast',
     'OUTPUT_CRF': 23,
 }
+
+# Кэш предсказаний хромоты (web/prediction_cache.py)
+# BACKEND - алиас из CACHES для общего кэша всех воркеров (None - только память процесса)
+PREDICTION_CACHE = {
+    'MAX_SIZE': 1024,   # 0 - отключить кэш
+    'TTL': 3600,        # секунд
+    'DECIMALS': 6,      # округление признаков в ключе
+    'BACKEND': None,
+}
@@ -4,3 +4,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Модель загружается до fork воркеров (gunicorn --preload, uwsgi без lazy-apps),
+# чтобы воркеры делили ее страницы памяти
+if os.environ.get('HORSEAI_PRELOAD_MODEL', '1') == '1':
+    from web.model_registry import preload_models
+    preload_models()
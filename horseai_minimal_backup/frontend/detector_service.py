@@ -10,6 +10,8 @@ import time
 from pathlib import Path
 import re
 
+from web.inference_daemon import DaemonUnavailable, analyze_video as analyze_in_daemon, daemon_enabled
+
 class DetectorService:
     """Сервис для работы с детектором хромоты"""
     
@@ -30,6 +32,24 @@ class DetectorService:
                 'success': False,
                 'error': f'Файл не найден: {video_path}'
             }
+
+        if daemon_enabled():
+            try:
+                start_time = time.time()
+                result = analyze_in_daemon(video_path, video_id=animal_id)
+                print(f"✅ Демон завершил анализ за {time.time() - start_time:.1f} сек")
+                return {
+                    'success': True,
+                    'data': result,
+                    'processing_time': time.time() - start_time,
+                    'detector': 'daemon'
+                }
+            except DaemonUnavailable as e:
+                print(f"⚠️  Демон недоступен ({e}), запуск детектора отдельным процессом")
+            except TimeoutError:
+                return {'success': False, 'error': 'Таймаут анализа (10 минут)'}
+            except RuntimeError as e:
+                return {'success': False, 'error': str(e), 'detector': 'daemon'}
         
         # Создаем временную директорию
         with tempfile.TemporaryDirectory() as tmpdir:
@@ -1,19 +1,40 @@
 import numpy as np
-from collections import Counter
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
 import math
+import os
 
 class MyDecisionTree:
-    def __init__(self, max_depth=None, min_samples_split=2, max_features=None):
+    def __init__(self, max_depth=None, min_samples_split=2, max_features=None, max_bins=None):
         self.max_depth = max_depth
         self.min_samples_split = min_samples_split
         self.max_features = max_features
+        # max_bins: искать порог только среди max_bins квантилей признака (для больших выборок)
+        self.max_bins = max_bins
         self.tree = None
     
-    def fit(self, X, y):
+    def __getstate__(self):
+        # Плоская форма - кэш: в pickle не попадает и собирается при первом predict
+        state = self.__dict__.copy()
+        state.pop('_compiled', None)
+        state.pop('_rng', None)
+        return state
+    
+    def fit(self, X, y, rng=None):
+        # rng: np.random.Generator для выбора признаков; без него - глобальный np.random
         if self.max_features is None:
             self.max_features = int(math.sqrt(X.shape[1]))
         
-        self.tree = self._build_tree(X, y, depth=0)
+        self._bin_edges = None
+        if getattr(self, 'max_bins', None):
+            self._bin_edges = [_quantile_edges(X[:, f], self.max_bins) for f in range(X.shape[1])]
+        
+        self._rng = rng
+        try:
+            self.tree = self._build_tree(X, y, depth=0)
+        finally:
+            self._rng = None
     
     def _gini_impurity(self, y):
         if len(y) == 0:
@@ -26,13 +47,22 @@ class MyDecisionTree:
         return impurity
     
     def _best_split(self, X, y):
+        n_features = X.shape[1]
+        rng = getattr(self, '_rng', None)
+        if rng is None:
+            rng = np.random
+        features = rng.choice(n_features, self.max_features, replace=False)
+        
+        if getattr(self, '_bin_edges', None) is not None:
+            return self._binned_split(X, y, features)
+        return self._sorted_split(X, y, features)
+    
+    def _exhaustive_split(self, X, y, features):
+        # Исходный перебор всех порогов, O(n^2) на признак; эталон для _sorted_split
         best_gain = 0
         best_feature = None
         best_threshold = None
         
-        n_features = X.shape[1]
-        features = np.random.choice(n_features, self.max_features, replace=False)
-        
         for feature_idx in features:
             feature_values = X[:, feature_idx]
             unique_values = np.unique(feature_values)
@@ -62,6 +92,108 @@ class MyDecisionTree:
         
         return best_feature, best_threshold, best_gain
     
+    def _sorted_split(self, X, y, features):
+        # Тот же результат, что _exhaustive_split: признак сортируется один раз,
+        # счетчики классов слева и справа от каждого порога - префиксные суммы
+        classes, y_codes = np.unique(y, return_inverse=True)
+        n_classes = len(classes)
+        positions = np.arange(len(y))
+        
+        parent_first = np.full((1, n_classes), np.inf)
+        np.minimum.at(parent_first[0], y_codes, positions)
+        parent_counts = np.bincount(y_codes, minlength=n_classes)[None]
+        gini_parent = _gini_rows(parent_counts, parent_first, np.array([len(y)]))[0]
+        
+        best_gain = 0
+        best_feature = None
+        best_threshold = None
+        
+        for feature_idx in features:
+            feature_values = X[:, feature_idx]
+            known = ~np.isnan(feature_values)
+            # NaN не попадает ни влево (<=), ни вправо (>)
+            order = np.argsort(feature_values[known], kind='stable')
+            values = feature_values[known][order]
+            codes = y_codes[known][order]
+            rows = positions[known][order]
+            n = len(values)
+            if n < 2:
+                continue
+            
+            # Последний элемент каждой группы одинаковых значений - кандидат в пороги
+            ends = np.flatnonzero(np.diff(values))
+            if len(ends) == 0:
+                continue
+            
+            onehot = codes[:, None] == np.arange(n_classes)
+            left_counts = np.cumsum(onehot, axis=0)[ends]
+            right_counts = np.bincount(codes, minlength=n_classes) - left_counts
+            
+            # Порядок первого появления классов, как в Counter
+            appearance = np.where(onehot, rows[:, None], np.inf)
+            left_first = np.minimum.accumulate(appearance, axis=0)[ends]
+            right_first = np.minimum.accumulate(appearance[::-1], axis=0)[::-1][ends + 1]
+            
+            n_left = ends + 1
+            n_right = n - n_left
+            gini_left = _gini_rows(left_counts, left_first, n_left)
+            gini_right = _gini_rows(right_counts, right_first, n_right)
+            
+            gini_children = (n_left / n) * gini_left + (n_right / n) * gini_right
+            gain = gini_parent - gini_children
+            
+            j = int(np.argmax(gain))
+            if gain[j] > best_gain:
+                best_gain = gain[j]
+                best_feature = feature_idx
+                best_threshold = values[ends[j]]
+        
+        return best_feature, best_threshold, best_gain
+    
+    def _binned_split(self, X, y, features):
+        # Приближенный поиск: пороги - квантили признака из fit, счетчики - гистограммы
+        classes, y_codes = np.unique(y, return_inverse=True)
+        n_classes = len(classes)
+        gini_parent = self._gini_impurity(y)
+        
+        best_gain = 0
+        best_feature = None
+        best_threshold = None
+        
+        for feature_idx in features:
+            edges = self._bin_edges[feature_idx]
+            feature_values = X[:, feature_idx]
+            known = ~np.isnan(feature_values)
+            n = int(known.sum())
+            if n < 2 or len(edges) == 0:
+                continue
+            
+            bins = np.searchsorted(edges, feature_values[known], side='left')
+            hist = np.bincount(bins * n_classes + y_codes[known],
+                               minlength=(len(edges) + 1) * n_classes).reshape(-1, n_classes)
+            left_counts = np.cumsum(hist, axis=0)[:len(edges)]
+            right_counts = left_counts[-1] + hist[-1] - left_counts
+            n_left = left_counts.sum(axis=1)
+            n_right = n - n_left
+            
+            valid = (n_left > 0) & (n_right > 0)
+            if not valid.any():
+                continue
+            
+            with np.errstate(divide='ignore', invalid='ignore'):
+                gini_left = 1 - ((left_counts / n_left[:, None]) ** 2).sum(axis=1)
+                gini_right = 1 - ((right_counts / n_right[:, None]) ** 2).sum(axis=1)
+                gain = gini_parent - ((n_left / n) * gini_left + (n_right / n) * gini_right)
+            gain = np.where(valid, gain, -np.inf)
+            
+            j = int(np.argmax(gain))
+            if gain[j] > best_gain:
+                best_gain = gain[j]
+                best_feature = feature_idx
+                best_threshold = edges[j]
+        
+        return best_feature, best_threshold, best_gain
+    
     def _build_tree(self, X, y, depth):
         if (len(np.unique(y)) == 1 or 
             len(y) < self.min_samples_split or
@@ -96,9 +228,344 @@ class MyDecisionTree:
         else:
             return self._predict_single(x, tree['right'])
     
+    def compiled(self):
+        # Плоская форма дерева, пересобирается после fit
+        compiled = getattr(self, '_compiled', None)
+        if compiled is None or compiled[0] is not self.tree:
+            compiled = (self.tree, CompiledTree.from_dict(self.tree))
+            self._compiled = compiled
+        return compiled[1]
+    
     def predict(self, X):
-        return np.array([self._predict_single(x, self.tree) for x in X])
+        return self.compiled().predict(np.asarray(X))
     
     def _predict_proba_single(self, x, tree):
         if not isinstance(tree, dict):
-            return {0: 0.0, 1: 1.0} if tree == 1
+            return {0: 0.0, 1: 1.0} if tree == 1 else {0: 1.0, 1: 0.0}
+        
+        feature_val = x[tree['feature']]
+        if feature_val <= tree['threshold']:
+            return self._predict_proba_single(x, tree['left'])
+        else:
+            return self._predict_proba_single(x, tree['right'])
+    
+    def predict_proba(self, X):
+        return self.compiled().predict_proba(np.asarray(X))
+
+
+class MyRandomForest:
+    """Случайный лес из MyDecisionTree
+
+    Каждое дерево получает свой генератор из SeedSequence(random_state): по
+    нему строится бутстреп-выборка и выбираются признаки в узлах. Поэтому лес не
+    зависит от n_jobs и порядка завершения процессов. При n_jobs > 1 деревья
+    обучаются в пуле процессов, X и y передаются через общую память.
+
+    n_jobs: число процессов; None и 0 - один процесс, -1 - все ядра,
+    -2 - все, кроме одного (как в sklearn).
+    """
+
+    def __init__(self, n_estimators=100, max_depth=None, min_samples_split=2, max_features=None,
+                 max_bins=None, n_jobs=1, random_state=0):
+        self.n_estimators = n_estimators
+        self.max_depth = max_depth
+        self.min_samples_split = min_samples_split
+        self.max_features = max_features
+        self.max_bins = max_bins
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.trees = []
+
+    def __getstate__(self):
+        # Скомпилированный лес - кэш, в model.pkl не сохраняется
+        state = self.__dict__.copy()
+        state.pop('_compiled', None)
+        state.pop('_chunks', None)
+        return state
+
+    def _tree_params(self):
+        return {'max_depth': self.max_depth, 'min_samples_split': self.min_samples_split,
+                'max_features': self.max_features, 'max_bins': self.max_bins}
+
+    def _n_workers(self, n_tasks):
+        n_jobs = self.n_jobs or 1
+        if n_jobs < 0:
+            # Как в sklearn: -1 - все ядра, -2 - все, кроме одного
+            n_jobs = (os.cpu_count() or 1) + 1 + n_jobs
+        return max(1, min(n_jobs, n_tasks))
+
+    def fit(self, X, y):
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        y = np.ascontiguousarray(y)
+        seeds = np.random.SeedSequence(self.random_state).spawn(self.n_estimators)
+        params = self._tree_params()
+        self._compiled = None
+        self._chunks = None
+
+        n_workers = self._n_workers(self.n_estimators)
+        if n_workers == 1:
+            self.trees = [_fit_forest_tree(X, y, params, seed) for seed in seeds]
+            return self
+
+        blocks = [_to_shared(X), _to_shared(y)]
+        try:
+            specs = [(block.name, array.shape, array.dtype.str) for block, array in zip(blocks, (X, y))]
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_attach_shared,
+                                     initargs=(specs,)) as pool:
+                self.trees = list(pool.map(_fit_shared_tree, [params] * len(seeds), seeds))
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+        return self
+
+    def compiled(self):
+        compiled = getattr(self, '_compiled', None)
+        trees = tuple(tree.tree for tree in self.trees)
+        if compiled is None or len(compiled[0]) != len(trees) or \
+                any(a is not b for a, b in zip(compiled[0], trees)):
+            compiled = (trees, [tree.compiled() for tree in self.trees])
+            self._compiled = compiled
+        return compiled[1]
+
+    def _forest_chunks(self):
+        # Части леса для потоков собираются один раз на обученный лес
+        trees = self.compiled()
+        n_workers = self._n_workers(len(trees))
+        cached = getattr(self, '_chunks', None)
+        if cached is None or cached[0] is not trees or cached[1] != n_workers:
+            chunks = [CompiledForest.from_trees(part)
+                      for part in np.array_split(np.array(trees, dtype=object), n_workers) if len(part)]
+            cached = (trees, n_workers, chunks)
+            self._chunks = cached
+        return cached[2]
+
+    def leaf_values(self, X):
+        """Предсказания всех деревьев (n_samples x n_trees), деревья делятся между потоками"""
+        X = np.asarray(X, dtype=np.float64)
+        chunks = self._forest_chunks()
+        if len(chunks) == 1:
+            return chunks[0].leaf_values(X)
+        with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+            return np.hstack(list(pool.map(lambda forest: forest.leaf_values(X), chunks)))
+
+    def predict_proba(self, X):
+        p = (self.leaf_values(X) == 1).mean(axis=1)
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X):
+        # Голосование деревьев; при равенстве - класс, встретившийся первым (как Counter)
+        votes = self.leaf_values(X)
+        classes = np.unique(votes)
+        matches = votes[:, :, None] == classes
+        counts = matches.sum(axis=1)
+        first = np.where(matches.any(axis=1), matches.argmax(axis=1), votes.shape[1])
+        best = counts == counts.max(axis=1, keepdims=True)
+        return classes[np.argmin(np.where(best, first, votes.shape[1] + 1), axis=1)]
+
+
+def _fit_forest_tree(X, y, params, seed):
+    # Бутстреп и случайные признаки дерева зависят только от его SeedSequence
+    rng = np.random.default_rng(seed)
+    sample = rng.integers(0, len(X), len(X))
+    tree = MyDecisionTree(**params)
+    tree.fit(X[sample], y[sample], rng=rng)
+    return tree
+
+
+def _to_shared(array):
+    block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return block
+
+
+_shared_arrays = None
+
+
+def _attach_shared(specs):
+    # Инициализация процесса пула: X и y - представления общей памяти без копирования
+    global _shared_arrays
+    blocks = [shared_memory.SharedMemory(name=name) for name, _, _ in specs]
+    arrays = [np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+              for block, (_, shape, dtype) in zip(blocks, specs)]
+    _shared_arrays = (blocks, arrays)
+
+
+def _fit_shared_tree(params, seed):
+    X, y = _shared_arrays[1]
+    return _fit_forest_tree(X, y, params, seed)
+
+
+def _gini_rows(counts, first, n):
+    # Джини для строк счетчиков; классы вычитаются в порядке первого появления,
+    # как при обходе Counter, чтобы значения совпадали до бита
+    order = np.argsort(first, axis=1, kind='stable')
+    counts = np.take_along_axis(counts, order, axis=1)
+    present = np.isfinite(np.take_along_axis(first, order, axis=1))
+    impurity = np.ones(len(counts))
+    for k in range(counts.shape[1]):
+        prob = counts[:, k] / n
+        impurity = np.where(present[:, k], impurity - prob ** 2, impurity)
+    return impurity
+
+
+def _quantile_edges(values, max_bins):
+    # Пороги для гистограммного режима: значения признака на равных квантилях
+    values = np.sort(values[~np.isnan(values)])
+    if len(values) == 0:
+        return values
+    positions = np.linspace(0, len(values) - 1, max_bins + 1)[1:-1].round().astype(int)
+    return np.unique(values[positions])
+
+
+class CompiledTree:
+    """Дерево MyDecisionTree в виде параллельных массивов
+
+    Узел i: feature[i], threshold[i], left[i], right[i]; у листа feature = -1,
+    а left и right указывают на сам лист, поэтому обход всех объектов идет
+    по уровням без ветвлений: depth шагов индексирования массивов.
+    value[i] - метка класса листа.
+    """
+    __slots__ = ('feature', 'threshold', 'left', 'right', 'value', 'depth')
+
+    def __init__(self, feature, threshold, left, right, value, depth):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.value = np.asarray(value)
+        self.depth = int(depth)
+
+    @classmethod
+    def from_dict(cls, tree):
+        feature, threshold, left, right, value = [], [], [], [], []
+        depth = 0
+        # Обход в ширину: (поддерево, индекс родителя, сторона, глубина)
+        queue = deque([(tree, -1, None, 0)])
+        while queue:
+            node, parent, side, node_depth = queue.popleft()
+            index = len(feature)
+            if parent >= 0:
+                (left if side == 'left' else right)[parent] = index
+            depth = max(depth, node_depth)
+
+            if isinstance(node, dict):
+                feature.append(node['feature'])
+                threshold.append(node['threshold'])
+                left.append(-1)
+                right.append(-1)
+                value.append(0)
+                queue.append((node['left'], index, 'left', node_depth + 1))
+                queue.append((node['right'], index, 'right', node_depth + 1))
+            else:
+                feature.append(-1)
+                threshold.append(np.inf)
+                left.append(index)
+                right.append(index)
+                value.append(node)
+        return cls(feature, threshold, left, right, value, depth)
+
+    def apply(self, X):
+        """Индексы листьев для всех строк X"""
+        X = np.asarray(X, dtype=np.float64)
+        rows = np.arange(len(X))
+        feature = np.maximum(self.feature, 0)
+        node = np.zeros(len(X), dtype=np.int32)
+        for _ in range(self.depth):
+            go_left = X[rows, feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+
+    def predict(self, X):
+        return self.value[self.apply(X)]
+
+    def predict_proba(self, X):
+        p = (self.value[self.apply(X)] == 1).astype(np.float64)
+        return np.column_stack([1 - p, p])
+
+
+class CompiledForest:
+    """Деревья леса, сложенные в общие массивы узлов
+
+    roots[t] - корень дерева t; все деревья обходятся одновременно
+    массивом узлов размера n_samples x n_trees.
+    """
+    __slots__ = ('feature', 'threshold', 'left', 'right', 'value', 'roots', 'depth')
+
+    def __init__(self, feature, threshold, left, right, value, roots, depth):
+        self.feature = np.asarray(feature, dtype=np.int32)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.left = np.asarray(left, dtype=np.int32)
+        self.right = np.asarray(right, dtype=np.int32)
+        self.value = np.asarray(value)
+        self.roots = np.asarray(roots, dtype=np.int32)
+        self.depth = int(depth)
+
+    @classmethod
+    def from_trees(cls, trees):
+        compiled = [_as_compiled(tree) for tree in trees]
+        sizes = [len(tree.feature) for tree in compiled]
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int32)
+        return cls(
+            np.concatenate([tree.feature for tree in compiled]),
+            np.concatenate([tree.threshold for tree in compiled]),
+            np.concatenate([tree.left + offset for tree, offset in zip(compiled, offsets)]),
+            np.concatenate([tree.right + offset for tree, offset in zip(compiled, offsets)]),
+            np.concatenate([tree.value for tree in compiled]),
+            offsets,
+            max(tree.depth for tree in compiled),
+        )
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def apply(self, X):
+        """Индексы листьев: n_samples x n_trees"""
+        X = np.asarray(X, dtype=np.float64)
+        rows = np.arange(len(X))[:, None]
+        feature = np.maximum(self.feature, 0)
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees))
+        for _ in range(self.depth):
+            go_left = X[rows, feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+
+    def leaf_values(self, X):
+        """Предсказания каждого дерева: n_samples x n_trees"""
+        return self.value[self.apply(X)]
+
+    def predict_proba(self, X):
+        """Доля деревьев, голосующих за класс 1"""
+        p = (self.leaf_values(X) == 1).mean(axis=1)
+        return np.column_stack([1 - p, p])
+
+    def save(self, path):
+        np.savez(path, **{name: getattr(self, name) for name in self.__slots__})
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(**{name: data[name] for name in cls.__slots__})
+
+
+def _as_compiled(tree):
+    if isinstance(tree, CompiledTree):
+        return tree
+    if isinstance(tree, MyDecisionTree):
+        return tree.compiled()
+    return CompiledTree.from_dict(tree)
+
+
+def compile_forest(forest):
+    """CompiledForest из леса в старом формате (pickle с деревьями MyDecisionTree)
+
+    Принимает список деревьев или объект леса с атрибутом trees / estimators_.
+    """
+    if isinstance(forest, CompiledForest):
+        return forest
+    for name in ('trees', 'estimators_', 'estimators'):
+        trees = getattr(forest, name, None)
+        if trees is not None:
+            return CompiledForest.from_trees(trees)
+    return CompiledForest.from_trees(forest)
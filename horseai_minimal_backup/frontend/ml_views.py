@@ -13,8 +13,8 @@ from django.core.files.storage import FileSystemStorage
 from django.conf import settings
 
 from web.database.models import Animal, Video, Analysis, LamenessAnalysis
-from web.horse_detector import HorseLamenessDetector, extract_features
-import pandas as pd
+from web.horse_detector import HorseLamenessDetector
+from web.pose_data import load_paw_signals
 
 # Хранилище задач
 task_storage = {}
@@ -150,8 +150,8 @@ def process_video_analysis(task_id):
         task['progress'] = 40
         task['message'] = 'Извлечение биомеханических признаков'
         
-        df = pd.read_hdf(h5_file)
-        features = extract_features(df)
+        signals = load_paw_signals(h5_file)
+        features = signals.features() if signals is not None else None
         
         if features is None:
             raise Exception("Не удалось извлечь признаки из видео")
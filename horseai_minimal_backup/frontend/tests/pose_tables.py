@@ -0,0 +1,26 @@
+"""
+Синтетические таблицы поз DeepLabCut для тестов
+"""
+import numpy as np
+import pandas as pd
+
+PARTS = ['nose', 'front_left_paw', 'front_right_paw', 'back_left_paw', 'back_right_paw', 'tail_base']
+
+
+def make_pose_df(frames, seed=0, nan_fraction=0.05):
+    """Синтетическая таблица поз в формате SuperAnimal quadruped"""
+    rng = np.random.default_rng(seed)
+    columns = pd.MultiIndex.from_product(
+        [['superanimal_quadruped_hrnet_w32'], ['animal0'], PARTS, ['x', 'y', 'likelihood']],
+        names=['scorer', 'individuals', 'bodyparts', 'coords']
+    )
+    t = np.arange(frames)
+    data = np.empty((frames, len(columns)))
+    for j, col in enumerate(columns):
+        if col[3] == 'likelihood':
+            data[:, j] = rng.uniform(0, 1, frames)
+        else:
+            period = rng.uniform(15, 40)
+            data[:, j] = 300 + rng.uniform(5, 30) * np.sin(2 * np.pi * t / period) + rng.normal(0, 2, frames)
+    data[rng.random(data.shape) < nan_fraction] = np.nan
+    return pd.DataFrame(data, columns=columns)
@@ -0,0 +1,91 @@
+"""
+Тесты хранилища признаков по хэшу файла поз
+"""
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from web import horse_detector
+from web.feature_store import FeatureStore, get_or_extract_features
+from web.gait_features import FEATURE_NAMES, FEATURE_VERSION, extract_features
+from web.pose_cache import PoseCache, save_upload
+from web.pose_data import load_paw_signals, pose_file_hash
+
+from frontend.tests.pose_tables import make_pose_df
+from frontend.tests.test_horse_detector import make_detector
+
+
+class TestFeatureStore(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+        self.store = FeatureStore(self.dir / 'features.sqlite3')
+        self.df = make_pose_df(300, seed=8)
+        self.h5 = self.dir / 'horseDLC_snapshot.h5'
+        self.df.to_hdf(self.h5, key='df_with_missing', format='table')
+
+    def test_miss_then_hit(self):
+        with mock.patch('web.feature_store.load_paw_signals', wraps=load_paw_signals) as load:
+            features = get_or_extract_features(self.h5, video_id=7, store=self.store)
+            self.assertEqual(load.call_count, 1)
+            self.assertEqual(get_or_extract_features(self.h5, video_id=7, store=self.store), features)
+            self.assertEqual(load.call_count, 1)
+
+        expected = extract_features(self.df)
+        for name in FEATURE_NAMES:
+            self.assertAlmostEqual(features[name], expected[name], places=12)
+        self.assertEqual(self.store.get_by_video(7), features)
+
+        keys, X = self.store.matrix()
+        self.assertEqual(keys, [{'h5_sha256': pose_file_hash(self.h5), 'video_id': '7',
+                                 'h5_name': self.h5.name}])
+        self.assertEqual(X.shape, (1, len(FEATURE_NAMES)))
+
+    def test_keyed_by_feature_version(self):
+        sha256 = pose_file_hash(self.h5)
+        features = {name: float(i) for i, name in enumerate(FEATURE_NAMES)}
+        self.store.put(sha256, features)
+
+        self.assertEqual(self.store.get(sha256), features)
+        # Новая версия кода признаков не видит старые строки
+        self.assertIsNone(self.store.get(sha256, feature_version=FEATURE_VERSION + 1))
+        self.assertEqual(self.store.matrix(feature_version=FEATURE_VERSION + 1)[1].shape, (0, len(FEATURE_NAMES)))
+        self.assertIsNone(self.store.get('0' * 64))
+
+    def test_reupload_is_linked_to_its_video_id(self):
+        pose_cache = PoseCache(self.dir / 'pose_cache.sqlite3')
+        output_dir = self.dir / 'results'
+        output_dir.mkdir()
+        detector = make_detector()
+        detector.output_dir = output_dir
+
+        def run_superanimal(videos, videotype, dest_folder):
+            for video in videos:
+                self.df.to_hdf(Path(dest_folder) / f'{Path(video).stem}DLC_snapshot.h5',
+                               key='df_with_missing', format='table')
+
+        content = b'horse video' * 100
+        with mock.patch.object(horse_detector, 'run_superanimal', side_effect=run_superanimal) as dlc, \
+                mock.patch.object(horse_detector, 'get_pose_cache', return_value=pose_cache), \
+                mock.patch.object(horse_detector, 'get_pose_batcher', return_value=None), \
+                mock.patch.object(horse_detector, 'get_feature_store', return_value=self.store), \
+                mock.patch('builtins.print'):
+            for video_id, name in ((1, 'a1b2_horse.mp4'), (2, 'c3d4_horse.mp4')):
+                video = self.dir / name
+                save_upload(SimpleUploadedFile('horse.mp4', content), video, cache=pose_cache)
+                h5_file, _ = detector.analyze_video_superanimal(video)
+                get_or_extract_features(h5_file, video_id=video_id, store=self.store)
+
+            # Вторая загрузка взяла разметку первой, но признаки доступны по обоим id
+            self.assertEqual(dlc.call_count, 1)
+            first, second = detector.predict_stored(1), detector.predict_stored(2)
+
+        self.assertIsNotNone(second)
+        self.assertEqual(second['lameness_probability'], first['lameness_probability'])
+        self.assertEqual(self.store.get_by_video(2), self.store.get_by_video(1))
+        self.assertIsNone(self.store.get_by_video(3))
@@ -0,0 +1,189 @@
+"""
+Тесты извлечения признаков походки
+"""
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+from scipy.signal import savgol_filter
+
+from web import gait_features
+from web.gait_features import (
+    FEATURE_NAMES, PAW_NAMES, PawSignals, _compute_12_features, extract_features,
+    extract_features_batch, feature_timeline, resolve_paw_columns, segment_amplitudes, smooth_signals,
+    upsample_preview
+)
+
+from frontend.tests.pose_tables import make_pose_df
+
+
+class TestExtractFeaturesBatch(SimpleTestCase):
+    """Пакетное извлечение совпадает с покадровым"""
+
+    def test_matches_single_video(self):
+        dfs = [make_pose_df(frames, seed=i) for i, frames in enumerate([25, 57, 400, 3001])]
+        dfs.append(make_pose_df(100, seed=99, nan_fraction=0.95))
+
+        X, valid = extract_features_batch(dfs)
+
+        self.assertEqual(X.shape, (len(dfs), len(FEATURE_NAMES)))
+        for i, df in enumerate(dfs):
+            features = extract_features(df)
+            self.assertEqual(features is not None, valid[i])
+            if features is None:
+                self.assertTrue(np.isnan(X[i]).all())
+                continue
+            expected = [features[name] for name in FEATURE_NAMES]
+            np.testing.assert_allclose(X[i], expected, rtol=1e-9, atol=1e-12)
+
+
+class TestPawSignals(SimpleTestCase):
+    """Один контейнер сигналов на видео: признаки и отчет берут общие массивы"""
+
+    def test_reused_for_features_and_report(self):
+        df = make_pose_df(400, seed=3)
+        signals = PawSignals.from_dataframe(df)
+
+        raw = -df.xs('y', axis=1, level='coords').droplevel([0, 1], axis=1)[[f'{paw}_paw' for paw in PAW_NAMES]]
+        common = np.flatnonzero(np.isfinite(raw.to_numpy()).all(axis=1))
+        np.testing.assert_array_equal(signals.frame_indices, common)
+        np.testing.assert_allclose(signals.masked, raw.to_numpy()[common].T, rtol=1e-6)
+        self.assertEqual(signals.n_frames, len(common))
+
+        with mock.patch.object(gait_features, 'segment_amplitudes',
+                               wraps=gait_features.segment_amplitudes) as amplitudes:
+            features = signals.features()
+            self.assertIs(signals.amplitudes, signals.amplitudes)
+            self.assertIs(signals.ranges, signals.ranges)
+        self.assertEqual(amplitudes.call_count, 1)
+        self.assertEqual(features, extract_features(df))
+        self.assertEqual(features['total_rom'], signals.amplitudes.mean())
+
+    def test_too_few_common_frames(self):
+        self.assertIsNone(PawSignals.from_dataframe(make_pose_df(15)))
+        self.assertIsNone(PawSignals.from_raw(np.full((4, 100), np.nan)))
+
+
+class TestResolvePawColumns(SimpleTestCase):
+    """Позиции столбцов копыт кэшируются по схеме"""
+
+    def test_positions_and_cache(self):
+        df = make_pose_df(30)
+        paw_columns = resolve_paw_columns(df.columns)
+
+        self.assertTrue(paw_columns.complete)
+        self.assertEqual(df.columns[paw_columns.y[0]][2:], ('front_left_paw', 'y'))
+        self.assertEqual(df.columns[paw_columns.likelihood[3]][2:], ('back_right_paw', 'likelihood'))
+        self.assertIs(resolve_paw_columns(make_pose_df(50, seed=1).columns), paw_columns)
+        self.assertIn(gait_features._schema_fingerprint(df.columns), gait_features._paw_columns_cache)
+
+    def test_missing_paw(self):
+        df = make_pose_df(30).drop(columns='back_left_paw', level='bodyparts')
+        self.assertFalse(resolve_paw_columns(df.columns).complete)
+        self.assertIsNone(extract_features(df))
+
+
+def loop_amplitude(signal, num_segments=5):
+    """Исходный покопытный расчет амплитуды (эталон для segment_amplitudes)"""
+    if len(signal) == 0:
+        return 0.0
+    segment_size = len(signal) // num_segments
+    segment_amps = []
+    for i in range(num_segments):
+        start = i * segment_size
+        end = len(signal) if i == num_segments - 1 else start + segment_size
+        segment = signal[start:end]
+        if len(segment) > 0:
+            q85, q15 = np.percentile(segment, [85, 15])
+            if 0 < q85 - q15 < np.ptp(signal) * 0.8:
+                segment_amps.append(q85 - q15)
+    if not segment_amps:
+        q85, q15 = np.percentile(signal, [85, 15])
+        return q85 - q15
+    return np.median(segment_amps)
+
+
+class TestSegmentAmplitudes(SimpleTestCase):
+    """Амплитуды блока совпадают с покопытным циклом по сегментам"""
+
+    def test_matches_loop(self):
+        rng = np.random.default_rng(5)
+        blocks = []
+        for frames in (1, 2, 4, 5, 6, 9, 11, 37, 300, 1001):
+            t = np.arange(frames)
+            block = np.stack([rng.uniform(5, 30) * np.sin(2 * np.pi * t / rng.uniform(15, 40)) +
+                              rng.normal(0, 2, frames) for _ in PAW_NAMES])
+            block[1, :frames // 2] = 3.0        # плоский участок
+            block[2, frames // 3:] = 0.0        # сегменты без размаха
+            blocks.append(block)
+
+        # Почти одни NaN: целая строка и строки с редкими значениями
+        sparse = rng.normal(size=(4, 200))
+        sparse[rng.random(sparse.shape) < 0.95] = np.nan
+        sparse[3] = np.nan
+        blocks.append(sparse)
+
+        # Выброс в одном сегменте отбрасывается фильтром 0.8 * ptp
+        spike = np.tile(np.sin(np.arange(250) / 4), (4, 1))
+        spike[0, 10] = 500.0
+        blocks.append(spike)
+
+        for block in blocks:
+            expected = [loop_amplitude(row) for row in block]
+            np.testing.assert_allclose(segment_amplitudes(block), expected, rtol=1e-12, atol=1e-12,
+                                       err_msg=f"{block.shape[1]} кадров")
+
+    def test_empty_signal(self):
+        np.testing.assert_array_equal(segment_amplitudes(np.empty((4, 0))), np.zeros(4))
+
+
+class TestSmoothSignals(SimpleTestCase):
+    """Пакетное сглаживание совпадает с savgol_filter по каждому копыту"""
+
+    def test_matches_per_paw_savgol(self):
+        rng = np.random.default_rng(0)
+        for frames in (20, 21, 64, 1001):
+            block = rng.normal(size=(4, frames)).cumsum(axis=1)
+            expected = np.stack([savgol_filter(row, window_length=11, polyorder=3) for row in block])
+            np.testing.assert_allclose(smooth_signals(block), expected, rtol=1e-10, atol=1e-10)
+
+
+class TestFeatureTimeline(SimpleTestCase):
+    """Признаки окна совпадают с _compute_12_features на срезе"""
+
+    def test_matches_window_slices(self):
+        rng = np.random.default_rng(1)
+        t = np.arange(600)
+        block = np.stack([rng.uniform(5, 30) * np.sin(2 * np.pi * t / rng.uniform(15, 40)) +
+                          rng.normal(0, 2, len(t)) for _ in PAW_NAMES])
+        block[3, 100:200] = 0.0
+
+        for window, stride in ((150, 30), (57, 7)):
+            starts, X = feature_timeline(block, window, stride)
+            self.assertEqual(X.shape, (len(range(0, 600 - window + 1, stride)), len(FEATURE_NAMES)))
+            for i, start in enumerate(starts):
+                piece = block[:, start:start + window]
+                features = _compute_12_features(dict(zip(PAW_NAMES, piece)))
+                expected = [features[name] for name in FEATURE_NAMES]
+                np.testing.assert_allclose(X[i], expected, rtol=1e-7, atol=1e-9)
+
+
+class TestUpsamplePreview(SimpleTestCase):
+    """Признаки по прореженному и уменьшенному сигналу близки к полным"""
+
+    def test_features_match_full_resolution(self):
+        rng = np.random.default_rng(0)
+        t = np.arange(900) / 30
+        raw = np.stack([amp * 40 * np.sin(2 * np.pi * 1.3 * t + phase) + rng.normal(0, 1.5, len(t))
+                        for phase, amp in ((0, 1), (3.1, 0.8), (1.5, 1.1), (4.6, 0.9))]) + 300
+        raw[1, 100:110] = np.nan
+        full = PawSignals.from_raw(raw).features()
+
+        for step in (2, 3):
+            dense = upsample_preview(raw[:, ::step] * 0.5, step, scale=0.5)
+            self.assertEqual(dense.shape[1], (raw[:, ::step].shape[1] - 1) * step + 1)
+            self.assertTrue(np.isnan(dense[1, 100:108]).all())
+
+            preview = PawSignals.from_raw(dense).features()
+            for name in FEATURE_NAMES:
+                self.assertAlmostEqual(preview[name], full[name], delta=0.05 * abs(full[name]) + 0.02, msg=name)
@@ -0,0 +1,119 @@
+"""
+Тесты пакетного предсказания и каскада HorseLamenessDetector
+"""
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from web.gait_features import FEATURE_NAMES
+from web.horse_detector import HorseLamenessDetector
+
+
+class FakeForest:
+    def __init__(self):
+        self.rows = []
+
+    def predict_proba(self, X):
+        self.rows.append(len(X))
+        p = 1 / (1 + np.exp(-3 * X[:, 0]))
+        return np.column_stack([1 - p, p])
+
+
+class FakeNetwork:
+    def __init__(self):
+        self.rows = []
+
+    def predict(self, X, verbose=0):
+        self.rows.append(len(X))
+        return (1 / (1 + np.exp(-X[:, 1])))[:, None]
+
+
+class FakeHybrid:
+    def __init__(self):
+        self.rf_model = FakeForest()
+        self.nn_model = FakeNetwork()
+
+    def predict_proba(self, X, rf_proba=None, nn_proba=None):
+        return 0.4 * rf_proba + 0.6 * nn_proba
+
+
+class FakeScaler:
+    def transform(self, X):
+        return (np.asarray(X) - 0.5) * 2
+
+
+def make_detector(cascade_margin=None):
+    detector = HorseLamenessDetector.__new__(HorseLamenessDetector)
+    model_data = {'scaler': FakeScaler(), 'hybrid_model': FakeHybrid(), 'threshold_hybrid': 0.45}
+    if cascade_margin is not None:
+        model_data['cascade_margin'] = cascade_margin
+    loaded = SimpleNamespace(model_data=model_data, sha256='model-sha')
+    detector._bind_model(loaded)
+    detector._current_model = lambda: loaded
+    return detector
+
+
+def make_features(n, seed=0):
+    return np.random.default_rng(seed).uniform(-1, 2, size=(n, len(FEATURE_NAMES)))
+
+
+class TestPredictLamenessBatch(SimpleTestCase):
+    """Пакет из N строк совпадает с предсказаниями по одной"""
+
+    def test_matches_single_predictions(self):
+        detector = make_detector()
+        X = make_features(25)
+        batch = detector.predict_lameness_batch(X)
+
+        hybrid = detector.hybrid_model
+        self.assertEqual((hybrid.rf_model.rows, hybrid.nn_model.rows), ([25], [25]))
+        self.assertEqual(batch['lameness_probability'].shape, (25,))
+        self.assertTrue((batch['path'] == 'hybrid').all())
+
+        with mock.patch('builtins.print'):
+            for row, features in enumerate(X):
+                single = detector.predict_lameness(dict(zip(FEATURE_NAMES, features)), use_cache=False)
+                self.assertEqual(single['is_lame'], bool(batch['is_lame'][row]))
+                self.assertEqual(single['lameness_probability'], batch['lameness_probability'][row])
+                self.assertEqual(single['confidence'], batch['confidence'][row])
+                self.assertEqual(single['diagnosis'], batch['diagnosis'][row])
+                self.assertEqual(single['threshold_used'], 0.45)
+
+    def test_diagnosis_bands(self):
+        result = HorseLamenessDetector._diagnose(np.array([0.0, 0.2, 0.5, 0.8, 1.0]), 0.5)
+        np.testing.assert_array_equal(result['is_lame'], [False, False, True, True, True])
+        np.testing.assert_allclose(result['confidence'], [100, 60, 0, 60, 100])
+        self.assertEqual(list(result['diagnosis']),
+                         ["Здоровая", "Вероятно здоровая", "Неопределенный результат", "Вероятно хромая", "Хромая"])
+
+
+class TestCascade(SimpleTestCase):
+    """RF вне полосы порога решает сам, нейросеть считается только для остальных строк"""
+
+    def test_rf_decides_outside_margin(self):
+        X = make_features(40, seed=1)
+        detector = make_detector(cascade_margin=0.3)
+        full = detector.predict_lameness_batch(X, cascade=False)
+        batch = detector.predict_lameness_batch(X, cascade=True)
+
+        decided = np.abs(batch['rf_proba'] - 0.45) >= 0.3
+        self.assertTrue(decided.any() and not decided.all())
+        np.testing.assert_array_equal(batch['path'], np.where(decided, 'rf', 'hybrid'))
+        self.assertEqual(detector.hybrid_model.nn_model.rows, [40, int((~decided).sum())])
+
+        self.assertTrue(np.isnan(batch['nn_proba'][decided]).all())
+        np.testing.assert_array_equal(batch['hybrid_proba'][decided], batch['rf_proba'][decided])
+        np.testing.assert_array_equal(batch['hybrid_proba'][~decided], full['hybrid_proba'][~decided])
+        np.testing.assert_array_equal(batch['is_lame'][decided], batch['rf_proba'][decided] >= 0.45)
+        np.testing.assert_array_equal(batch['is_lame'][~decided], full['is_lame'][~decided])
+
+    def test_env_switch_and_missing_margin(self):
+        X = make_features(10, seed=2)
+        with mock.patch.dict('os.environ', {'HORSEAI_CASCADE': '1'}):
+            self.assertIn('rf', make_detector(cascade_margin=0.3).predict_lameness_batch(X)['path'])
+            # Модель без cascade_margin всегда считает гибрид
+            self.assertTrue((make_detector().predict_lameness_batch(X)['path'] == 'hybrid').all())
+        with mock.patch.dict('os.environ', {'HORSEAI_CASCADE': '0'}):
+            self.assertTrue((make_detector(cascade_margin=0.3).predict_lameness_batch(X)['path'] == 'hybrid').all())
@@ -0,0 +1,113 @@
+"""
+Тесты пакета модели на NumPy
+"""
+import os
+import tempfile
+
+import joblib
+import numpy as np
+from django.test import SimpleTestCase
+from sklearn.preprocessing import StandardScaler
+
+from frontend.ml_models import MyRandomForest
+from web.inference_bundle import InferenceBundle, bundle_path, export_bundle
+
+
+class Dense:
+    """Слой с интерфейсом keras.layers.Dense (get_weights / get_config)"""
+
+    def __init__(self, W, b, activation):
+        self.W, self.b, self.activation = W, b, activation
+
+    def get_weights(self):
+        return [self.W, self.b]
+
+    def get_config(self):
+        return {'activation': self.activation}
+
+    def __call__(self, h):
+        h = h @ self.W + self.b
+        return np.maximum(h, 0) if self.activation == 'relu' else 1 / (1 + np.exp(-h))
+
+
+class Network:
+    def __init__(self, rng):
+        self.layers = [Dense(rng.normal(size=(12, 8)), rng.normal(size=8), 'relu'),
+                       Dense(rng.normal(size=(8, 1)), rng.normal(size=1), 'sigmoid')]
+
+    def predict(self, X, verbose=0):
+        for layer in self.layers:
+            X = layer(X)
+        return X
+
+
+class DriftingNetwork(Network):
+    """predict расходится с весами слоев: пакет не совпадет с моделью"""
+
+    def predict(self, X, verbose=0):
+        return super().predict(X) + 0.01
+
+
+class Hybrid:
+    def __init__(self, rf_model, nn_model):
+        self.rf_model, self.nn_model = rf_model, nn_model
+
+    def predict_proba(self, X, rf_proba=None, nn_proba=None):
+        return 0.7 * np.asarray(rf_proba) + 0.3 * np.asarray(nn_proba)
+
+
+class TestInferenceBundle(SimpleTestCase):
+    """Пакет NumPy повторяет вероятности исходной модели"""
+
+    def test_matches_original_model(self):
+        rng = np.random.default_rng(0)
+        X = rng.normal(5, 2, size=(300, 12))
+        y = (X[:, 0] + X[:, 3] > 10).astype(int)
+        scaler = StandardScaler().fit(X)
+        X_scaled = scaler.transform(X)
+        hybrid = Hybrid(MyRandomForest(n_estimators=8, max_depth=5).fit(X_scaled, y), Network(rng))
+        model_data = {'scaler': scaler, 'hybrid_model': hybrid, 'threshold_hybrid': 0.4}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            model_path = os.path.join(tmp, 'model.pkl')
+            joblib.dump(model_data, model_path)
+            meta = export_bundle(model_path, model_data=model_data, X_check=X)
+            bundle = InferenceBundle.load(bundle_path(model_path))
+
+            self.assertTrue(bundle.is_fresh(model_path))
+            os.utime(model_path, (0, 0))
+            self.assertFalse(bundle.is_fresh(model_path))
+
+        np.testing.assert_allclose(meta['combination'], [0.7, 0.3, 0.0], atol=1e-9)
+        self.assertLess(max(meta['max_abs_diff'].values()), 1e-9)
+
+        result = bundle.predict_all(X)
+        rf_proba = hybrid.rf_model.predict_proba(X_scaled)[:, 1]
+        nn_proba = hybrid.nn_model.predict(X_scaled).reshape(-1)
+        np.testing.assert_array_equal(result['rf_proba'], rf_proba)
+        np.testing.assert_allclose(result['nn_proba'], nn_proba, rtol=1e-12)
+        np.testing.assert_allclose(result['hybrid_proba'], 0.7 * rf_proba + 0.3 * nn_proba, atol=1e-12)
+        self.assertEqual(bundle.model_data()['threshold_hybrid'], 0.4)
+
+    def test_out_of_tolerance_bundle_does_not_replace_live_one(self):
+        rng = np.random.default_rng(1)
+        X = rng.normal(5, 2, size=(200, 12))
+        y = (X[:, 1] > 5).astype(int)
+        scaler = StandardScaler().fit(X)
+        rf_model = MyRandomForest(n_estimators=4, max_depth=4).fit(scaler.transform(X), y)
+        good = {'scaler': scaler, 'hybrid_model': Hybrid(rf_model, Network(rng))}
+        drifting = {'scaler': scaler, 'hybrid_model': Hybrid(rf_model, DriftingNetwork(rng))}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            model_path = os.path.join(tmp, 'model.pkl')
+            joblib.dump(good, model_path)
+            export_bundle(model_path, model_data=good, X_check=X)
+            with open(bundle_path(model_path), 'rb') as f:
+                live = f.read()
+
+            with self.assertRaises(ValueError):
+                export_bundle(model_path, model_data=drifting, X_check=X)
+
+            with open(bundle_path(model_path), 'rb') as f:
+                self.assertEqual(f.read(), live)
+            self.assertEqual(sorted(os.listdir(tmp)), ['model.pkl', 'model_bundle.npz'])
@@ -0,0 +1,103 @@
+"""
+Тесты демона анализа видео
+"""
+import tempfile
+import threading
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from frontend.detector_service import DetectorService
+from web.inference_daemon import (
+    DaemonUnavailable, InferenceDaemon, _Handler, _Job, _Server, analyze_video, ping
+)
+
+
+class FakeDetector:
+    def __init__(self):
+        self.processed = []
+
+    def preview(self, video_path):
+        return {'diagnosis': 'Вероятно здоровая', 'preview': True}
+
+    def process(self, video_path, video_id=None, on_progress=None):
+        self.processed.append(Path(video_path).name)
+        on_progress('pose', 10, 'Разметка ключевых точек')
+        self.last_result = {'diagnosis': 'Здоровая', 'lameness_probability': np.float64(12.5)}
+        return True
+
+
+def job(video, preview=False):
+    return _Job({'op': 'analyze', 'video': str(video), 'preview': preview})
+
+
+class TestInferenceDaemon(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+        self.socket_path = self.dir / 'inference.sock'
+
+    def test_previews_overtake_full_analyses(self):
+        daemon = InferenceDaemon(self.socket_path)
+        first, second, preview = job('a.mp4'), job('b.mp4'), job('c.mp4', preview=True)
+        for queued in (first, second, preview):
+            daemon.submit(queued)
+
+        self.assertIs(daemon.jobs.get()[2], preview)
+        # После предпросмотра полный анализ встает за уже ожидающими
+        daemon._run_preview(FakeDetector(), preview)
+        self.assertEqual(preview.events.get_nowait()['type'], 'preview')
+        self.assertEqual([daemon.jobs.get()[2] for _ in range(3)], [first, second, preview])
+        self.assertFalse(preview.preview)
+
+    def test_protocol_over_socket(self):
+        daemon = InferenceDaemon(self.socket_path)
+        detector = FakeDetector()
+        server = _Server(str(self.socket_path), _Handler)
+        server.inference_daemon = daemon
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        threading.Thread(target=daemon._worker, args=(detector,), daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        video = self.dir / 'horse.mp4'
+        video.write_bytes(b'video')
+        events = []
+        result = analyze_video(video, video_id=3, on_progress=events.append, timeout=10,
+                               socket_path=self.socket_path, preview=True)
+
+        self.assertEqual(result, {'diagnosis': 'Здоровая', 'lameness_probability': 12.5, 'processing_time': mock.ANY})
+        self.assertEqual([event['type'] for event in events], ['queued', 'preview', 'progress'])
+        self.assertTrue(events[1]['result']['preview'])
+        self.assertEqual(detector.processed, ['horse.mp4'])
+
+        with self.assertRaises(RuntimeError), mock.patch('builtins.print'):
+            analyze_video(self.dir / 'missing.mp4', timeout=10, socket_path=self.socket_path)
+        with mock.patch('web.horse_detector.get_pose_batcher', return_value=None):
+            stats = ping(socket_path=self.socket_path)
+        self.assertEqual((stats['completed'], stats['failed']), (1, 1))
+
+    def test_unavailable_daemon_falls_back_to_subprocess(self):
+        # Сокет остался от упавшего демона: файл есть, никто не слушает
+        server = _Server(str(self.socket_path), _Handler)
+        server.server_close()
+        with self.assertRaises(DaemonUnavailable):
+            analyze_video('horse.mp4', socket_path=self.socket_path, timeout=1)
+
+        video = self.dir / 'horse.mp4'
+        video.write_bytes(b'video')
+        completed = mock.Mock(returncode=1, stdout='', stderr='detector failed')
+        with mock.patch('frontend.detector_service.daemon_enabled', return_value=True), \
+                mock.patch('frontend.detector_service.analyze_in_daemon',
+                           side_effect=DaemonUnavailable('connection refused')) as daemon_call, \
+                mock.patch('frontend.detector_service.subprocess.run', return_value=completed) as run, \
+                mock.patch('builtins.print'):
+            result = DetectorService().analyze_video(video)
+
+        daemon_call.assert_called_once()
+        run.assert_called_once()
+        self.assertNotEqual(result.get('detector'), 'daemon')
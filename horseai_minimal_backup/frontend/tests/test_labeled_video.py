@@ -0,0 +1,137 @@
+"""
+Тесты размеченного видео по запросу
+"""
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from web import labeled_video
+from web.labeled_video import (
+    FAILED, MISSING, PENDING, READY, labeled_video_path, render_labeled_video, request_labeled_video,
+    request_render
+)
+
+from frontend.tests.pose_tables import make_pose_df
+
+
+def fake_cv2(frames, fail_at=None):
+    """Минимальный cv2: кадры из списка, VideoWriter создает файл"""
+    class Capture:
+        def __init__(self, path):
+            self.index = 0
+
+        def get(self, prop):
+            return 25.0
+
+        def read(self):
+            if self.index == fail_at:
+                raise RuntimeError("decode error")
+            if self.index >= frames:
+                return False, None
+            self.index += 1
+            return True, np.zeros((4, 4, 3), dtype=np.uint8)
+
+        def release(self):
+            pass
+
+    class Writer:
+        def __init__(self, path, fourcc, fps, size):
+            self.path = Path(path)
+            self.path.write_bytes(b'')
+
+        def write(self, frame):
+            with open(self.path, 'ab') as f:
+                f.write(b'frame')
+
+        def release(self):
+            pass
+
+    return SimpleNamespace(VideoCapture=Capture, VideoWriter=Writer, VideoWriter_fourcc=lambda *codes: 0,
+                           CAP_PROP_FPS=5, circle=lambda *args: None)
+
+
+class TestLabeledVideo(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+        self.video = self.dir / 'horse.mp4'
+        self.h5 = self.dir / 'horseDLC_snapshot.h5'
+
+    def _wait(self, path):
+        future = labeled_video._renders.get(str(path))
+        if future is not None:
+            future.result(timeout=5)
+
+    def test_request_writes_job_without_rendering(self):
+        labeled = request_labeled_video(self.video, self.h5)
+        self.assertEqual(labeled, labeled_video_path(self.h5))
+        self.assertEqual(labeled.name, 'horseDLC_snapshot_labeled.mp4')
+        self.assertFalse(labeled.exists())
+        self.assertTrue(labeled.with_suffix('.json').exists())
+
+    def test_unknown_video_is_not_rendered(self):
+        with mock.patch('web.labeled_video.render_labeled_video') as render:
+            self.assertEqual(request_render(self.dir / 'other_labeled.mp4'), MISSING)
+        render.assert_not_called()
+
+    def test_render_runs_in_background_once(self):
+        labeled = request_labeled_video(self.video, self.h5)
+        release = threading.Event()
+        calls = []
+
+        def render(video_path, h5_file, output_path):
+            release.wait(5)
+            calls.append((video_path, h5_file))
+            Path(output_path).write_bytes(b'mp4')
+            return Path(output_path)
+
+        with mock.patch('web.labeled_video.render_labeled_video', side_effect=render):
+            # Запрос не ждет рендера
+            self.assertEqual([request_render(labeled) for _ in range(3)], [PENDING] * 3)
+            release.set()
+            self._wait(labeled)
+            self.assertEqual(request_render(labeled), READY)
+
+        self.assertEqual(calls, [(str(self.video.resolve()), str(self.h5.resolve()))])
+
+    def test_failed_render_is_retried(self):
+        labeled = request_labeled_video(self.video, self.h5)
+        with mock.patch('web.labeled_video.render_labeled_video', return_value=None) as render:
+            self.assertEqual(request_render(labeled), PENDING)
+            self._wait(labeled)
+            self.assertEqual(request_render(labeled), FAILED)
+            self.assertEqual(request_render(labeled), PENDING)
+            self._wait(labeled)
+        self.assertEqual(render.call_count, 2)
+
+
+class TestRenderLabeledVideo(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+        self.h5 = self.dir / 'horseDLC_snapshot.h5'
+        make_pose_df(10).to_hdf(self.h5, key='df_with_missing', format='table')
+        self.output = labeled_video_path(self.h5)
+
+    def test_renders_all_frames(self):
+        with mock.patch.dict(sys.modules, {'cv2': fake_cv2(frames=10)}):
+            self.assertEqual(render_labeled_video(self.dir / 'horse.mp4', self.h5, self.output), self.output)
+        self.assertEqual(self.output.read_bytes(), b'frame' * 10)
+        self.assertEqual(list(self.dir.glob('*.part*')), [])
+
+    def test_failed_render_leaves_no_temp_file(self):
+        with mock.patch.dict(sys.modules, {'cv2': fake_cv2(frames=10, fail_at=3)}):
+            with self.assertRaises(RuntimeError):
+                render_labeled_video(self.dir / 'horse.mp4', self.h5, self.output)
+        self.assertFalse(self.output.exists())
+        self.assertEqual(list(self.dir.glob('*.part*')), [])
@@ -0,0 +1,166 @@
+"""
+Тесты компиляции деревьев MyDecisionTree в плоские массивы
+"""
+import os
+import pickle
+import tempfile
+from collections import Counter
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from frontend.ml_models import CompiledForest, MyDecisionTree, MyRandomForest, compile_forest
+
+
+def make_dataset(n=300, n_features=6, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, n_features))
+    y = ((X[:, 0] + 0.5 * X[:, 1] ** 2 + rng.normal(0, 0.5, n)) > 0.5).astype(int)
+    return X, y
+
+
+def fit_tree(X, y, seed, **params):
+    np.random.seed(seed)
+    tree = MyDecisionTree(**params)
+    tree.fit(X, y)
+    return tree
+
+
+class TestCompiledTree(SimpleTestCase):
+    """Плоское дерево совпадает с обходом вложенных словарей"""
+
+    def test_matches_dict_traversal(self):
+        X, y = make_dataset()
+        X_test = np.vstack([make_dataset(200, seed=1)[0], X[:50]])
+        X_test[0, 0] = np.nan
+
+        for params in ({}, {'max_depth': 3}, {'max_features': 6, 'min_samples_split': 10}):
+            tree = fit_tree(X, y, seed=0, **params)
+            expected = np.array([tree._predict_single(x, tree.tree) for x in X_test])
+            expected_proba = np.array([[p[0], p[1]] for p in
+                                       (tree._predict_proba_single(x, tree.tree) for x in X_test)])
+
+            np.testing.assert_array_equal(tree.predict(X_test), expected)
+            np.testing.assert_array_equal(tree.predict_proba(X_test), expected_proba)
+
+    def test_cache_is_not_pickled(self):
+        X, y = make_dataset(100)
+        tree = fit_tree(X, y, seed=0, max_depth=4)
+        expected = tree.predict(X)
+        self.assertIsNotNone(tree._compiled)
+
+        restored = pickle.loads(pickle.dumps(tree))
+        self.assertNotIn('_compiled', restored.__dict__)
+        np.testing.assert_array_equal(restored.predict(X), expected)
+        self.assertIsNotNone(restored._compiled)
+
+    def test_single_leaf(self):
+        X, _ = make_dataset(20)
+        tree = fit_tree(X, np.ones(20, dtype=int), seed=0)
+        np.testing.assert_array_equal(tree.predict(X), np.ones(20))
+
+
+class TestCompiledForest(SimpleTestCase):
+    """Сложенные деревья леса совпадают с деревьями по отдельности"""
+
+    def test_matches_individual_trees(self):
+        X, y = make_dataset()
+        rng = np.random.default_rng(3)
+        trees = []
+        for seed in range(7):
+            sample = rng.integers(0, len(X), len(X))
+            trees.append(fit_tree(X[sample], y[sample], seed=seed, max_depth=None if seed % 2 else 4))
+
+        forest = compile_forest(trees)
+        X_test = make_dataset(150, seed=2)[0]
+
+        expected = np.column_stack([tree.predict(X_test) for tree in trees])
+        np.testing.assert_array_equal(forest.leaf_values(X_test), expected)
+        np.testing.assert_allclose(forest.predict_proba(X_test)[:, 1], (expected == 1).mean(axis=1))
+
+    def test_save_load(self):
+        X, y = make_dataset(100)
+        forest = CompiledForest.from_trees([fit_tree(X, y, seed=s) for s in range(3)])
+        path = os.path.join(tempfile.mkdtemp(), 'forest.npz')
+        forest.save(path)
+        loaded = CompiledForest.load(path)
+        np.testing.assert_array_equal(loaded.leaf_values(X), forest.leaf_values(X))
+
+
+class TestSplitSearch(SimpleTestCase):
+    """Поиск порога по сортировке дает те же разбиения, что полный перебор"""
+
+    def test_sorted_matches_exhaustive(self):
+        rng = np.random.default_rng(4)
+        tree = MyDecisionTree()
+        for trial in range(100):
+            n, n_features = int(rng.integers(2, 80)), int(rng.integers(1, 5))
+            X = rng.normal(size=(n, n_features))
+            if trial % 3 == 0:
+                X = np.round(X, 1)
+            if trial % 5 == 0:
+                X[rng.random(X.shape) < 0.1] = np.nan
+            y = rng.integers(0, int(rng.integers(2, 4)), n)
+            features = rng.permutation(n_features)
+
+            self.assertEqual(tree._sorted_split(X, y, features), tree._exhaustive_split(X, y, features))
+
+    def test_binned_mode(self):
+        X, y = make_dataset(500)
+        exact = fit_tree(X, y, seed=0, max_depth=4)
+        tree = fit_tree(X, y, seed=0, max_depth=4, max_bins=64)
+
+        node = tree.tree
+        self.assertIn(node['threshold'], tree._bin_edges[node['feature']])
+        self.assertGreater((tree.predict(X) == y).mean(), (exact.predict(X) == y).mean() - 0.05)
+
+
+class TestMyRandomForest(SimpleTestCase):
+    """Параллельное обучение дает тот же лес, что последовательное"""
+
+    def test_parallel_matches_serial(self):
+        X, y = make_dataset(300)
+        serial = MyRandomForest(n_estimators=6, max_depth=6, n_jobs=1, random_state=7).fit(X, y)
+        parallel = MyRandomForest(n_estimators=6, max_depth=6, n_jobs=2, random_state=7).fit(X, y)
+
+        self.assertEqual([tree.tree for tree in serial.trees], [tree.tree for tree in parallel.trees])
+
+        X_test = make_dataset(200, seed=5)[0]
+        np.testing.assert_array_equal(serial.predict_proba(X_test), parallel.predict_proba(X_test))
+
+        votes = serial.leaf_values(X_test)
+        expected = [Counter(row).most_common(1)[0][0] for row in votes]
+        np.testing.assert_array_equal(parallel.predict(X_test), expected)
+
+    def test_n_jobs_workers(self):
+        with mock.patch('frontend.ml_models.os.cpu_count', return_value=8):
+            for n_jobs, expected in [(None, 1), (0, 1), (1, 1), (3, 3), (-1, 8), (-2, 7), (-20, 1), (16, 10)]:
+                self.assertEqual(MyRandomForest(n_jobs=n_jobs)._n_workers(10), expected, n_jobs)
+
+    def test_compiled_once_and_refreshed_by_fit(self):
+        X, y = make_dataset(200)
+        forest = MyRandomForest(n_estimators=4, max_depth=4, n_jobs=1, random_state=1).fit(X, y)
+        with mock.patch.object(CompiledForest, 'from_trees', wraps=CompiledForest.from_trees) as from_trees:
+            first = forest.predict_proba(X)
+            np.testing.assert_array_equal(forest.predict_proba(X), first)
+            self.assertEqual(from_trees.call_count, 1)
+
+            forest.fit(X[::-1], 1 - y[::-1])
+            np.testing.assert_array_equal(forest.predict_proba(X)[:, 1], (forest.leaf_values(X) == 1).mean(axis=1))
+            self.assertEqual(from_trees.call_count, 2)
+
+        restored = pickle.loads(pickle.dumps(forest))
+        self.assertNotIn('_chunks', restored.__dict__)
+        np.testing.assert_array_equal(restored.predict_proba(X), forest.predict_proba(X))
+
+    def test_fit_does_not_touch_global_rng(self):
+        X, y = make_dataset(100)
+        np.random.seed(11)
+        expected = np.random.random()
+        np.random.seed(11)
+        first = MyRandomForest(n_estimators=3, max_depth=4, random_state=2).fit(X, y)
+        self.assertEqual(np.random.random(), expected)
+
+        second = MyRandomForest(n_estimators=3, max_depth=4, random_state=2).fit(X, y)
+        self.assertEqual([tree.tree for tree in first.trees], [tree.tree for tree in second.trees])
@@ -0,0 +1,124 @@
+"""
+Тесты реестра моделей
+"""
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from web.inference_bundle import bundle_path
+from web.model_registry import ModelRegistry, preload_models, process_memory
+
+SMAPS_ROLLUP = """55d0c0000000-7ffd00000000 ---p 00000000 00:00 0                          [rollup]
+Rss:              262144 kB
+Pss:               65536 kB
+Shared_Clean:     245760 kB
+Shared_Dirty:       4096 kB
+Private_Clean:      1024 kB
+Private_Dirty:     11264 kB
+Swap:                  0 kB
+"""
+
+
+class FakeBundle:
+    def __init__(self, fresh):
+        self.fresh = fresh
+
+    def is_fresh(self, model_path):
+        return self.fresh
+
+
+class TestModelRegistry(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.model_path = Path(self.tmp.name) / 'model.pkl'
+        self.model_path.write_bytes(b'pickle v1')
+        self.loads = []
+
+    def _load(self, path, mmap_mode=None):
+        self.loads.append(path.name)
+        if path.name.endswith('.npz'):
+            return {'bundle': FakeBundle(self.bundle_fresh)}
+        return {'content': path.read_bytes()}
+
+    def test_reload_only_when_sha256_changes(self):
+        registry = ModelRegistry()
+        with mock.patch('web.model_registry._load_model_file', side_effect=self._load):
+            first = registry.get(self.model_path)
+            self.assertIs(registry.get(self.model_path), first)
+
+            # Новые mtime с тем же содержимым - та же версия без загрузки
+            stat = self.model_path.stat()
+            os.utime(self.model_path, (stat.st_atime, stat.st_mtime + 5))
+            self.assertIs(registry.get(self.model_path), first)
+            self.assertEqual(self.loads, ['model.pkl'])
+
+            self.model_path.write_bytes(b'pickle v2')
+            os.utime(self.model_path, (stat.st_atime, stat.st_mtime + 10))
+            second = registry.get(self.model_path)
+
+        self.assertIsNot(second, first)
+        self.assertEqual(second.model_data, {'content': b'pickle v2'})
+        self.assertNotEqual(second.sha256, first.sha256)
+        self.assertEqual(first.model_data, {'content': b'pickle v1'})
+        self.assertEqual(self.loads, ['model.pkl', 'model.pkl'])
+        self.assertEqual([info['sha256'] for info in registry.stats()], [second.sha256])
+
+    def test_current_model_prefers_fresh_bundle(self):
+        registry = ModelRegistry()
+        bundle_path(self.model_path).write_bytes(b'npz')
+        with mock.patch('web.model_registry._load_model_file', side_effect=self._load):
+            self.bundle_fresh = True
+            self.assertIn('bundle', registry.get_current(self.model_path).model_data)
+            self.assertEqual(self.loads, ['model_bundle.npz'])
+
+            # Устаревший пакет - берется model.pkl
+            self.bundle_fresh = False
+            registry = ModelRegistry()
+            self.assertEqual(registry.get_current(self.model_path).model_data, {'content': b'pickle v1'})
+
+            with mock.patch.dict(os.environ, {'HORSEAI_NUMPY_BUNDLE': '0'}):
+                self.assertEqual(ModelRegistry().get_current(self.model_path).model_data['content'], b'pickle v1')
+
+    def test_load_your_model_returns_plain_dict(self):
+        from web.model_loader import load_your_model
+
+        registry = ModelRegistry()
+        with mock.patch('web.model_registry._load_model_file', side_effect=self._load), \
+                mock.patch('web.model_registry.get_model_registry', return_value=registry), \
+                mock.patch('web.model_loader.MODEL_PATH', self.model_path):
+            model_data = load_your_model()
+            self.assertIs(type(model_data), dict)
+            model_data['content'] = None
+            self.assertEqual(load_your_model(), {'content': b'pickle v1'})
+        self.assertEqual(self.loads, ['model.pkl'])
+
+
+class TestPreload(SimpleTestCase):
+
+    def test_preload_before_fork(self):
+        registry = mock.Mock()
+        registry.get_current.side_effect = [OSError('no model'), 'loaded']
+        with mock.patch('web.model_registry.get_model_registry', return_value=registry), \
+                mock.patch('web.model_registry.gc.freeze') as freeze, mock.patch('builtins.print'):
+            preload_models(['missing.pkl', 'model.pkl'])
+
+        # Ошибка одной модели не мешает остальным и заморозке
+        self.assertEqual([c.args for c in registry.get_current.call_args_list], [('missing.pkl',), ('model.pkl',)])
+        freeze.assert_called_once_with()
+
+    def test_process_memory(self):
+        with mock.patch('builtins.open', mock.mock_open(read_data=SMAPS_ROLLUP)) as smaps:
+            memory = process_memory(1234)
+        smaps.assert_called_once_with('/proc/1234/smaps_rollup', 'r')
+        self.assertEqual(memory['rss'], 262144 * 1024)
+        self.assertEqual(memory['shared'], (245760 + 4096) * 1024)
+        self.assertEqual(memory['private'], (1024 + 11264) * 1024)
+        self.assertNotIn('swap', memory)
+
+        self.assertIsNone(process_memory(-1))
+
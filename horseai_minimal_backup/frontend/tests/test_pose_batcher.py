@@ -0,0 +1,97 @@
+"""
+Тесты сбора видео в пакеты для разметки поз
+"""
+import threading
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from web.pose_batcher import PoseBatcher
+
+
+class TestPoseBatcher(SimpleTestCase):
+
+    def test_groups_concurrent_videos_into_one_call(self):
+        calls = []
+
+        def run_batch(key, videos):
+            calls.append((key, list(videos)))
+            return [f"{video}.h5" for video in videos]
+
+        batcher = PoseBatcher(run_batch, max_batch=3, max_wait=5)
+        futures = [batcher.submit('mp4', f"video{i}") for i in range(3)]
+        self.assertEqual([future.result(timeout=5) for future in futures],
+                         ['video0.h5', 'video1.h5', 'video2.h5'])
+        # Пакет заполнен - ждать max_wait не нужно, один вызов на три видео
+        self.assertEqual(calls, [('mp4', ['video0', 'video1', 'video2'])])
+        self.assertEqual(batcher.stats()['mean_batch'], 3)
+
+    def test_single_video_waits_at_most_max_wait(self):
+        batcher = PoseBatcher(lambda key, videos: list(videos), max_batch=4, max_wait=0.05)
+        self.assertEqual(batcher.submit('mp4', 'video').result(timeout=2), 'video')
+
+    def test_keys_and_errors_are_separated(self):
+        calls = []
+        release = threading.Event()
+
+        def run_batch(key, videos):
+            release.wait(5)
+            calls.append((key, list(videos)))
+            if 'broken' in videos and len(videos) > 1:
+                raise RuntimeError("batch failed")
+            if videos == ['broken']:
+                raise RuntimeError("broken video")
+            return [ValueError("no h5") if video == 'missing' else video for video in videos]
+
+        batcher = PoseBatcher(run_batch, max_batch=10, max_wait=0.2)
+        futures = {name: batcher.submit(key, name) for key, name in
+                   (('mp4', 'a'), ('avi', 'b'), ('mp4', 'broken'), ('mp4', 'missing'))}
+        release.set()
+
+        self.assertEqual(futures['a'].result(timeout=5), 'a')
+        self.assertEqual(futures['b'].result(timeout=5), 'b')
+        with self.assertRaises(RuntimeError):
+            futures['broken'].result(timeout=5)
+        with self.assertRaises(ValueError):
+            futures['missing'].result(timeout=5)
+
+        # Пакет mp4 упал целиком и был повторен по одному видео
+        self.assertEqual(calls[0], ('mp4', ['a', 'broken', 'missing']))
+        self.assertIn(('avi', ['b']), calls)
+        self.assertIn(('mp4', ['broken']), calls)
+
+    def test_unresolved_futures_fail(self):
+        batcher = PoseBatcher(lambda key, videos: ['only one'], max_batch=2, max_wait=5)
+        futures = [batcher.submit('mp4', f"video{i}") for i in range(2)]
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+
+    def test_loop_survives_base_exception(self):
+        def run_batch(key, videos):
+            if videos == ['fatal']:
+                raise KeyboardInterrupt
+            return list(videos)
+
+        batcher = PoseBatcher(run_batch, max_batch=1, max_wait=0)
+        with mock.patch('threading.excepthook'):
+            with self.assertRaises(RuntimeError):
+                batcher.submit('mp4', 'fatal').result(timeout=5)
+            batcher._thread.join(timeout=5)
+        # Остановленный поток перезапускается следующей отправкой
+        self.assertEqual(batcher.submit('mp4', 'video').result(timeout=5), 'video')
+
+
+class TestSuperanimalBatch(SimpleTestCase):
+
+    def test_video_hash_reaches_manifest(self):
+        from web import horse_detector
+
+        with mock.patch.object(horse_detector, 'run_superanimal') as run, \
+                mock.patch.object(horse_detector, 'find_pose_outputs', return_value=('h5', 'mp4')) as find:
+            outputs = horse_detector._superanimal_batch(('mp4', '/out'), [(Path('a.mp4'), 'sha-a'),
+                                                                         (Path('b.mp4'), 'sha-b')])
+        self.assertEqual(outputs, [('h5', 'mp4')] * 2)
+        run.assert_called_once_with([Path('a.mp4'), Path('b.mp4')], 'mp4', '/out')
+        self.assertEqual([c.kwargs['video_sha256'] for c in find.call_args_list], ['sha-a', 'sha-b'])
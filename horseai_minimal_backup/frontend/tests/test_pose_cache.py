@@ -0,0 +1,60 @@
+"""
+Тесты кэша разметки поз по содержимому видео
+"""
+import hashlib
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase
+
+from web.pose_cache import PoseCache, save_upload
+from web.pose_manifest import write_manifest
+
+CONTENT = b'horse video' * 1000
+
+
+class TestPoseCache(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+        self.cache = PoseCache(self.dir / 'pose_cache.sqlite3')
+
+    def test_upload_is_hashed_while_written(self):
+        video = self.dir / 'a1b2_horse.mp4'
+        sha256 = save_upload(SimpleUploadedFile('horse.mp4', CONTENT), video, cache=self.cache)
+        self.assertEqual(sha256, hashlib.sha256(CONTENT).hexdigest())
+        self.assertEqual(video.read_bytes(), CONTENT)
+
+        # Анализ берет хэш из записи о загрузке, не читая файл
+        with mock.patch('web.pose_cache.file_sha256') as file_sha256:
+            self.assertEqual(self.cache.video_hash(video), sha256)
+        file_sha256.assert_not_called()
+
+    def test_repeat_upload_finds_pose_of_first(self):
+        first = self.dir / 'a1b2_horse.mp4'
+        second = self.dir / 'c3d4_horse.mp4'
+        sha256 = save_upload(SimpleUploadedFile('horse.mp4', CONTENT), first, cache=self.cache)
+        self.assertEqual(save_upload(SimpleUploadedFile('horse.mp4', CONTENT), second, cache=self.cache), sha256)
+        self.assertIsNone(self.cache.get(sha256))
+
+        h5 = self.dir / 'a1b2_horseDLC_snapshot.h5'
+        h5.write_bytes(b'pose')
+        self.cache.put(sha256, write_manifest(first, self.dir, h5, video_sha256=sha256))
+        manifest = self.cache.get(self.cache.video_hash(second))
+        self.assertEqual(manifest['artifacts']['h5_file']['path'], str(h5.resolve()))
+
+        # Удаленный H5 - разметки в кэше больше нет
+        h5.unlink()
+        self.assertIsNone(self.cache.get(sha256))
+
+    def test_cache_failure_is_logged(self):
+        video = self.dir / 'a1b2_horse.mp4'
+        with mock.patch.object(self.cache, 'remember_upload', side_effect=OSError('disk full')), \
+                self.assertLogs('web.pose_cache', level='ERROR') as logs:
+            save_upload(SimpleUploadedFile('horse.mp4', CONTENT), video, cache=self.cache)
+        self.assertEqual(video.read_bytes(), CONTENT)
+        self.assertIn('disk full', logs.output[0])
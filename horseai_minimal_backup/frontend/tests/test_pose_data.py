@@ -0,0 +1,134 @@
+"""
+Тесты чтения траекторий копыт из файлов поз
+"""
+import json
+import os
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.test import SimpleTestCase
+
+from web.gait_features import PAW_NAMES, extract_features
+from web.pose_data import (
+    load_paw_arrays, load_paw_points, load_paw_signals, open_paw_sidecar, sidecar_paths,
+    write_paw_sidecar
+)
+
+from frontend.tests.pose_tables import make_pose_df
+
+
+def paw_block(df, coord):
+    """Строки выбранной координаты копыт (4 x T) из полной таблицы"""
+    table = df.xs(coord, axis=1, level='coords').droplevel([0, 1], axis=1)
+    return table[[f'{paw}_paw' for paw in PAW_NAMES]].to_numpy().T
+
+
+class TestLoadPawArrays(SimpleTestCase):
+    """Чтение только столбцов копыт совпадает с pd.read_hdf всей таблицы"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+
+    def test_matches_read_hdf(self):
+        df = make_pose_df(500, seed=4)
+        for fmt in ('table', 'fixed'):
+            h5 = self.dir / f'horse_{fmt}DLC_snapshot.h5'
+            df.to_hdf(h5, key='df_with_missing', format=fmt)
+            full = pd.read_hdf(h5)
+
+            paws = load_paw_arrays(h5, chunk_rows=128, dtype=np.float64)
+            self.assertEqual(paws.n_frames, 500)
+            np.testing.assert_array_equal(paws.y, paw_block(full, 'y'))
+            np.testing.assert_array_equal(paws.likelihood, paw_block(full, 'likelihood'))
+            self.assertEqual(load_paw_arrays(h5).y.dtype, np.float32)
+
+            self.assertEqual(load_paw_signals(h5).features(), extract_features(full))
+
+    def test_missing_likelihood_is_nan(self):
+        df = make_pose_df(60).drop(columns=('superanimal_quadruped_hrnet_w32', 'animal0', 'front_right_paw',
+                                            'likelihood'))
+        h5 = self.dir / 'horseDLC_snapshot.h5'
+        df.to_hdf(h5, key='df_with_missing', format='table')
+
+        paws = load_paw_arrays(h5)
+        self.assertTrue(np.isnan(paws.likelihood[1]).all())
+        self.assertFalse(np.isnan(paws.likelihood[0]).all())
+
+
+class TestPawSidecar(SimpleTestCase):
+    """Файл-спутник открывается через mmap и отбрасывается, когда H5 изменился"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.h5 = Path(self.tmp.name) / 'horseDLC_snapshot.h5'
+        self.df = make_pose_df(300, seed=6)
+        self.df.to_hdf(self.h5, key='df_with_missing', format='table')
+
+    def test_round_trip(self):
+        data_path = write_paw_sidecar(self.h5, fps=29.97)
+        self.assertEqual(data_path, sidecar_paths(self.h5)[0])
+
+        sidecar = open_paw_sidecar(self.h5, verify_hash=True)
+        self.assertEqual(sidecar.fps, 29.97)
+        self.assertEqual(sidecar.header['n_frames'], 300)
+        self.assertIsInstance(sidecar.paws.y.base, np.memmap)
+        expected = load_paw_arrays(self.h5, dtype=np.float64)
+        np.testing.assert_array_equal(sidecar.paws.y, expected.y)
+        np.testing.assert_array_equal(sidecar.paws.likelihood, expected.likelihood)
+
+        # Признаки берутся из файла-спутника, H5 не читается
+        with mock.patch('web.pose_data.load_paw_arrays') as load:
+            features = load_paw_signals(self.h5).features()
+        load.assert_not_called()
+        self.assertEqual(features, extract_features(self.df))
+
+    def test_stale_sidecar_is_ignored(self):
+        write_paw_sidecar(self.h5)
+        stat = self.h5.stat()
+        os.utime(self.h5, (stat.st_atime, stat.st_mtime + 10))
+        self.assertIsNone(open_paw_sidecar(self.h5))
+
+        write_paw_sidecar(self.h5)
+        header_path = sidecar_paths(self.h5)[1]
+        header = json.loads(header_path.read_text(encoding='utf-8'))
+        header['source_sha256'] = '0' * 64
+        header_path.write_text(json.dumps(header), encoding='utf-8')
+        self.assertIsNotNone(open_paw_sidecar(self.h5))
+        self.assertIsNone(open_paw_sidecar(self.h5, verify_hash=True))
+
+        header['version'] = -1
+        header_path.write_text(json.dumps(header), encoding='utf-8')
+        self.assertIsNone(open_paw_sidecar(self.h5))
+
+
+class TestLoadPawPoints(SimpleTestCase):
+    """Точки копыт для размеченного видео читаются без лишних столбцов"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+
+    def test_matches_dataframe(self):
+        df = make_pose_df(300)
+        h5 = self.dir / 'horseDLC_snapshot.h5'
+        df.to_hdf(h5, key='df_with_missing', format='table')
+
+        x, y, likelihood = load_paw_points(h5, chunk_rows=64)
+        for i, paw in enumerate(PAW_NAMES):
+            part = df.xs(f'{paw}_paw', axis=1, level='bodyparts').droplevel([0, 1], axis=1)
+            np.testing.assert_allclose(x[i], part['x'], rtol=1e-6)
+            np.testing.assert_allclose(y[i], part['y'], rtol=1e-6)
+            np.testing.assert_allclose(likelihood[i], part['likelihood'], rtol=1e-6)
+
+    def test_missing_paw(self):
+        h5 = self.dir / 'horseDLC_snapshot.h5'
+        make_pose_df(30).drop(columns='back_left_paw', level='bodyparts').to_hdf(
+            h5, key='df_with_missing', format='table')
+        self.assertIsNone(load_paw_points(h5))
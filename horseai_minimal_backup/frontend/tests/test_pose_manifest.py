@@ -0,0 +1,55 @@
+"""
+Тесты манифеста разметки поз
+"""
+import hashlib
+import tempfile
+from pathlib import Path
+
+from django.test import SimpleTestCase
+
+from web.pose_manifest import (
+    artifact_path, find_pose_h5, manifest_path, read_manifest, update_manifest, write_manifest
+)
+
+
+class TestPoseManifest(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+        self.video = self.dir / 'horse.mp4'
+        self.video.write_bytes(b'video')
+
+    def test_stem_prefix_of_another_video_is_not_matched(self):
+        (self.dir / 'horse_2DLC_snapshot.h5').write_bytes(b'other')
+        (self.dir / 'old_horseDLC_snapshot.h5').write_bytes(b'other')
+        self.assertIsNone(find_pose_h5(self.video, self.dir))
+
+        h5 = self.dir / 'horse_superanimal_quadruped_hrnet_w32_ssdlite_.h5'
+        h5.write_bytes(b'pose')
+        self.assertEqual(find_pose_h5(self.video, self.dir), h5)
+
+    def test_manifest_records_exact_paths_sizes_and_hashes(self):
+        h5 = self.dir / 'horseDLC_snapshot.h5'
+        h5.write_bytes(b'pose')
+        labeled = self.dir / 'horseDLC_snapshot_labeled.mp4'
+
+        path = write_manifest(self.video, self.dir, h5, labeled)
+        self.assertEqual(path, manifest_path(self.dir, self.video))
+        manifest = read_manifest(path)
+        self.assertEqual(manifest['video']['sha256'], hashlib.sha256(b'video').hexdigest())
+        self.assertEqual(manifest['artifacts']['h5_file'],
+                         {'path': str(h5.resolve()), 'size': 4, 'sha256': hashlib.sha256(b'pose').hexdigest()})
+        # Размеченное видео еще не отрисовано
+        self.assertEqual(artifact_path(manifest, 'labeled_video'), labeled.resolve())
+        self.assertIsNone(manifest['artifacts']['labeled_video']['size'])
+
+        report = self.dir / 'horse_result.txt'
+        report.write_text('ok')
+        self.assertEqual(artifact_path(update_manifest(path, text_report=report), 'text_report'),
+                         report.resolve())
+
+        # Перезаписанный H5 делает манифест недействительным
+        h5.write_bytes(b'new pose')
+        self.assertIsNone(read_manifest(path))
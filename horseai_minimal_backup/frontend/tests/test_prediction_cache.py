@@ -0,0 +1,74 @@
+"""
+Тесты кэша предсказаний
+"""
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from web.prediction_cache import PredictionCache
+
+FEATURES = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2]
+
+
+class TestPredictionCache(SimpleTestCase):
+
+    def test_key_depends_on_quantized_features_and_model(self):
+        cache = PredictionCache(decimals=6)
+        key = cache.key(FEATURES, 'model-a')
+        self.assertEqual(key, cache.key([x + 1e-9 for x in FEATURES], 'model-a'))
+        self.assertNotEqual(key, cache.key([x + 1e-4 for x in FEATURES], 'model-a'))
+        self.assertNotEqual(key, cache.key(FEATURES, 'model-b'))
+        self.assertNotEqual(key, cache.key(FEATURES, 'model-a', mode='cascade:0.3'))
+
+    def test_lru_ttl_and_counters(self):
+        cache = PredictionCache(max_size=2, ttl=10)
+        with mock.patch('web.prediction_cache.time.monotonic', return_value=0.0):
+            cache.put('a', {'p': 1})
+            cache.put('b', {'p': 2})
+            self.assertEqual(cache.get('a'), {'p': 1})
+            cache.put('c', {'p': 3})            # вытесняет 'b', а не недавно прочитанный 'a'
+            self.assertIsNone(cache.get('b'))
+
+            # Изменение возвращенной копии не портит запись
+            cache.get('a')['p'] = 100
+            self.assertEqual(cache.get('a'), {'p': 1})
+
+        with mock.patch('web.prediction_cache.time.monotonic', return_value=11.0):
+            self.assertIsNone(cache.get('a'))
+
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (3, 2, 1))
+        self.assertEqual(stats['size'], 1)
+
+    def test_expired_entries_evicted_before_live_ones(self):
+        cache = PredictionCache(max_size=2, ttl=10)
+        with mock.patch('web.prediction_cache.time.monotonic') as monotonic:
+            monotonic.return_value = 0.0
+            cache.put('a', {'p': 1})
+            monotonic.return_value = 5.0
+            cache.put('b', {'p': 2})
+            monotonic.return_value = 6.0
+            self.assertEqual(cache.get('a'), {'p': 1})      # 'b' теперь самый давний
+
+            # 'a' просрочена - вытесняется она, а не живая 'b'
+            monotonic.return_value = 12.0
+            cache.put('c', {'p': 3})
+            self.assertEqual(cache.get('b'), {'p': 2})
+            self.assertEqual(cache.get('c'), {'p': 3})
+            self.assertIsNone(cache.get('a'))
+
+        stats = cache.stats()
+        self.assertEqual((stats['size'], stats['evictions']), (2, 1))
+
+    @override_settings(CACHES={'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                          'LOCATION': 'prediction-cache-test'}})
+    def test_shared_backend(self):
+        first = PredictionCache(backend='shared')
+        second = PredictionCache(backend='shared')
+        first.put('key', {'p': 1})
+
+        self.assertEqual(second.get('key'), {'p': 1})
+        self.assertEqual(second.get('key'), {'p': 1})
+        self.assertEqual((second.shared_hits, second.hits), (1, 1))
+        caches['shared'].clear()
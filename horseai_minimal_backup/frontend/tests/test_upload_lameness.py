@@ -0,0 +1,42 @@
+"""
+Тесты страницы анализа хромоты при работе через демон
+"""
+import json
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from web import upload_lameness
+from web.pose_manifest import update_manifest, write_manifest
+
+
+class TestLamenessGraphs(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = Path(self.tmp.name)
+
+    def _graphs(self, video_id):
+        return json.loads(upload_lameness.get_lameness_graphs(None, video_id).content)
+
+    def test_daemon_result_uses_manifest_report(self):
+        video = self.dir / 'a1b2_horse.mp4'
+        h5 = self.dir / 'a1b2_horseDLC_snapshot.h5'
+        h5.write_bytes(b'pose')
+        plot = self.dir / 'results' / 'a1b2_horse_result.png'
+        plot.parent.mkdir()
+        plot.write_bytes(b'png')
+        manifest = write_manifest(video, self.dir, h5)
+        update_manifest(manifest, graphic_report=plot)
+
+        with mock.patch.dict(upload_lameness.analysis_status,
+                             {'a1b2': {'status': 'completed', 'result': {'manifest': str(manifest)}}}):
+            graphs = self._graphs('a1b2')
+        self.assertEqual([graph['description'] for graph in graphs['graphs']],
+                         ['График анализа: a1b2_horse_result.png'])
+
+    def test_unknown_video_has_no_graphs(self):
+        self.assertEqual(self._graphs('c3d4'), {'graphs': [], 'count': 0})
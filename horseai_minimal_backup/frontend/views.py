@@ -401,12 +401,11 @@ def upload_video_simple_api_real(request):
 
         filepath = os.path.join(media_dir, filename)
 
-        # Сохраняем файл
-        with open(filepath, 'wb+') as destination:
-            for chunk in video_file.chunks():
-                destination.write(chunk)
+        # Сохраняем файл (хэш содержимого для кэша разметки считается при записи)
+        from web.pose_cache import save_upload
+        video_sha256 = save_upload(video_file, filepath)
 
-        print(f"✅ Файл сохранен: {filepath}")
+        print(f"✅ Файл сохранен: {filepath} (sha256 {video_sha256[:12]})")
 
         # 2. ПОИСК ИЛИ СОЗДАНИЕ ЖИВОТНОГО
         try:
@@ -1441,6 +1440,7 @@ def upload_video_horse_detector(request):
             'analysis_id': analysis.analysis_id,
             'is_lame': analysis.is_lame if hasattr(analysis, 'is_lame') else None,
             'diagnosis': analysis.diagnosis,
+            'timeline': result.get('timeline') if result else None,
             'redirect_url': f'/analysis/results/#analysis-{analysis.analysis_id}'
         })
 
@@ -2077,6 +2077,27 @@ def get_analysis_details(request, analysis_id):
                     pose_data_path = files[0].replace('/home/ais/shared/horseAI', '')
                     break
         
+        # Сводка по траекториям копыт из файла-спутника (без чтения H5)
+        pose_summary = None
+        feature_timeline = None
+        if pose_data_path:
+            try:
+                import numpy as np
+                from web.gait_features import PawSignals
+                from web.pose_data import open_paw_sidecar
+                sidecar = open_paw_sidecar('/home/ais/shared/horseAI' + pose_data_path)
+                if sidecar:
+                    pose_summary = {
+                        'frames': sidecar.paws.n_frames,
+                        'fps': sidecar.fps,
+                        'paw_likelihood': [round(float(v), 3) for v in np.nanmean(sidecar.paws.likelihood, axis=1)],
+                    }
+                    signals = PawSignals.from_raw(-sidecar.paws.y)
+                    if signals is not None:
+                        feature_timeline = signals.timeline(fps=sidecar.fps)
+            except Exception as e:
+                print(f"Ошибка чтения траекторий копыт: {e}")
+        
         # Формируем контекст
         context = {
             'analysis_id': analysis_id,
@@ -2090,6 +2111,8 @@ def get_analysis_details(request, analysis_id):
             'text_report_path': text_report_path,
             'graphic_report_path': graphic_report_path,
             'pose_data_path': pose_data_path,
+            'pose_summary': pose_summary,
+            'feature_timeline': feature_timeline,
             
             # Статистика
             'lameness_probability': analysis.lameness_probability or 0,
@@ -2128,8 +2151,14 @@ def api_system_stats(request):
         analyses_count = Analysis.objects.filter(video__user=custom_user).count()
 
         # Если пользователь админ, показываем общую статистику
+        models = None
         if request.user.is_superuser:
             users_count = CustomUser.objects.count()
+            from web.model_registry import get_model_registry, process_memory
+            from web.prediction_cache import get_prediction_cache
+            prediction_cache = get_prediction_cache()
+            models = {'loaded': get_model_registry().stats(), 'process_memory': process_memory(),
+                      'prediction_cache': prediction_cache.stats() if prediction_cache else None}
         else:
             users_count = 1  # Только сам пользователь
 
@@ -2139,6 +2168,7 @@ def api_system_stats(request):
             'animals_count': animals_count,
             'videos_count': videos_count,
             'analyses_count': analyses_count,
+            'models': models,
         })
 
     except Exception as e:
@@ -3289,6 +3319,15 @@ def api_video_proxy(request):
         if not file_path.startswith('/'):
             file_path = os.path.join(media_root, file_path)
         
+        # Размеченное видео рисуется в фоне после первого запроса (если есть задание)
+        if not os.path.exists(file_path) and \
+                os.path.abspath(file_path).startswith(os.path.abspath(media_root)):
+            from web.labeled_video import PENDING, request_render
+            if request_render(file_path) == PENDING:
+                response = JsonResponse({'status': 'pending', 'message': 'Видео с разметкой готовится'}, status=202)
+                response['Retry-After'] = '5'
+                return response
+        
         # Проверяем что файл существует и в пределах MEDIA_ROOT
         if not os.path.exists(file_path):
             return JsonResponse({'error': 'Файл не найден'}, status=404)
@@ -3367,6 +3406,31 @@ def api_find_analysis_files(request, analysis_id):
             'h5_file': None
         }
 
+        # Манифест разметки: точные пути без обхода папок
+        from web.pose_manifest import artifact_path, manifest_path, read_manifest
+        from urllib.parse import urlencode
+        media_root = Path("/home/ais/shared/horseAI/media")
+        for location in search_locations:
+            manifest = read_manifest(manifest_path(location, video_filename or base_name))
+            if manifest is None:
+                continue
+            
+            print(f"📒 Manifest: {manifest_path(location, video_filename or base_name)}")
+            web_files = {'base_name': base_name, 'video_id': video_id}
+            for key in found_files:
+                file_path = artifact_path(manifest, key)
+                if file_path is None or not file_path.is_relative_to(media_root):
+                    web_files[key] = None
+                elif file_path.exists():
+                    web_files[key] = f'/media/{file_path.relative_to(media_root)}'
+                elif key == 'labeled_video':
+                    # Еще не отрисовано: прокси нарисует его при первом запросе
+                    web_files[key] = '/api/video-proxy/?' + urlencode({'path': str(file_path)})
+                else:
+                    web_files[key] = None
+            print(f"📊 Final results: {web_files}")
+            return JsonResponse(web_files)
+
         # Простой поиск файлов
         for location in search_locations:
             if not location.exists():
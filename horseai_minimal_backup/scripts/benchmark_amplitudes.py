@@ -0,0 +1,80 @@
+"""
+Бенчмарк расчета амплитуд копыт: старый цикл calculate_amplitude
+против векторного segment_amplitudes на сигналах 4 x 10000 кадров.
+
+Запуск: python scripts/benchmark_amplitudes.py
+"""
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+current_dir = Path(__file__).parent
+parent_dir = current_dir.parent
+sys.path.append(str(parent_dir))
+
+from web.gait_features import segment_amplitudes
+
+
+def calculate_amplitude(signal, num_segments=5):
+    """Прежняя реализация из _compute_12_features (по одному копыту)"""
+    if len(signal) == 0:
+        return 0.0
+
+    segment_size = len(signal) // num_segments
+    segment_amplitudes = []
+
+    for i in range(num_segments):
+        start_idx = i * segment_size
+        end_idx = start_idx + segment_size
+        if i == num_segments - 1:
+            end_idx = len(signal)
+
+        segment = signal[start_idx:end_idx]
+        if len(segment) > 0:
+            q85, q15 = np.percentile(segment, [85, 15])
+            segment_amp = q85 - q15
+
+            if segment_amp > 0 and segment_amp < np.ptp(signal) * 0.8:
+                segment_amplitudes.append(segment_amp)
+
+    if not segment_amplitudes:
+        q85, q15 = np.percentile(signal, [85, 15])
+        return q85 - q15
+
+    return np.median(segment_amplitudes)
+
+
+def best_time(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(frames=10000, repeats=200):
+    rng = np.random.default_rng(0)
+    t = np.arange(frames)
+    block = np.stack([
+        rng.uniform(5, 30) * np.sin(2 * np.pi * t / rng.uniform(15, 40)) + rng.normal(0, 2, frames)
+        for _ in range(4)
+    ])
+
+    expected = np.array([calculate_amplitude(row) for row in block])
+    actual = segment_amplitudes(block)
+    print(f"Макс. расхождение: {np.max(np.abs(expected - actual)):.3e}")
+
+    loop_time = best_time(lambda: [calculate_amplitude(row) for row in block], repeats)
+    kernel_time = best_time(lambda: segment_amplitudes(block), repeats)
+
+    print(f"Кадров: {frames}, повторов: {repeats}")
+    print(f"Цикл calculate_amplitude: {loop_time * 1000:.3f} мс")
+    print(f"segment_amplitudes:       {kernel_time * 1000:.3f} мс")
+    print(f"Ускорение: {loop_time / kernel_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
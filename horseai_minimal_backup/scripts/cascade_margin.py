@@ -0,0 +1,129 @@
+"""
+Подбор полосы каскада RF -> NN (cascade_margin в model.pkl).
+
+Для каждой полосы на сохраненных признаках архива считается, какая доля
+анализов решается одним RF, насколько решения расходятся с полным
+гибридом (и с разметкой, если дан --labels) и сколько времени
+экономится на одном анализе. С --write выбранная полоса записывается
+в model.pkl; после этого пакет NumPy нужно экспортировать заново.
+
+Запуск: python scripts/cascade_margin.py [--labels labels.csv] [--max-disagreement 0.01] [--write]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+current_dir = Path(__file__).parent
+parent_dir = current_dir.parent
+sys.path.append(str(parent_dir))
+
+from web.feature_store import get_feature_store
+from web.horse_detector import HorseLamenessDetector
+from web.model_loader import load_model_file
+
+# Сколько анализов брать для замера задержки по одному
+TIMING_ROWS = 50
+
+
+def per_row_seconds(func, rows):
+    """Среднее время вызова func на одной строке"""
+    start = time.perf_counter()
+    for row in rows:
+        func(row[None, :])
+    return (time.perf_counter() - start) / len(rows)
+
+
+def write_margin(model_path: Path, margin: float):
+    # Как в реестре моделей: pickle со старыми путями модулей открывает ModelUnpickler
+    try:
+        model_data = joblib.load(model_path)
+    except (ImportError, AttributeError):
+        model_data = load_model_file(model_path)
+    model_data['cascade_margin'] = float(margin)
+    tmp = model_path.with_name(model_path.name + '.tmp')
+    joblib.dump(model_data, tmp)
+    tmp.replace(model_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Подбор полосы каскада RF -> NN")
+    parser.add_argument('--margins', default='0.05,0.1,0.15,0.2,0.25,0.3,0.35,0.4,0.45',
+                        help="Полосы через запятую")
+    parser.add_argument('--labels', default=None, help="CSV с колонками video_id, is_lame")
+    parser.add_argument('--max-disagreement', type=float, default=0.01,
+                        help="Допустимая доля решений, отличных от полного гибрида")
+    parser.add_argument('--write', action='store_true', help="Записать выбранную полосу в model.pkl")
+    args = parser.parse_args()
+
+    keys, X = get_feature_store().matrix()
+    if len(keys) == 0:
+        print("Хранилище признаков пусто")
+        return
+
+    detector = HorseLamenessDetector()
+    full = detector.predict_lameness_batch(X, cascade=False)
+    # Точный порог гибрида: threshold_used в результате округлен для показа
+    threshold = float(detector.key_thresholds.get('threshold_hybrid', 0.5))
+    full_pred = full['is_lame']
+
+    labels = None
+    if args.labels:
+        table = pd.DataFrame(keys).merge(pd.read_csv(args.labels), on='video_id', how='left')
+        labels = table['is_lame'].to_numpy(dtype=float)
+        print(f"Размеченных анализов: {int(np.isfinite(labels).sum())} из {len(labels)}")
+
+    # Задержка одного анализа: RF и нейросеть отдельно
+    X_scaled = detector.scaler.transform(X[:TIMING_ROWS])
+    rf_seconds = per_row_seconds(detector.hybrid_model.rf_model.predict_proba, X_scaled)
+    nn_seconds = per_row_seconds(detector._nn_predict, X_scaled)
+    full_seconds = rf_seconds + nn_seconds
+    print(f"RF: {rf_seconds * 1000:.2f} мс, NN: {nn_seconds * 1000:.2f} мс на анализ")
+    print(f"Анализов в архиве: {len(keys)}, порог гибрида: {threshold:.3f}")
+    print()
+
+    def accuracy(pred):
+        known = np.isfinite(labels)
+        return float((pred[known] == labels[known].astype(bool)).mean()) if known.any() else float('nan')
+
+    header = f"{'полоса':>7} {'только RF':>10} {'расхождение':>12} {'мс/анализ':>10} {'ускорение':>10}"
+    if labels is not None:
+        header += f" {'точность':>9}"
+        print(f"Точность полного гибрида: {accuracy(full_pred):.4f}")
+    print(header)
+
+    chosen = None
+    for margin in sorted(float(m) for m in args.margins.split(',')):
+        decided = detector._cascade_decided(full['rf_proba'], threshold, margin)
+        pred = np.where(decided, full['rf_proba'] >= threshold, full_pred)
+        disagreement = float((pred != full_pred).mean())
+        seconds = rf_seconds + (1 - decided.mean()) * nn_seconds
+
+        line = (f"{margin:>7.3f} {decided.mean():>10.1%} {disagreement:>12.2%} "
+                f"{seconds * 1000:>10.2f} {full_seconds / seconds:>9.2f}x")
+        if labels is not None:
+            line += f" {accuracy(pred):>9.4f}"
+        print(line)
+
+        # Самая узкая полоса (больше всего пропусков NN) в пределах допуска
+        if disagreement <= args.max_disagreement and chosen is None:
+            chosen = margin
+
+    print()
+    if chosen is None:
+        print(f"Ни одна полоса не укладывается в расхождение {args.max_disagreement:.2%}")
+        return
+    print(f"Выбрана полоса: {chosen:.3f}")
+
+    if args.write:
+        write_margin(detector.ml_model_path, chosen)
+        print(f"cascade_margin = {chosen:.3f} записан в {detector.ml_model_path}")
+        print("Пакет NumPy устарел: запустите scripts/export_numpy_bundle.py")
+
+
+if __name__ == "__main__":
+    main()
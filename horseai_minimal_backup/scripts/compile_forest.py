@@ -0,0 +1,58 @@
+"""
+Компиляция случайного леса из model.pkl в плоские массивы (CompiledForest).
+
+Деревья MyDecisionTree из rf_model гибридной модели складываются в общие
+массивы узлов и сохраняются в .npz рядом с моделью.
+
+Запуск: python scripts/compile_forest.py [--model model.pkl] [--output forest.npz]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+current_dir = Path(__file__).parent
+parent_dir = current_dir.parent
+sys.path.append(str(parent_dir))
+
+from frontend.ml_models import compile_forest
+from web.model_loader import MODEL_PATH, load_model_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Компиляция леса в плоские массивы")
+    parser.add_argument('--model', default=str(MODEL_PATH), help="Файл модели")
+    parser.add_argument('--output', default=None, help="Файл .npz (по умолчанию рядом с моделью)")
+    args = parser.parse_args()
+
+    model_path = Path(args.model)
+    output = Path(args.output) if args.output else model_path.with_name(model_path.stem + '_forest.npz')
+
+    model_data = load_model_file(model_path)
+    rf_model = model_data['hybrid_model'].rf_model
+    forest = compile_forest(rf_model)
+    forest.save(output)
+
+    print(f"Деревьев: {forest.n_trees}, узлов: {len(forest.feature)}, глубина: {forest.depth}")
+    print(f"Сохранено: {output}")
+
+    # Сверка с исходным лесом на случайных объектах
+    X = np.random.default_rng(0).normal(size=(1000, int(forest.feature.max()) + 1))
+    trees = getattr(rf_model, 'trees', None) or getattr(rf_model, 'estimators_', None)
+    if trees:
+        start = time.perf_counter()
+        expected = np.column_stack([[tree._predict_single(x, tree.tree) for x in X] for tree in trees])
+        dict_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = forest.leaf_values(X)
+        compiled_time = time.perf_counter() - start
+
+        print(f"Совпадение с исходными деревьями: {np.array_equal(expected, actual)}")
+        print(f"Словари: {dict_time * 1000:.1f} мс, массивы: {compiled_time * 1000:.1f} мс на 1000 объектов")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Экспорт model.pkl в пакет NumPy (web/inference_bundle.py).
+
+Пакет кладется рядом с моделью (model_bundle.npz) и подхватывается
+HorseLamenessDetector вместо model.pkl, пока model.pkl не изменится.
+Перед заменой пакета его вероятности сверяются с исходной моделью
+(допуск TOLERANCE); при расхождении прежний пакет остается.
+
+Запуск: python scripts/export_numpy_bundle.py [--model model.pkl] [--output model_bundle.npz]
+"""
+import argparse
+import sys
+from pathlib import Path
+
+current_dir = Path(__file__).parent
+parent_dir = current_dir.parent
+sys.path.append(str(parent_dir))
+
+from web.feature_store import get_feature_store
+from web.inference_bundle import TOLERANCE, bundle_path, export_bundle
+from web.model_registry import DEFAULT_MODEL_PATH
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт модели в пакет NumPy")
+    parser.add_argument('--model', default=str(DEFAULT_MODEL_PATH), help="Путь к model.pkl")
+    parser.add_argument('--output', default=None, help="Путь к пакету (по умолчанию рядом с моделью)")
+    args = parser.parse_args()
+
+    output = Path(args.output) if args.output else bundle_path(args.model)
+
+    # Сверяем на сохраненных признаках, если они есть
+    _, X = get_feature_store().matrix()
+    try:
+        meta = export_bundle(args.model, output, X_check=X if len(X) else None, tolerance=TOLERANCE)
+    except ValueError as e:
+        print(f"Пакет не записан: {e}")
+        sys.exit(1)
+
+    print(f"Пакет: {output}")
+    print(f"Слои нейросети: {', '.join(meta['nn_activations'])}")
+    print(f"Объединение: hybrid = {meta['combination'][0]:.4f} * rf + "
+          f"{meta['combination'][1]:.4f} * nn + {meta['combination'][2]:.4f}")
+    for name, diff in meta['max_abs_diff'].items():
+        print(f"  {name}: max |diff| = {diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
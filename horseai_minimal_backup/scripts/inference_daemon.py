@@ -0,0 +1,43 @@
+"""
+Запуск постоянного демона анализа видео (web/inference_daemon.py).
+
+Детектор и модели загружаются один раз; веб-процессы отправляют задания
+через Unix-сокет, если выставлено HORSEAI_INFERENCE_DAEMON=1.
+
+Запуск: python scripts/inference_daemon.py [--socket /home/ais/shared/horseAI/run/inference.sock]
+Проверка: python scripts/inference_daemon.py --ping
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+current_dir = Path(__file__).parent
+parent_dir = current_dir.parent
+sys.path.append(str(parent_dir))
+
+from web.inference_daemon import DEFAULT_SOCKET_PATH, DaemonUnavailable, InferenceDaemon, ping
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Демон анализа видео")
+    parser.add_argument('--socket', default=str(DEFAULT_SOCKET_PATH), help="Путь к Unix-сокету")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('HORSEAI_POSE_BATCH', '1')),
+                        help="Одновременных заданий (по умолчанию HORSEAI_POSE_BATCH)")
+    parser.add_argument('--ping', action='store_true', help="Показать состояние запущенного демона")
+    args = parser.parse_args()
+
+    if args.ping:
+        try:
+            print(json.dumps(ping(args.socket), ensure_ascii=False, indent=2))
+        except DaemonUnavailable as e:
+            print(f"Демон не отвечает: {e}")
+            sys.exit(1)
+        return
+
+    InferenceDaemon(args.socket, workers=args.workers).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
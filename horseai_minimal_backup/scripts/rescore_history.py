@@ -0,0 +1,51 @@
+"""
+Пересчет всех сохраненных признаков текущей моделью одним пакетом.
+
+Признаки берутся из хранилища (web/feature_store.py), DeepLabCut не
+запускается. Результат пишется в CSV.
+
+Запуск: python scripts/rescore_history.py [--output rescored.csv]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+current_dir = Path(__file__).parent
+parent_dir = current_dir.parent
+sys.path.append(str(parent_dir))
+
+from web.feature_store import get_feature_store
+from web.horse_detector import HorseLamenessDetector
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пересчет истории анализов")
+    parser.add_argument('--output', default='rescored.csv', help="CSV с результатами")
+    args = parser.parse_args()
+
+    keys, X = get_feature_store().matrix()
+    if len(keys) == 0:
+        print("Хранилище признаков пусто")
+        return
+
+    detector = HorseLamenessDetector()
+
+    start = time.perf_counter()
+    batch = detector.predict_lameness_batch(X)
+    elapsed = time.perf_counter() - start
+
+    table = pd.DataFrame(keys)
+    for column in ('is_lame', 'lameness_probability', 'confidence', 'diagnosis', 'diagnosis_note', 'path'):
+        table[column] = batch[column]
+    table.to_csv(args.output, index=False)
+
+    print(f"Пересчитано анализов: {len(table)} за {elapsed:.2f} с")
+    print(f"Хромых: {int(table['is_lame'].sum())}")
+    print(f"Результат: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Резидентная и разделяемая память воркеров веб-сервера.
+
+Для мастер-процесса gunicorn/uwsgi выводит Rss, Pss, Shared и Private
+каждого дочернего процесса. Если модель загружена до fork, большая часть
+ее страниц должна попадать в Shared, а Pss воркера - быть заметно меньше Rss.
+
+Запуск: python scripts/worker_memory.py <pid мастера>
+"""
+import sys
+from pathlib import Path
+
+current_dir = Path(__file__).parent
+parent_dir = current_dir.parent
+sys.path.append(str(parent_dir))
+
+from web.model_registry import process_memory
+
+
+def child_pids(pid):
+    """Дочерние процессы по /proc/<pid>/task/*/children"""
+    children = []
+    for task in Path(f'/proc/{pid}/task').iterdir():
+        children.extend(int(child) for child in (task / 'children').read_text().split())
+    return children
+
+
+def main():
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+
+    master = int(sys.argv[1])
+    mb = 2 ** 20
+    print(f"{'PID':>8} {'Rss, МБ':>10} {'Pss, МБ':>10} {'Shared, МБ':>11} {'Private, МБ':>12}")
+
+    total_rss = total_pss = 0
+    for pid in [master] + child_pids(master):
+        memory = process_memory(pid)
+        if memory is None:
+            continue
+        total_rss += memory['rss']
+        total_pss += memory['pss']
+        print(f"{pid:>8} {memory['rss'] / mb:>10.1f} {memory['pss'] / mb:>10.1f} "
+              f"{memory['shared'] / mb:>11.1f} {memory['private'] / mb:>12.1f}")
+
+    print(f"Сумма Rss: {total_rss / mb:.1f} МБ, сумма Pss (реально занято): {total_pss / mb:.1f} МБ")
+
+
+if __name__ == "__main__":
+    main()
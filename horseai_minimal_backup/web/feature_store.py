@@ -0,0 +1,162 @@
+"""
+Хранилище признаков походки в SQLite.
+
+Вектор из 12 признаков сохраняется по SHA-256 файла поз (H5) и версии
+кода признаков. Для неизмененного видео признаки не извлекаются повторно,
+а смена модели или порогов пересчитывается из сохраненных признаков без
+повторного запуска DeepLabCut.
+
+Несколько загрузок одного видео делят один H5 (web/pose_cache.py),
+поэтому связь video_id -> хэш H5 хранится в отдельной таблице videos.
+"""
+
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from web.gait_features import FEATURE_NAMES, FEATURE_VERSION, PawSignals
+from web.pose_data import load_paw_signals, pose_file_hash
+
+DEFAULT_STORE_PATH = Path("/home/ais/shared/horseAI/data/features.sqlite3")
+
+
+class FeatureStore:
+    """Таблица признаков: (sha256 H5, версия признаков) -> 12 признаков"""
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_STORE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            columns = ', '.join(f'{name} REAL NOT NULL' for name in FEATURE_NAMES)
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS features ("
+                f"h5_sha256 TEXT NOT NULL, feature_version INTEGER NOT NULL, "
+                f"video_id TEXT, h5_name TEXT, created_at REAL NOT NULL, {columns}, "
+                f"PRIMARY KEY (h5_sha256, feature_version))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS features_video_id ON features (video_id)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS videos ("
+                "video_id TEXT PRIMARY KEY, h5_sha256 TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        """Соединение на одну операцию: commit при успехе, всегда close"""
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, h5_sha256: str, feature_version: int = FEATURE_VERSION) -> Optional[Dict[str, float]]:
+        """Признаки по хэшу H5 (None, если еще не извлекались)"""
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(FEATURE_NAMES)} FROM features "
+                f"WHERE h5_sha256 = ? AND feature_version = ?",
+                (h5_sha256, feature_version)
+            ).fetchone()
+        return dict(zip(FEATURE_NAMES, row)) if row else None
+
+    def link_video(self, video_id, h5_sha256: str):
+        """Связать загрузку с H5, по которому посчитаны ее признаки"""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO videos (video_id, h5_sha256, created_at) VALUES (?, ?, ?)",
+                (str(video_id), h5_sha256, time.time())
+            )
+
+    def get_by_video(self, video_id, feature_version: int = FEATURE_VERSION) -> Optional[Dict[str, float]]:
+        """Признаки видео по связи video_id -> H5 (для старых строк - по столбцу video_id)"""
+        with self._connect() as conn:
+            row = conn.execute(
+                f"SELECT {', '.join('f.' + name for name in FEATURE_NAMES)} FROM videos v "
+                f"JOIN features f ON f.h5_sha256 = v.h5_sha256 "
+                f"WHERE v.video_id = ? AND f.feature_version = ?",
+                (str(video_id), feature_version)
+            ).fetchone()
+            if row:
+                return dict(zip(FEATURE_NAMES, row))
+            row = conn.execute(
+                f"SELECT {', '.join(FEATURE_NAMES)} FROM features "
+                f"WHERE video_id = ? AND feature_version = ? ORDER BY created_at DESC LIMIT 1",
+                (str(video_id), feature_version)
+            ).fetchone()
+        return dict(zip(FEATURE_NAMES, row)) if row else None
+
+    def put(self, h5_sha256: str, features: Dict[str, float], video_id=None,
+            h5_name: Optional[str] = None, feature_version: int = FEATURE_VERSION):
+        """Сохранить признаки (повторная запись заменяет строку) и связь с video_id"""
+        values = [float(features[name]) for name in FEATURE_NAMES]
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO features "
+                f"(h5_sha256, feature_version, video_id, h5_name, created_at, {', '.join(FEATURE_NAMES)}) "
+                f"VALUES (?, ?, ?, ?, ?, {', '.join('?' * len(FEATURE_NAMES))})",
+                [h5_sha256, feature_version, None if video_id is None else str(video_id),
+                 h5_name, now] + values
+            )
+            if video_id is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO videos (video_id, h5_sha256, created_at) VALUES (?, ?, ?)",
+                    (str(video_id), h5_sha256, now)
+                )
+
+    def matrix(self, feature_version: int = FEATURE_VERSION) -> Tuple[List[dict], np.ndarray]:
+        """Все сохраненные признаки: описания строк и матрица N x 12 для пересчета"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT h5_sha256, video_id, h5_name, {', '.join(FEATURE_NAMES)} FROM features "
+                f"WHERE feature_version = ? ORDER BY created_at",
+                (feature_version,)
+            ).fetchall()
+
+        keys = [{'h5_sha256': row[0], 'video_id': row[1], 'h5_name': row[2]} for row in rows]
+        X = np.array([row[3:] for row in rows], dtype=float).reshape(len(rows), len(FEATURE_NAMES))
+        return keys, X
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_feature_store() -> FeatureStore:
+    """Общее хранилище признаков процесса"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = FeatureStore()
+        return _default_store
+
+
+def get_or_extract_features(h5_file: Union[str, Path], video_id=None,
+                            signals: Optional[PawSignals] = None,
+                            store: Optional[FeatureStore] = None) -> Optional[Dict[str, float]]:
+    """Признаки из хранилища по хэшу H5, при промахе - извлечь и сохранить"""
+    store = store or get_feature_store()
+    h5_sha256 = pose_file_hash(h5_file)
+
+    features = store.get(h5_sha256)
+    if features is not None:
+        # Повторная загрузка того же видео: признаки общие, связь - своя
+        if video_id is not None:
+            store.link_video(video_id, h5_sha256)
+        return features
+
+    if signals is None:
+        signals = load_paw_signals(h5_file)
+    features = signals.features() if signals is not None else None
+    if features is None:
+        return None
+
+    store.put(h5_sha256, features, video_id=video_id, h5_name=Path(h5_file).name)
+    return features
@@ -12,6 +12,10 @@ from pathlib import Path
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 
+from web.inference_daemon import DaemonUnavailable, analyze_video as analyze_in_daemon, daemon_enabled
+from web.labeled_video import MISSING, PENDING, READY, request_render
+from web.pose_manifest import artifact_path, read_manifest
+
 # Глобальное хранилище
 _analyses = {}
 
@@ -83,6 +87,40 @@ def run_final_detector(video_id):
         
         analysis['progress'] = 20
         analysis['message'] = 'Запуск ВАШЕГО детектора...'
+
+        if daemon_enabled():
+            def on_progress(event):
+                if event['type'] == 'progress':
+                    analysis['progress'] = event['progress']
+                    analysis['message'] = event['message']
+                elif event['type'] == 'preview':
+                    # Предварительный результат, пока идет полный анализ
+                    if event.get('result'):
+                        analysis['preview'] = format_for_frontend(event['result'], video_id)
+                        analysis['message'] = 'Предварительный результат готов, идет полный анализ'
+                else:
+                    analysis['message'] = f"В очереди: {event['position']}"
+
+            try:
+                result = format_for_frontend(
+                    analyze_in_daemon(video_path, output_dir=output_dir, on_progress=on_progress, preview=True),
+                    video_id
+                )
+                analysis['status'] = 'completed'
+                analysis['progress'] = 100
+                analysis['message'] = 'Анализ завершен'
+                analysis['result'] = result
+                if result.get('manifest'):
+                    # Размеченное видео рисуется при первом скачивании
+                    result['annotated_video_url'] = f'/api/lameness/final/download/{video_id}/'
+                return
+            except DaemonUnavailable as e:
+                print(f"Демон недоступен ({e}), запуск детектора отдельным процессом")
+            except TimeoutError:
+                analysis['status'] = 'failed'
+                analysis['error'] = 'Таймаут анализа (600 секунд)'
+                analysis['message'] = 'Анализ превысил лимит времени'
+                return
         
         # Команда для запуска ВАШЕГО детектора
         cmd = [
@@ -237,7 +275,8 @@ def format_for_frontend(result, video_id):
         'video_name': result.get('video_name', ''),
         'processing_time_seconds': result.get('processing_time', 0),
         'labeled_video': result.get('labeled_video'),
-        'h5_file': result.get('h5_file')
+        'h5_file': result.get('h5_file'),
+        'manifest': result.get('manifest')
     }
 
 def convert_to_frontend_format(result, video_id):
@@ -271,16 +310,26 @@ def convert_to_frontend_format(result, video_id):
             'processing_time_seconds': 0
         }
 
-def save_annotated_video(video_id, video_name, output_dir):
-    """Сохраняет размеченное видео в медиа"""
+def save_annotated_video(video_id, video_name, output_dir, manifest=None):
+    """Сохраняет размеченное видео в медиа
+
+    С манифестом разметки путь берется из него, без поиска по папке
+    (видео должно быть уже отрисовано, см. request_render).
+    """
     try:
-        # Ищем видео файл
-        video_files = list(output_dir.glob(f"*{video_name}"))
-        if not video_files:
-            # Пробуем другие шаблоны
-            video_files = list(output_dir.glob("*labeled*.mp4")) + \
-                         list(output_dir.glob("*_sk.mp4")) + \
-                         list(output_dir.glob("*.mp4"))
+        video_files = []
+        labeled_video = artifact_path(read_manifest(manifest), 'labeled_video') if manifest else None
+        if labeled_video and labeled_video.exists():
+            video_files = [labeled_video]
+        
+        if not video_files and output_dir is not None:
+            # Ищем видео файл
+            video_files = list(output_dir.glob(f"*{video_name}"))
+            if not video_files:
+                # Пробуем другие шаблоны
+                video_files = list(output_dir.glob("*labeled*.mp4")) + \
+                             list(output_dir.glob("*_sk.mp4")) + \
+                             list(output_dir.glob("*.mp4"))
         
         if video_files:
             # Копируем в медиа
@@ -347,7 +396,20 @@ def download_annotated_final(request, video_id):
     if media_file.exists():
         video_file = media_file
     
-    # 2. В output директории
+    # 2. По манифесту разметки из демона (видео рисуется в фоне после первого запроса)
+    manifest = (analysis.get('result') or {}).get('manifest')
+    if not video_file and manifest:
+        labeled_video = artifact_path(read_manifest(manifest), 'labeled_video')
+        state = request_render(labeled_video) if labeled_video else MISSING
+        if state == PENDING:
+            response = JsonResponse({'status': 'pending', 'message': 'Видео с разметкой готовится, повторите запрос'},
+                                    status=202)
+            response['Retry-After'] = '5'
+            return response
+        if state == READY and save_annotated_video(video_id, None, None, manifest=manifest):
+            video_file = media_file
+    
+    # 3. В output директории
     if not video_file and 'video_path' in analysis:
         video_dir = Path(analysis['video_path']).parent.parent / 'final_output' / video_id
         if video_dir.exists():
@@ -0,0 +1,692 @@
+"""
+Извлечение 12 признаков походки из данных поз DeepLabCut.
+
+Модуль не зависит от deeplabcut и matplotlib, поэтому его можно
+использовать для пересчета архива без загрузки тяжелых библиотек.
+"""
+
+import warnings
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.interpolate import CubicSpline
+from scipy.signal import savgol_coeffs
+
+# Порядок признаков, в котором их ожидает scaler модели
+FEATURE_NAMES = [
+    'front_asymmetry', 'back_asymmetry', 'min_amplitude',
+    'back_front_ratio', 'front_left_var', 'front_right_var',
+    'front_sync', 'back_sync', 'diagonal_sync',
+    'front_velocity', 'front_jerk', 'total_rom'
+]
+
+PAW_NAMES = ['front_left', 'front_right', 'back_left', 'back_right']
+
+# Версия кода признаков: увеличивать при любом изменении их значений,
+# чтобы сохраненные в хранилище признаки пересчитывались
+FEATURE_VERSION = 1
+
+# Скользящие окна временной шкалы признаков в кадрах (5 с и 1 с при 30 fps)
+TIMELINE_WINDOW = 150
+TIMELINE_STRIDE = 30
+
+
+class PawColumns(NamedTuple):
+    """Позиции столбцов копыт в порядке PAW_NAMES (None - столбец не найден)"""
+    y: Tuple[Optional[int], ...]
+    likelihood: Tuple[Optional[int], ...]
+
+    @property
+    def complete(self) -> bool:
+        return all(position is not None for position in self.y)
+
+
+# Кэш на все время жизни процесса: отпечаток схемы столбцов -> позиции копыт
+_paw_columns_cache: Dict[tuple, PawColumns] = {}
+
+
+def _schema_fingerprint(columns: pd.Index) -> tuple:
+    """Отпечаток схемы столбцов без перебора всех меток"""
+    if isinstance(columns, pd.MultiIndex):
+        return (tuple(tuple(level) for level in columns.levels),
+                tuple(codes.tobytes() for codes in columns.codes))
+    return tuple(columns)
+
+
+def _scan_paw_columns(columns: pd.Index) -> PawColumns:
+    """Найти y- и likelihood-столбцы четырех копыт в MultiIndex DLC"""
+    y_positions = dict.fromkeys(PAW_NAMES)
+    likelihood_positions = dict.fromkeys(PAW_NAMES)
+
+    for position, col in enumerate(columns):
+        if not isinstance(col, tuple) or len(col) < 4:
+            continue
+
+        part_name = str(col[2])
+        coord = str(col[3])
+
+        if coord == 'y':
+            target = y_positions
+        elif coord == 'likelihood':
+            target = likelihood_positions
+        else:
+            continue
+
+        for paw in PAW_NAMES:
+            if f'{paw}_paw' in part_name:
+                target[paw] = position
+                break
+
+    return PawColumns(
+        y=tuple(y_positions[paw] for paw in PAW_NAMES),
+        likelihood=tuple(likelihood_positions[paw] for paw in PAW_NAMES)
+    )
+
+
+def resolve_paw_columns(columns: pd.Index) -> PawColumns:
+    """Позиции столбцов копыт с кэшированием по схеме столбцов"""
+    key = _schema_fingerprint(columns)
+    resolved = _paw_columns_cache.get(key)
+    if resolved is None:
+        resolved = _scan_paw_columns(columns)
+        _paw_columns_cache[key] = resolved
+    return resolved
+
+
+def paw_y_values(df: pd.DataFrame, paw_columns: PawColumns) -> np.ndarray:
+    """Матрица T x 4 координат y копыт (выборка по позициям столбцов)"""
+    return df.take(list(paw_columns.y), axis=1).to_numpy()
+
+
+# ----------------------------------------------------------------------
+# Сглаживание
+# ----------------------------------------------------------------------
+
+@lru_cache(maxsize=None)
+def _savgol_coefficients(window_length: int, polyorder: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Коэффициенты Савицкого-Голея для центра окна и каждой его позиции (кэшируются)"""
+    center = savgol_coeffs(window_length, polyorder, use='dot')
+    edges = np.stack([savgol_coeffs(window_length, polyorder, pos=pos, use='dot')
+                      for pos in range(window_length)])
+    center.setflags(write=False)
+    edges.setflags(write=False)
+    return center, edges
+
+
+def savgol_window(n_frames: int) -> int:
+    """Длина окна сглаживания для сигнала из n_frames кадров"""
+    window_length = min(11, n_frames if n_frames % 2 == 1 else n_frames - 1)
+    return max(window_length, 5)
+
+
+def _savgol_rows(x: np.ndarray, lengths: np.ndarray,
+                 window_length: int = 11, polyorder: int = 3) -> np.ndarray:
+    """savgol_filter (mode='interp') по последней оси M x 4 x T для строк разной длины"""
+    half = window_length // 2
+    center, edges = _savgol_coefficients(window_length, polyorder)
+
+    out = np.full_like(x, np.nan)
+    out[..., half:x.shape[-1] - half] = sliding_window_view(x, window_length, axis=-1) @ center
+
+    # Края: полином по первому и последнему окну каждой строки
+    out[..., :half] = x[..., :window_length] @ edges[:half].T
+
+    tail_idx = lengths[:, None] - window_length + np.arange(window_length)
+    tail = np.take_along_axis(x, np.broadcast_to(tail_idx[:, None, :], x.shape[:2] + (window_length,)), axis=-1)
+    right_idx = lengths[:, None] - half + np.arange(half)
+    np.put_along_axis(out, np.broadcast_to(right_idx[:, None, :], x.shape[:2] + (half,)),
+                      tail @ edges[half + 1:].T, axis=-1)
+
+    valid = np.arange(x.shape[-1]) < lengths[:, None]
+    out[~np.broadcast_to(valid[:, None, :], out.shape)] = np.nan
+    return out
+
+
+def smooth_signals(block: np.ndarray, polyorder: int = 3) -> np.ndarray:
+    """Сгладить все строки блока 4 x T одним проходом вдоль axis=1
+
+    Совпадает с savgol_filter по каждой строке; если сигнал короче окна,
+    возвращается без сглаживания, как и раньше.
+    """
+    block = np.asarray(block, dtype=float)
+    n_frames = block.shape[1]
+    window_length = savgol_window(n_frames)
+    if window_length > n_frames:
+        return block.copy()
+    return _savgol_rows(block[None], np.array([n_frames]), window_length, polyorder)[0]
+
+
+class PawSignals:
+    """Сигналы четырех копыт одного видео (строки в порядке PAW_NAMES)
+
+    Строится один раз на видео и используется для признаков, графиков
+    и текстового отчета. raw и masked нужны только для отображения и
+    хранятся в float32; centered и smoothed остаются float64, чтобы
+    признаки совпадали с обучающим пайплайном.
+    """
+    __slots__ = ('raw', 'frame_indices', 'masked', 'centered', 'smoothed',
+                 '_amplitudes', '_ranges')
+
+    def __init__(self, raw: np.ndarray, frame_indices: np.ndarray,
+                 centered: np.ndarray, smoothed: np.ndarray):
+        self.raw = np.ascontiguousarray(raw, dtype=np.float32)
+        self.frame_indices = frame_indices
+        self.masked = self.raw[:, frame_indices]
+        self.centered = centered
+        self.smoothed = smoothed
+        self._amplitudes = None
+        self._ranges = None
+
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> Optional['PawSignals']:
+        """Построить сигналы из таблицы DLC (None, если копыт или кадров мало)"""
+        paw_columns = resolve_paw_columns(df.columns)
+        if not paw_columns.complete:
+            return None
+        return cls.from_raw(-paw_y_values(df, paw_columns).T)
+
+    @classmethod
+    def from_raw(cls, raw: np.ndarray) -> Optional['PawSignals']:
+        """Построить сигналы из блока 4 x T (координаты y уже с обратным знаком)"""
+        raw = np.asarray(raw, dtype=float)
+
+        # Фильтрация
+        finite = np.isfinite(raw)
+        if np.any(finite.sum(axis=1) < 10):
+            return None
+
+        common_indices = np.where(finite.all(axis=0))[0]
+        if len(common_indices) < 20:
+            return None
+
+        # Нормализация
+        signal = raw[:, common_indices]
+        centered = signal - signal.mean(axis=1, keepdims=True)
+
+        return cls(raw, common_indices, centered, smooth_signals(centered))
+
+    @property
+    def n_frames(self) -> int:
+        return self.smoothed.shape[1]
+
+    def as_dict(self, kind: str = 'smoothed') -> Dict[str, np.ndarray]:
+        """Строки выбранного массива по именам копыт (без копирования)"""
+        block = getattr(self, kind)
+        return {paw: block[i] for i, paw in enumerate(PAW_NAMES)}
+
+    @property
+    def amplitudes(self) -> np.ndarray:
+        """Устойчивые амплитуды копыт по сегментам (кэшируются)"""
+        if self._amplitudes is None:
+            self._amplitudes = segment_amplitudes(self.smoothed)
+        return self._amplitudes
+
+    @property
+    def ranges(self) -> np.ndarray:
+        """Размах (ptp) исходных сигналов копыт (кэшируется)"""
+        if self._ranges is None:
+            self._ranges = np.ptp(self.masked, axis=1)
+        return self._ranges
+
+    def features(self) -> Optional[Dict[str, float]]:
+        """12 признаков по сглаженным сигналам"""
+        features = _compute_12_features(self.as_dict(), amplitudes=self.amplitudes)
+        return features if features else None
+
+    def timeline(self, window: int = TIMELINE_WINDOW, stride: int = TIMELINE_STRIDE,
+                 fps: Optional[float] = None) -> dict:
+        """Признаки по скользящим окнам для графика в интерфейсе
+
+        Окна берутся по общим кадрам с видимыми копытами; frames - номер
+        кадра видео в центре окна.
+        """
+        window = min(window, self.n_frames)
+        starts, X = feature_timeline(self.smoothed, window=window, stride=stride)
+        centers = self.frame_indices[starts + window // 2]
+
+        timeline = {
+            'window': window,
+            'stride': stride,
+            'frames': centers.tolist(),
+            'features': {name: X[:, j].tolist() for j, name in enumerate(FEATURE_NAMES)},
+        }
+        if fps:
+            timeline['seconds'] = np.round(centers / fps, 2).tolist()
+        return timeline
+
+
+def upsample_preview(raw: np.ndarray, step: int, scale: float = 1.0) -> np.ndarray:
+    """Сигналы предпросмотра (каждый step-й кадр, уменьшение scale) в шкале полного видео
+
+    Признаки зависят от частоты кадров (скорость и рывок считаются по
+    разностям соседних кадров, окно сглаживания - в кадрах) и от масштаба
+    координат, поэтому координаты делятся на scale, а пропущенные кадры
+    восстанавливаются кубическим сплайном. Между соседними кадрами
+    предпросмотра, где копыто не видно хотя бы в одном, остается nan.
+    """
+    raw = np.asarray(raw, dtype=float) / scale
+    n = raw.shape[1]
+    dense_t = np.arange((n - 1) * step + 1) / step
+    left = np.floor(dense_t).astype(int)
+    right = np.minimum(left + 1, n - 1)
+
+    dense = np.full((raw.shape[0], len(dense_t)), np.nan)
+    for i, row in enumerate(raw):
+        finite = np.isfinite(row)
+        if finite.sum() < 4:
+            continue
+        knots = np.where(finite)[0]
+        values = CubicSpline(knots, row[knots])(dense_t)
+        dense[i] = np.where(finite[left] & finite[right], values, np.nan)
+    return dense
+
+
+def extract_features(df: pd.DataFrame) -> Optional[Dict[str, float]]:
+    """Извлечь 12 признаков из DataFrame"""
+    try:
+        signals = PawSignals.from_dataframe(df)
+        if signals is None:
+            return None
+
+        return signals.features()
+
+    except Exception as e:
+        warnings.warn(f"Ошибка при извлечении признаков: {str(e)}")
+        return None
+
+
+def _lerp(a, b, t):
+    """Линейная интерполяция в том же виде, что в np.percentile"""
+    diff = b - a
+    return np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)
+
+
+def _sorted_quantile(sorted_values: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    """Квантиль по последней оси массива, отсортированного с NaN в конце"""
+    position = (counts - 1) * q
+    lo = np.floor(position).astype(int)
+    hi = np.minimum(lo + 1, np.maximum(counts - 1, 0))
+    lo = np.maximum(lo, 0)
+
+    a = np.take_along_axis(sorted_values, lo[..., None], axis=-1)[..., 0]
+    b = np.take_along_axis(sorted_values, hi[..., None], axis=-1)[..., 0]
+    return _lerp(a, b, position - np.floor(position))
+
+
+def _accepted_median(seg_amp: np.ndarray, ptp: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Медиана амплитуд сегментов, прошедших фильтр выбросов, и их число
+
+    Сегмент принимается, если 0 < amp < 0.8 * ptp всего сигнала.
+    """
+    accepted = (seg_amp > 0) & (seg_amp < ptp[..., None] * 0.8)
+
+    kept = np.sort(np.where(accepted, seg_amp, np.nan), axis=-1)
+    k = accepted.sum(axis=-1)
+    lo = np.maximum((k - 1) // 2, 0)
+    hi = np.maximum(k // 2, 0)
+    median = (np.take_along_axis(kept, lo[..., None], axis=-1)[..., 0] +
+              np.take_along_axis(kept, hi[..., None], axis=-1)[..., 0]) / 2
+    return median, k
+
+
+def segment_amplitudes(block: np.ndarray, num_segments: int = 5) -> np.ndarray:
+    """Устойчивые амплитуды всех строк блока 4 x T за один проход
+
+    Сигнал делится на num_segments сегментов (последний забирает остаток),
+    для каждого считается размах между 85-м и 15-м перцентилями, выбросы
+    отбрасываются, берется медиана. Если ни один сегмент не принят -
+    размах перцентилей всего сигнала.
+    """
+    block = np.asarray(block, dtype=float)
+    n_rows, n = block.shape
+    if n == 0:
+        return np.zeros(n_rows)
+
+    size = n // num_segments
+    head = size * (num_segments - 1)
+    tail = n - head
+
+    # Сегменты строк: n_rows x num_segments x tail, короткие дополнены NaN
+    segments = np.full((n_rows, num_segments, tail), np.nan)
+    segments[:, :-1, :size] = block[:, :head].reshape(n_rows, num_segments - 1, size)
+    segments[:, -1] = block[:, head:]
+    segments.sort(axis=-1)
+
+    counts = np.broadcast_to([size] * (num_segments - 1) + [tail], segments.shape[:-1])
+    seg_amp = _sorted_quantile(segments, counts, 0.85) - _sorted_quantile(segments, counts, 0.15)
+
+    median, k = _accepted_median(seg_amp, np.ptp(block, axis=1))
+    if np.all(k > 0):
+        return median
+
+    q85, q15 = np.percentile(block, [85, 15], axis=1)
+    return np.where(k > 0, median, q85 - q15)
+
+
+def _compute_12_features(signals: Dict[str, np.ndarray],
+                         amplitudes: Optional[Sequence[float]] = None) -> Dict[str, float]:
+    """Вычислить 12 признаков (amplitudes - уже посчитанные амплитуды копыт)"""
+    # Расчет амплитуд
+    if amplitudes is None:
+        amplitudes = segment_amplitudes(np.stack([signals[paw] for paw in PAW_NAMES]))
+    amp_fl, amp_fr, amp_bl, amp_br = amplitudes
+
+    features = {}
+
+    # 12 признаков
+    features['front_asymmetry'] = abs(amp_fl - amp_fr) / (amp_fl + amp_fr + 1e-10)
+    features['back_asymmetry'] = abs(amp_bl - amp_br) / (amp_bl + amp_br + 1e-10)
+    features['min_amplitude'] = min(amp_fl, amp_fr, amp_bl, amp_br)
+
+    front_avg = (amp_fl + amp_fr) / 2
+    back_avg = (amp_bl + amp_br) / 2
+
+    features['back_front_ratio'] = back_avg / (front_avg + 1e-10)
+
+    features['front_left_var'] = np.std(signals['front_left'])
+    features['front_right_var'] = np.std(signals['front_right'])
+
+    def correlation(s1, s2):
+        if np.std(s1) < 1e-10 or np.std(s2) < 1e-10:
+            return 0.0
+        return np.corrcoef(s1, s2)[0, 1]
+
+    features['front_sync'] = correlation(signals['front_left'], signals['front_right'])
+    features['back_sync'] = correlation(signals['back_left'], signals['back_right'])
+    features['diagonal_sync'] = correlation(signals['front_left'], signals['back_right'])
+
+    vel_fl = np.mean(np.abs(np.diff(signals['front_left'])))
+    vel_fr = np.mean(np.abs(np.diff(signals['front_right'])))
+    features['front_velocity'] = (vel_fl + vel_fr) / 2
+
+    acc_fl = np.diff(np.diff(signals['front_left']))
+    features['front_jerk'] = np.std(acc_fl) if len(acc_fl) > 0 else 0
+
+    features['total_rom'] = (amp_fl + amp_fr + amp_bl + amp_br) / 4
+
+    # Проверка
+    for key, value in features.items():
+        if not np.isfinite(value):
+            features[key] = 0.0
+
+    return features
+
+
+# ----------------------------------------------------------------------
+# Пакетное извлечение признаков
+# ----------------------------------------------------------------------
+
+def _paw_block(df: pd.DataFrame) -> Optional[np.ndarray]:
+    """Блок 4 x T общих конечных кадров копыт или None (те же правила, что в extract_features)"""
+    paw_columns = resolve_paw_columns(df.columns)
+    if not paw_columns.complete:
+        return None
+
+    raw = -paw_y_values(df, paw_columns).T.astype(float)
+
+    finite = np.isfinite(raw)
+    if np.any(finite.sum(axis=1) < 10):
+        return None
+
+    common_mask = finite.all(axis=0)
+    if common_mask.sum() < 20:
+        return None
+
+    return raw[:, common_mask]
+
+
+def _pad_blocks(blocks: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Сложить блоки 4 x T_i в массив M x 4 x T_max, дополненный NaN"""
+    lengths = np.array([block.shape[1] for block in blocks])
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+
+    flat = np.concatenate(blocks, axis=1)
+    rows = np.repeat(np.arange(len(blocks)), lengths)
+    cols = np.arange(flat.shape[1]) - np.repeat(starts, lengths)
+
+    padded = np.full((len(blocks), len(PAW_NAMES), lengths.max()), np.nan)
+    padded[rows, :, cols] = flat.T
+    return padded, lengths
+
+
+def _batch_amplitudes(signals: np.ndarray, lengths: np.ndarray, num_segments: int = 5) -> np.ndarray:
+    """Амплитуды копыт (M x 4) для строк разной длины, как в segment_amplitudes"""
+    n_videos, n_paws, _ = signals.shape
+    segment_size = lengths // num_segments
+
+    # Длины сегментов: последний забирает остаток
+    seg_lengths = np.repeat(segment_size[:, None], num_segments, axis=1)
+    seg_lengths[:, -1] = lengths - segment_size * (num_segments - 1)
+    max_seg = seg_lengths.max()
+
+    offsets = np.arange(max_seg)
+    idx = segment_size[:, None, None] * np.arange(num_segments)[None, :, None] + offsets
+    inside = offsets < seg_lengths[:, :, None]
+    idx = np.where(inside, idx, 0)
+
+    gathered = signals[np.arange(n_videos)[:, None, None, None],
+                       np.arange(n_paws)[None, :, None, None],
+                       idx[:, None, :, :]]
+    gathered = np.where(inside[:, None, :, :], gathered, np.nan)
+    gathered.sort(axis=-1)
+
+    counts = np.broadcast_to(seg_lengths[:, None, :], gathered.shape[:-1])
+    seg_amp = _sorted_quantile(gathered, counts, 0.85) - _sorted_quantile(gathered, counts, 0.15)
+
+    ptp = np.nanmax(signals, axis=-1) - np.nanmin(signals, axis=-1)
+    median, k = _accepted_median(seg_amp, ptp)
+
+    # Нет принятых сегментов: квантили всего сигнала
+    full_sorted = np.sort(signals, axis=-1)
+    full_counts = np.broadcast_to(lengths[:, None], (n_videos, n_paws))
+    fallback = _sorted_quantile(full_sorted, full_counts, 0.85) - _sorted_quantile(full_sorted, full_counts, 0.15)
+
+    return np.where(k > 0, median, fallback)
+
+
+def _masked_mean(values: np.ndarray, mask: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    return np.where(mask, values, 0.0).sum(axis=-1) / counts
+
+
+def _batch_features(signals: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """12 признаков для сглаженных сигналов M x 4 x T_max"""
+    fl, fr, bl, br = range(4)
+    positions = np.arange(signals.shape[-1])
+    mask = (positions < lengths[:, None])[:, None, :]
+    counts = lengths[:, None].astype(float)
+
+    amps = _batch_amplitudes(signals, lengths)
+
+    mean = _masked_mean(signals, mask, counts)
+    centered = np.where(mask, signals - mean[..., None], 0.0)
+    std = np.sqrt((centered ** 2).sum(axis=-1) / counts)
+
+    def correlation(i, j):
+        cov = (centered[:, i] * centered[:, j]).sum(axis=-1)
+        var_i = (centered[:, i] ** 2).sum(axis=-1)
+        var_j = (centered[:, j] ** 2).sum(axis=-1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = np.clip(cov / np.sqrt(var_i) / np.sqrt(var_j), -1, 1)
+        flat = (std[:, i] < 1e-10) | (std[:, j] < 1e-10)
+        return np.where(flat, 0.0, corr)
+
+    velocity_mask = (positions[:-1] < lengths[:, None] - 1)[:, None, :]
+    velocity = _masked_mean(np.abs(np.diff(signals, axis=-1)), velocity_mask, counts - 1)
+
+    jerk_mask = positions[:-2] < lengths[:, None] - 2
+    acc = np.diff(signals[:, fl], n=2, axis=-1)
+    acc_mean = _masked_mean(acc, jerk_mask, lengths - 2.0)
+    acc_centered = np.where(jerk_mask, acc - acc_mean[:, None], 0.0)
+    jerk = np.sqrt((acc_centered ** 2).sum(axis=-1) / (lengths - 2.0))
+
+    front_avg = (amps[:, fl] + amps[:, fr]) / 2
+    back_avg = (amps[:, bl] + amps[:, br]) / 2
+
+    columns = {
+        'front_asymmetry': np.abs(amps[:, fl] - amps[:, fr]) / (amps[:, fl] + amps[:, fr] + 1e-10),
+        'back_asymmetry': np.abs(amps[:, bl] - amps[:, br]) / (amps[:, bl] + amps[:, br] + 1e-10),
+        'min_amplitude': amps.min(axis=1),
+        'back_front_ratio': back_avg / (front_avg + 1e-10),
+        'front_left_var': std[:, fl],
+        'front_right_var': std[:, fr],
+        'front_sync': correlation(fl, fr),
+        'back_sync': correlation(bl, br),
+        'diagonal_sync': correlation(fl, br),
+        'front_velocity': (velocity[:, fl] + velocity[:, fr]) / 2,
+        'front_jerk': jerk,
+        'total_rom': amps.sum(axis=1) / 4,
+    }
+
+    X = np.column_stack([columns[name] for name in FEATURE_NAMES])
+    X[~np.isfinite(X)] = 0.0
+    return X
+
+
+def extract_features_batch(dfs: Sequence[pd.DataFrame]) -> Tuple[np.ndarray, np.ndarray]:
+    """Извлечь 12 признаков для набора DataFrame за один векторный проход
+
+    Возвращает матрицу N x 12 в порядке FEATURE_NAMES и булеву маску
+    валидных строк. Строки, для которых extract_features вернул бы None,
+    заполнены NaN.
+    """
+    X = np.full((len(dfs), len(FEATURE_NAMES)), np.nan)
+    valid = np.zeros(len(dfs), dtype=bool)
+
+    blocks = []
+    for i, df in enumerate(dfs):
+        try:
+            block = _paw_block(df)
+        except Exception as e:
+            warnings.warn(f"Ошибка при извлечении признаков: {str(e)}")
+            block = None
+        if block is not None:
+            blocks.append(block)
+            valid[i] = True
+
+    if not blocks:
+        return X, valid
+
+    signals, lengths = _pad_blocks(blocks)
+    signals = signals - _masked_mean(signals, np.isfinite(signals), lengths[:, None].astype(float))[..., None]
+    # Все длины >= 20 кадров, поэтому окно у всех строк одно: savgol_window(20) == 11
+    smoothed = _savgol_rows(signals, lengths, savgol_window(int(lengths.min())))
+
+    X[valid] = _batch_features(smoothed, lengths)
+    return X, valid
+
+
+# ----------------------------------------------------------------------
+# Признаки по скользящим окнам
+# ----------------------------------------------------------------------
+
+def _window_sums(values: np.ndarray, window: int, starts: np.ndarray) -> np.ndarray:
+    """Суммы по окнам [s, s + window) последней оси через кумулятивные суммы"""
+    csum = np.zeros(values.shape[:-1] + (values.shape[-1] + 1,))
+    np.cumsum(values, axis=-1, out=csum[..., 1:])
+    return csum[..., starts + window] - csum[..., starts]
+
+
+def _piece_ranges(block: np.ndarray, length: int,
+                  starts: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Размах 85/15 перцентилей, минимум и максимум отрезков [s, s + length)
+
+    Каждый отрезок сортируется один раз, даже если он входит в несколько
+    соседних окон (при шаге, кратном длине сегмента).
+    """
+    unique, inverse = np.unique(starts, return_inverse=True)
+    pieces = np.sort(sliding_window_view(block, length, axis=-1)[:, unique], axis=-1)
+    counts = np.full(pieces.shape[:-1], length)
+    amp = _sorted_quantile(pieces, counts, 0.85) - _sorted_quantile(pieces, counts, 0.15)
+    return amp[:, inverse], pieces[..., 0][:, inverse], pieces[..., -1][:, inverse]
+
+
+def _window_amplitudes(block: np.ndarray, window: int, starts: np.ndarray,
+                       num_segments: int = 5) -> np.ndarray:
+    """segment_amplitudes для каждого окна блока: массив строк x окон"""
+    n_rows = block.shape[0]
+    size = window // num_segments
+    head = size * (num_segments - 1)
+
+    head_starts = starts[:, None] + size * np.arange(num_segments - 1)
+    amp, lo, hi = _piece_ranges(block, size, head_starts.ravel())
+    shape = (n_rows, len(starts), num_segments - 1)
+    tail_amp, tail_lo, tail_hi = _piece_ranges(block, window - head, starts + head)
+
+    seg_amp = np.concatenate([amp.reshape(shape), tail_amp[..., None]], axis=-1)
+    ptp = (np.maximum(hi.reshape(shape).max(axis=-1), tail_hi) -
+           np.minimum(lo.reshape(shape).min(axis=-1), tail_lo))
+
+    median, k = _accepted_median(seg_amp, ptp)
+
+    # Окна без принятых сегментов (редко): перцентили всего окна
+    for row, w in zip(*np.nonzero(k == 0)):
+        q85, q15 = np.percentile(block[row, starts[w]:starts[w] + window], [85, 15])
+        median[row, w] = q85 - q15
+    return median
+
+
+def feature_timeline(smoothed: np.ndarray, window: int = TIMELINE_WINDOW,
+                     stride: int = TIMELINE_STRIDE) -> Tuple[np.ndarray, np.ndarray]:
+    """12 признаков по скользящим окнам сглаженного блока 4 x T
+
+    Окно [s, s + window) дает те же значения, что _compute_12_features
+    на срезе smoothed[:, s:s + window]. Моменты, корреляции, скорость и
+    рывок считаются через кумулятивные суммы, поэтому их стоимость не
+    зависит от размера окна. Возвращает начала окон и матрицу окна x 12
+    в порядке FEATURE_NAMES.
+    """
+    smoothed = np.asarray(smoothed, dtype=float)
+    if window < 20 or stride < 1:
+        raise ValueError(f"Некорректное окно {window} или шаг {stride}")
+
+    n = smoothed.shape[1]
+    if n < window:
+        return np.empty(0, dtype=int), np.empty((0, len(FEATURE_NAMES)))
+
+    fl, fr, bl, br = range(4)
+    starts = np.arange(0, n - window + 1, stride)
+
+    mean = _window_sums(smoothed, window, starts) / window
+    var = _window_sums(smoothed ** 2, window, starts) / window - mean ** 2
+    std = np.sqrt(np.maximum(var, 0.0))
+
+    def correlation(i, j):
+        cov = _window_sums(smoothed[i] * smoothed[j], window, starts) / window - mean[i] * mean[j]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = np.clip(cov / (std[i] * std[j]), -1, 1)
+        flat = (std[i] < 1e-10) | (std[j] < 1e-10)
+        return np.where(flat, 0.0, corr)
+
+    speed = np.abs(np.diff(smoothed[[fl, fr]], axis=-1))
+    velocity = _window_sums(speed, window - 1, starts) / (window - 1)
+
+    acc = np.diff(smoothed[fl], n=2)
+    acc_mean = _window_sums(acc, window - 2, starts) / (window - 2)
+    acc_var = _window_sums(acc ** 2, window - 2, starts) / (window - 2) - acc_mean ** 2
+    jerk = np.sqrt(np.maximum(acc_var, 0.0))
+
+    amps = _window_amplitudes(smoothed, window, starts)
+    front_avg = (amps[fl] + amps[fr]) / 2
+    back_avg = (amps[bl] + amps[br]) / 2
+
+    columns = {
+        'front_asymmetry': np.abs(amps[fl] - amps[fr]) / (amps[fl] + amps[fr] + 1e-10),
+        'back_asymmetry': np.abs(amps[bl] - amps[br]) / (amps[bl] + amps[br] + 1e-10),
+        'min_amplitude': amps.min(axis=0),
+        'back_front_ratio': back_avg / (front_avg + 1e-10),
+        'front_left_var': std[fl],
+        'front_right_var': std[fr],
+        'front_sync': correlation(fl, fr),
+        'back_sync': correlation(bl, br),
+        'diagonal_sync': correlation(fl, br),
+        'front_velocity': velocity.mean(axis=0),
+        'front_jerk': jerk,
+        'total_rom': amps.sum(axis=0) / 4,
+    }
+
+    X = np.column_stack([columns[name] for name in FEATURE_NAMES])
+    X[~np.isfinite(X)] = 0.0
+    return starts, X
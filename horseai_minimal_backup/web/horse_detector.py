@@ -1,17 +1,12 @@
 import numpy as np
 import os
-from scipy.signal import savgol_filter
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 import warnings
 import pandas as pd
-import joblib
 from pathlib import Path
-from typing import Tuple, Optional
-import deeplabcut
-from scipy.signal import savgol_filter
-import matplotlib.pyplot as plt
-import warnings
 import time
+import threading
+import inspect
 warnings.filterwarnings('ignore')
 
 import sys
@@ -22,159 +17,129 @@ parent_dir = os.path.dirname(current_dir)
 sys.path.append(str(parent_dir))
 
 
-def extract_features(df: pd.DataFrame) -> Optional[Dict[str, float]]:
-    """Извлечь 12 признаков из DataFrame"""
-    try:
-        # Инициализация маппинга
-        paw_mapping = { 
-            'front_left': None, 'front_right': None,
-            'back_left': None, 'back_right': None
-        }
-        
-        # Поиск столбцов
-        for col in df.columns:
-            if len(col) < 4:
-                continue
-                
-            part_name = str(col[2]) if len(col) > 2 else ''
-            coord = str(col[3]) if len(col) > 3 else ''
-            
-            if coord == 'y':
-                if 'front_left_paw' in part_name:
-                    paw_mapping['front_left'] = col
-                elif 'front_right_paw' in part_name:
-                    paw_mapping['front_right'] = col
-                elif 'back_left_paw' in part_name:
-                    paw_mapping['back_left'] = col
-                elif 'back_right_paw' in part_name:
-                    paw_mapping['back_right'] = col
-        
-        # Проверка
-        if not all(paw_mapping.values()):
-            return None
-        
-        # Извлечение сигналов
-        signals_raw = {}
-        for paw, col in paw_mapping.items():
-            signals_raw[paw] = -df[col].values
-        
-        # Фильтрация
-        common_mask = np.ones(len(df), dtype=bool)
-        for y_values in signals_raw.values():
-            finite_mask = np.isfinite(y_values)
-            if np.sum(finite_mask) < 10:
-                return None
-            common_mask = common_mask & finite_mask
-        
-        common_indices = np.where(common_mask)[0]
-        if len(common_indices) < 20:
-            return None
-        
-        # Нормализация и сглаживание
-        signals = {}
-        scale_factor = 1.0
-        
-        for paw, y_values in signals_raw.items():
-            signal = y_values[common_indices]
-            signal_centered = signal - np.mean(signal)
-            signals[paw] = signal_centered / scale_factor
-        
-        # Сглаживание
-        signals_smoothed = {}
-        for paw, signal in signals.items():
-            try:
-                window_length = min(11, len(signal) if len(signal) % 2 == 1 else len(signal) - 1)
-                if window_length < 5:
-                    window_length = 5
-                smoothed = savgol_filter(signal, window_length=window_length, polyorder=3)
-                signals_smoothed[paw] = smoothed
-            except:
-                signals_smoothed[paw] = signal
-        
-        # Вычисление признаков
-        features = _compute_12_features(signals_smoothed)
-        
-        return features if features else None
-        
-    except Exception as e:
-        warnings.warn(f"Ошибка при извлечении признаков: {str(e)}")
-        return None
+from web.gait_features import (
+    FEATURE_NAMES, PawSignals, extract_features, extract_features_batch, upsample_preview, _compute_12_features
+)
+from web.pose_data import (
+    load_paw_arrays, load_paw_signals, video_fps, write_paw_sidecar, write_preview_video
+)
+from web.model_registry import get_model_registry
+from web.prediction_cache import get_prediction_cache
+from web.pose_batcher import DEFAULT_MAX_WAIT, PoseBatcher
+from web.feature_store import get_feature_store, get_or_extract_features
+from web.labeled_video import request_labeled_video
+from web.pose_manifest import artifact_path, find_pose_h5, manifest_path, update_manifest, write_manifest
+from web.pose_cache import get_pose_cache
 
-def _compute_12_features(signals: Dict[str, np.ndarray]) -> Dict[str, float]:
-    """Вычислить 12 признаков"""
-    def calculate_amplitude(signal, num_segments=5):
-        if len(signal) == 0:
-            return 0.0
-        
-        segment_size = len(signal) // num_segments
-        segment_amplitudes = []
-        
-        for i in range(num_segments):
-            start_idx = i * segment_size
-            end_idx = start_idx + segment_size
-            if i == num_segments - 1:
-                end_idx = len(signal)
-                
-            segment = signal[start_idx:end_idx]
-            if len(segment) > 0:
-                q85, q15 = np.percentile(segment, [85, 15])
-                segment_amp = q85 - q15
-                
-                if segment_amp > 0 and segment_amp < np.ptp(signal) * 0.8:
-                    segment_amplitudes.append(segment_amp)
-        
-        if not segment_amplitudes:
-            q85, q15 = np.percentile(signal, [85, 15])
-            return q85 - q15
-        
-        return np.median(segment_amplitudes)
-    
-    # Расчет амплитуд
-    amp_fl = calculate_amplitude(signals['front_left'])
-    amp_fr = calculate_amplitude(signals['front_right'])
-    amp_bl = calculate_amplitude(signals['back_left'])
-    amp_br = calculate_amplitude(signals['back_right'])
-    
-    features = {}
-    
-    # 12 признаков
-    features['front_asymmetry'] = abs(amp_fl - amp_fr) / (amp_fl + amp_fr + 1e-10)
-    features['back_asymmetry'] = abs(amp_bl - amp_br) / (amp_bl + amp_br + 1e-10)
-    features['min_amplitude'] = min(amp_fl, amp_fr, amp_bl, amp_br)
-    
-    front_avg = (amp_fl + amp_fr) / 2
-    back_avg = (amp_bl + amp_br) / 2
 
-    features['back_front_ratio'] = back_avg / (front_avg + 1e-10)
 
-    features['front_left_var'] = np.std(signals['front_left'])
-    features['front_right_var'] = np.std(signals['front_right'])
-    
-    def correlation(s1, s2):
-        if np.std(s1) < 1e-10 or np.std(s2) < 1e-10:
-            return 0.0
-        return np.corrcoef(s1, s2)[0, 1]
-    
-    features['front_sync'] = correlation(signals['front_left'], signals['front_right'])
-    features['back_sync'] = correlation(signals['back_left'], signals['back_right'])
-    features['diagonal_sync'] = correlation(signals['front_left'], signals['back_right'])
-    
-    vel_fl = np.mean(np.abs(np.diff(signals['front_left'])))
-    vel_fr = np.mean(np.abs(np.diff(signals['front_right'])))
-    features['front_velocity'] = (vel_fl + vel_fr) / 2
+# Предпросмотр: каждый PREVIEW_STEP-й кадр, размер кадра x PREVIEW_SCALE
+PREVIEW_STEP = 3
+PREVIEW_SCALE = 0.5
+
+# Сколько секунд ждать разметку видео из пакета (HORSEAI_POSE_TIMEOUT)
+POSE_TIMEOUT = float(os.environ.get('HORSEAI_POSE_TIMEOUT', '3600'))
+
+def run_superanimal(videos, videotype: str, dest_folder: str):
+    """Один вызов DeepLabCut SuperAnimal на список видео"""
+    # DeepLabCut нужен только для разметки: веб-процессы, которые лишь
+    # считают вероятности, его не импортируют
+    import deeplabcut
+
+    options = {}
+    # Размеченное видео рисуется позже, по запросу (web.labeled_video)
+    if 'create_labeled_video' in inspect.signature(deeplabcut.video_inference_superanimal).parameters:
+        options['create_labeled_video'] = False
+    deeplabcut.video_inference_superanimal(
+        videos=[str(video) for video in videos],
+        superanimal_name='superanimal_quadruped',
+        model_name='hrnet_w32',
+        detector_name='ssdlite',
+        videotype=videotype,
+        dest_folder=dest_folder,
+        video_adapt=False,
+        pcutoff=0.1,
+        max_individuals=1,
+        **options
+    )
+
+
+def find_pose_outputs(video_path: Path, output_dir: Path, video_sha256: Optional[str] = None) -> Tuple[Path, Path]:
+    """H5 DLC для одного видео, запись траекторий копыт, задания на размеченное видео и манифеста
+
+    Второй элемент - путь размеченного видео; сам файл создается при
+    первом запросе (web.labeled_video.request_render).
+    """
+    output_dir = Path(output_dir)
+    video_stem = os.path.splitext(os.path.basename(video_path))[0]
+    h5_file = find_pose_h5(video_path, output_dir)
     
-    acc_fl = np.diff(np.diff(signals['front_left']))
-    features['front_jerk'] = np.std(acc_fl) if len(acc_fl) > 0 else 0
+    if h5_file is None:
+        raise FileNotFoundError(f"H5 файл не найден для {video_stem}")
     
-    features['total_rom'] = (amp_fl + amp_fr + amp_bl + amp_br) / 4
+    print(f"Данные поз: {os.path.basename(h5_file)}")
     
-    # Проверка
-    for key, value in features.items():
-        if not np.isfinite(value):
-            features[key] = 0.0
+    try:
+        sidecar = write_paw_sidecar(h5_file, fps=video_fps(video_path))
+        if sidecar:
+            print(f"Траектории копыт: {os.path.basename(sidecar)}")
+    except Exception as e:
+        print(f"Не удалось записать траектории копыт: {e}")
     
-    return features
+    labeled_video = request_labeled_video(video_path, h5_file)
+    manifest = write_manifest(video_path, output_dir, h5_file, labeled_video, video_sha256=video_sha256)
+    print(f"Манифест: {os.path.basename(manifest)}")
     
+    return h5_file, labeled_video
+
+
+def reuse_pose_outputs(video_path: Path, output_dir: Path, cached_manifest: dict) -> Tuple[Path, Path]:
+    """Разметка того же видео из кэша: новый манифест ссылается на готовые H5 и файл-спутник"""
+    h5_file = artifact_path(cached_manifest, 'h5_file')
+    print(f"Разметка из кэша: {os.path.basename(h5_file)}")
+    labeled_video = request_labeled_video(video_path, h5_file)
+    write_manifest(video_path, output_dir, h5_file, labeled_video,
+                   video_sha256=cached_manifest['video']['sha256'])
+    return h5_file, labeled_video
+
+
+def _superanimal_batch(key, items):
+    """Пакет для PoseBatcher: элементы (видео, SHA-256), один вызов DLC, выходы раскладываются по видео"""
+    videotype, dest_folder = key
+    videos = [video for video, _ in items]
+    print(f"Разметка пакета из {len(videos)} видео")
+    run_superanimal(videos, videotype, dest_folder)
+    outputs = []
+    for video, video_sha256 in items:
+        try:
+            outputs.append(find_pose_outputs(video, Path(dest_folder), video_sha256=video_sha256))
+        except Exception as e:
+            outputs.append(e)
+    return outputs
+
+
+_pose_batcher = None
+_pose_batcher_lock = threading.Lock()
+
+
+def get_pose_batcher() -> Optional[PoseBatcher]:
+    """Общий для процесса PoseBatcher или None, если пакетная разметка выключена
+
+    HORSEAI_POSE_BATCH - максимум видео в одном вызове DLC (1 - без пакетов),
+    HORSEAI_POSE_MAX_WAIT - сколько секунд ждать попутные видео,
+    HORSEAI_POSE_TIMEOUT - сколько секунд видео ждет результата пакета.
+    """
+    global _pose_batcher
+    max_batch = int(os.environ.get('HORSEAI_POSE_BATCH', '1'))
+    if max_batch <= 1:
+        return None
+    with _pose_batcher_lock:
+        if _pose_batcher is None:
+            _pose_batcher = PoseBatcher(_superanimal_batch, max_batch=max_batch,
+                                        max_wait=float(os.environ.get('HORSEAI_POSE_MAX_WAIT', DEFAULT_MAX_WAIT)))
+        return _pose_batcher
+
+
 class HorseLamenessDetector:
     def __init__(self):
         current_dir = Path(__file__).parent
@@ -197,194 +162,217 @@ class HorseLamenessDetector:
         print("Загрузка модели...")
         
         try:
-            model_data = joblib.load(self.ml_model_path)
-            self.scaler = model_data['scaler']
-            self.hybrid_model = model_data['hybrid_model']
-            self.key_thresholds = {
-                'threshold_rf': model_data.get('threshold_rf', 0.5),
-                'threshold_nn': model_data.get('threshold_nn', 0.5),
-                'threshold_hybrid': model_data.get('threshold_hybrid', 0.5)
-            }
-            self.feature_thresholds = model_data.get('feature_thresholds', {})
+            self._bind_model(self._current_model())
             print(f"Загружено порогов признаков: {len(self.feature_thresholds)}")
             
         except Exception as e:
             print(f"Ошибка загрузки: {e}")
             raise
 
-    def _extract_signals(self, df):
-        """Извлечь сигналы копыт для визуализации"""
+    def _current_model(self):
+        """Пакет NumPy рядом с model.pkl, если он есть и актуален, иначе model.pkl"""
+        return get_model_registry().get_current(self.ml_model_path)
+
+    def _bind_model(self, loaded):
+        """Взять scaler, модель и пороги из общей версии модели"""
+        model_data = loaded.model_data
+        self.scaler = model_data['scaler']
+        self.hybrid_model = model_data['hybrid_model']
+        self.key_thresholds = {
+            'threshold_rf': model_data.get('threshold_rf', 0.5),
+            'threshold_nn': model_data.get('threshold_nn', 0.5),
+            'threshold_hybrid': model_data.get('threshold_hybrid', 0.5)
+        }
+        self.feature_thresholds = model_data.get('feature_thresholds', {})
+        self.cascade_margin = model_data.get('cascade_margin')
+        self._loaded_model = loaded
+
+    def _refresh_model(self):
+        """Переключиться на новую версию, если файл модели заменили"""
+        loaded = self._current_model()
+        if loaded is not self._loaded_model:
+            self._bind_model(loaded)
+
+    @staticmethod
+    def _pose_cache_lookup(video_path: Path):
+        """Кэш разметки и хэш видео (None, None, если кэш выключен или недоступен)"""
         try:
-            paw_mapping = { 
-                'front_left': None, 'front_right': None,
-                'back_left': None, 'back_right': None
-            }
-            
-            for col in df.columns:
-                if len(col) < 4:
-                    continue
-                    
-                part_name = str(col[2]) if len(col) > 2 else ''
-                coord = str(col[3]) if len(col) > 3 else ''
-                
-                if coord == 'y':
-                    if 'front_left_paw' in part_name:
-                        paw_mapping['front_left'] = col
-                    elif 'front_right_paw' in part_name:
-                        paw_mapping['front_right'] = col
-                    elif 'back_left_paw' in part_name:
-                        paw_mapping['back_left'] = col
-                    elif 'back_right_paw' in part_name:
-                        paw_mapping['back_right'] = col
-            
-            signals_raw = {} 
-            for paw, col in paw_mapping.items(): 
-                if col and col in df.columns:
-                    signals_raw[paw] = -df[col].values
-                else:
-                    signals_raw[paw] = np.zeros(len(df))
-            
-            # Фильтрация NaN
-            signals = {}
-            for paw, signal in signals_raw.items():
-                finite_mask = np.isfinite(signal)
-                if np.sum(finite_mask) > 0:
-                    signals[paw] = signal[finite_mask]
-                else:
-                    signals[paw] = np.array([0])
-            
-            return signals
-            
+            pose_cache = get_pose_cache()
+            if pose_cache is not None:
+                return pose_cache, pose_cache.video_hash(video_path)
         except Exception as e:
-            print(f"Ошибка при извлечении сигналов: {e}")
-            return {
-                'front_left': np.array([0]),
-                'front_right': np.array([0]),
-                'back_left': np.array([0]),
-                'back_right': np.array([0])
-            }
-
+            print(f"Кэш разметки недоступен: {e}")
+        return None, None
 
     def analyze_video_superanimal(self, video_path: Path) -> Tuple[Optional[Path], Optional[Path]]:
         print(f"Анализ видео: {os.path.basename(video_path)}")
         
         try:
-            print("Разметка ключевых точек...")
+            # Видео с тем же содержимым уже размечалось - DLC не нужен
+            pose_cache, video_sha256 = self._pose_cache_lookup(video_path)
+            if pose_cache is not None:
+                cached = pose_cache.get(video_sha256)
+                if cached is not None:
+                    return reuse_pose_outputs(video_path, self.output_dir, cached)
             
-            deeplabcut.video_inference_superanimal(
-                videos=[str(video_path)],
-                superanimal_name='superanimal_quadruped',
-                model_name='hrnet_w32',
-                detector_name='ssdlite',
-                videotype=os.path.splitext(video_path)[1][1:],
-                dest_folder=str(self.output_dir),
-                video_adapt=False,
-                pcutoff=0.1,
-                max_individuals=1 
-            )
-            
-            video_stem = os.path.splitext(os.path.basename(video_path))[0]
-            h5_files = list(self.output_dir.glob(f"*{video_stem}*.h5"))
-            
-            if not h5_files:
-                raise FileNotFoundError(f"H5 файл не найден для {video_stem}")
-            
-            h5_file = h5_files[0]
-            print(f"Данные поз: {os.path.basename(h5_file)}")
-            
-            labeled_video = None
-            
-            for attempt in range(3):
-                labeled_videos = list(self.output_dir.glob(f"*{video_stem}*labeled*.mp4"))
-                if not labeled_videos:
-                    labeled_videos = list(self.output_dir.glob(f"*{video_stem}*_sk.mp4"))
-                
-                if labeled_videos:
-                    labeled_video = labeled_videos[0]
-                    print(f"Видео с разметкой: {os.path.basename(labeled_video)}")
-                    break
-                
-                if attempt < 2:
-                    time.sleep(1)
+            print("Разметка ключевых точек...")
             
-            if not labeled_video:
-                print("Видео с разметкой не создано")
+            key = (os.path.splitext(video_path)[1][1:], str(self.output_dir))
+            batcher = get_pose_batcher()
+            if batcher is not None:
+                outputs = batcher.submit(key, (Path(video_path), video_sha256)).result(timeout=POSE_TIMEOUT)
+            else:
+                run_superanimal([video_path], *key)
+                outputs = find_pose_outputs(video_path, self.output_dir, video_sha256=video_sha256)
             
-            return h5_file, labeled_video
+            if pose_cache is not None:
+                try:
+                    pose_cache.put(video_sha256, manifest_path(self.output_dir, video_path))
+                except Exception as e:
+                    print(f"Не удалось записать разметку в кэш: {e}")
+            return outputs
             
         except Exception as e:
             print(f"Ошибка DLC: {e}")
             raise
     
-    def predict_lameness(self, features: dict) -> dict:
+    def _nn_predict(self, X_scaled: np.ndarray) -> np.ndarray:
+        """Вероятности нейросети без индикатора прогресса"""
+        nn_model = self.hybrid_model.nn_model
+        try:
+            return np.asarray(nn_model.predict(X_scaled, verbose=0)).reshape(-1)
+        except TypeError:
+            return np.asarray(nn_model.predict(X_scaled)).reshape(-1)
+
+    @staticmethod
+    def _diagnose(hybrid_proba: np.ndarray, threshold: float) -> Dict[str, np.ndarray]:
+        """Решение, уверенность и диагноз для массива вероятностей"""
+        pred = hybrid_proba >= threshold
+
+        max_distance = max(threshold, 1 - threshold)
+        confidence = np.minimum(100, np.abs(hybrid_proba - threshold) / max_distance * 100)
+
+        high = confidence >= 70
+        medium = (confidence >= 50) & ~high
+        diagnosis = np.select(
+            [high & pred, high & ~pred, medium & pred, medium & ~pred],
+            ["Хромая", "Здоровая", "Вероятно хромая", "Вероятно здоровая"],
+            default="Неопределенный результат"
+        )
+        diagnosis_note = np.select(
+            [high, medium & pred, medium & ~pred],
+            ["(высокая уверенность)", "(рекомендуется осмотр)", "(рекомендуется наблюдение)"],
+            default="(низкая уверенность)"
+        )
+        return {'is_lame': pred, 'confidence': confidence,
+                'diagnosis': diagnosis, 'diagnosis_note': diagnosis_note}
+
+    @staticmethod
+    def _cascade_decided(rf_proba: np.ndarray, threshold: float, margin: Optional[float]) -> np.ndarray:
+        """Строки, где RF далеко от порога и нейросеть можно не считать"""
+        if margin is None:
+            return np.zeros(len(rf_proba), dtype=bool)
+        return np.abs(rf_proba - threshold) >= margin
+
+    def predict_lameness_batch(self, features_matrix: np.ndarray,
+                               cascade: Optional[bool] = None) -> Dict[str, np.ndarray]:
+        """Предсказание для матрицы N x 12 (столбцы в порядке FEATURE_NAMES)
+
+        Один вызов scaler, RF и NN на весь набор, без вывода в консоль.
+        Возвращает массивы длины N.
+
+        Каскад (cascade=True или HORSEAI_CASCADE=1, если в model.pkl есть
+        cascade_margin): если вероятность RF отстоит от порога гибрида не
+        меньше чем на cascade_margin, решение принимается по RF, нейросеть
+        для этой строки не считается (nn_proba = nan). Путь строки - в 'path':
+        'rf' или 'hybrid'.
+        """
+        self._refresh_model()
+        X = np.asarray(features_matrix, dtype=float).reshape(-1, len(FEATURE_NAMES))
+        X_scaled = self.scaler.transform(X)
+        hybrid_threshold = self.key_thresholds.get('threshold_hybrid', 0.5)
+        if cascade is None:
+            cascade = os.environ.get('HORSEAI_CASCADE', '0') == '1'
+
+        rf_proba = self.hybrid_model.rf_model.predict_proba(X_scaled)[:, 1]
+        decided = self._cascade_decided(rf_proba, hybrid_threshold, self.cascade_margin if cascade else None)
+
+        nn_proba = np.full(len(X), np.nan)
+        hybrid_proba = rf_proba.astype(float)
+        rest = ~decided
+        if rest.any():
+            nn_proba[rest] = self._nn_predict(X_scaled[rest])
+            hybrid_proba[rest] = np.asarray(self.hybrid_model.predict_proba(
+                X_scaled[rest], rf_proba=rf_proba[rest], nn_proba=nn_proba[rest]
+            ), dtype=float).reshape(-1)
+
+        batch = self._diagnose(hybrid_proba, hybrid_threshold)
+        batch.update({
+            'rf_proba': rf_proba,
+            'nn_proba': nn_proba,
+            'hybrid_proba': hybrid_proba,
+            'path': np.where(decided, 'rf', 'hybrid'),
+            'lameness_probability': np.round(hybrid_proba * 100, 2),
+            'confidence': np.round(batch['confidence'], 2),
+            'threshold_used': round(float(hybrid_threshold), 4),
+        })
+        return batch
+
+    def predict_lameness(self, features: dict, use_cache: bool = True) -> dict:
+        """Предсказание для одного видео
+
+        Результат кэшируется по признакам и хэшу модели (web/prediction_cache.py);
+        у результата из кэша 'cached' = True.
+        """
         print("Предсказание хромоты...")
         
         if features is None:
             raise ValueError("Признаки не извлечены")
         
         try:
-            feature_names = [
-                'front_asymmetry', 'back_asymmetry', 'min_amplitude',
-                'back_front_ratio', 'front_left_var', 'front_right_var',
-                'front_sync', 'back_sync', 'diagonal_sync',
-                'front_velocity', 'front_jerk', 'total_rom'
-            ]
-            
-            X = np.array([[features[name] for name in feature_names]])
-            X_scaled = self.scaler.transform(X)
+            vector = [features[name] for name in FEATURE_NAMES]
 
-            rf_proba = self.hybrid_model.rf_model.predict_proba(X_scaled)[:, 1]
-            nn_proba = self.hybrid_model.nn_model.predict(X_scaled).flatten()
-            
-            hybrid_proba = self.hybrid_model.predict_proba(
-                X_scaled, rf_proba=rf_proba, nn_proba=nn_proba
-            )[0]
-            
-            print(f"RF вероятность: {rf_proba[0]:.3f}")
-            print(f"NN вероятность: {nn_proba[0]:.3f}")
-            print(f"Гибридная вероятность: {hybrid_proba:.3f}")
-            
-            hybrid_threshold = self.key_thresholds.get('threshold_hybrid', 0.5)
-            print(f"Используем обученный порог для гибрида: {hybrid_threshold:.3f}")
-            
-            pred = hybrid_proba >= hybrid_threshold
-            
-            max_distance = max(hybrid_threshold, 1 - hybrid_threshold)
-            distance_from_threshold = abs(hybrid_proba - hybrid_threshold)
-            confidence = min(100, (distance_from_threshold / max_distance) * 100)
+            cache = get_prediction_cache() if use_cache else None
+            if cache is not None:
+                self._refresh_model()
+                cascade = os.environ.get('HORSEAI_CASCADE', '0') == '1' and self.cascade_margin is not None
+                key = cache.key(vector, self._loaded_model.sha256,
+                                f"cascade:{self.cascade_margin}" if cascade else 'hybrid')
+                cached = cache.get(key)
+                if cached is not None:
+                    cached.update({'features': features, 'cached': True})
+                    print(f"Результат из кэша: {cached['diagnosis']} ({cached['lameness_probability']:.1f}%)")
+                    return cached
+
+            batch = self.predict_lameness_batch([vector])
             
-            if confidence >= 70:
-                if pred:
-                    diagnosis = "Хромая"
-                    diagnosis_note = "(высокая уверенность)"
-                else:
-                    diagnosis = "Здоровая" 
-                    diagnosis_note = "(высокая уверенность)"
-            elif confidence >= 50:
-                if pred:
-                    diagnosis = "Вероятно хромая"
-                    diagnosis_note = "(рекомендуется осмотр)"
-                else:
-                    diagnosis = "Вероятно здоровая"
-                    diagnosis_note = "(рекомендуется наблюдение)"
+            print(f"RF вероятность: {batch['rf_proba'][0]:.3f}")
+            if batch['path'][0] == 'rf':
+                print(f"RF вне полосы порога ±{self.cascade_margin:.3f}, нейросеть пропущена")
             else:
-                diagnosis = "Неопределенный результат"
-                diagnosis_note = "(низкая уверенность)"
+                print(f"NN вероятность: {batch['nn_proba'][0]:.3f}")
+                print(f"Гибридная вероятность: {batch['hybrid_proba'][0]:.3f}")
+            print(f"Используем обученный порог для гибрида: {batch['threshold_used']:.3f}")
             
             result = {
-                'is_lame': bool(pred),
-                'lameness_probability': round(float(hybrid_proba) * 100, 2),
-                'confidence': round(float(confidence), 2),
-                'diagnosis': diagnosis,
-                'diagnosis_note': diagnosis_note,
+                'is_lame': bool(batch['is_lame'][0]),
+                'lameness_probability': float(batch['lameness_probability'][0]),
+                'confidence': float(batch['confidence'][0]),
+                'diagnosis': str(batch['diagnosis'][0]),
+                'diagnosis_note': str(batch['diagnosis_note'][0]),
                 'features': features,
-                'threshold_used': round(float(hybrid_threshold), 4)
+                'threshold_used': batch['threshold_used'],
+                'prediction_path': str(batch['path'][0]),
+                'cached': False
             }
             
             print(f"Вероятность хромоты: {result['lameness_probability']:.1f}%")
             print(f"Порог классификации: {result['threshold_used']:.3f}")
-            print(f"Диагноз: {diagnosis} {diagnosis_note}")
+            print(f"Диагноз: {result['diagnosis']} {result['diagnosis_note']}")
             print(f"Уверенность: {result['confidence']:.1f}%")
+
+            if cache is not None:
+                cache.put(key, {name: value for name, value in result.items() if name != 'features'})
             
             return result
             
@@ -393,7 +381,8 @@ class HorseLamenessDetector:
             raise
 
     def _save_result_to_file(self, result_file: Path, video_name: str, result: dict, 
-                            h5_file: Path, labeled_video: Optional[Path]):
+                            h5_file: Path, labeled_video: Optional[Path],
+                            signals: Optional[PawSignals] = None):
         
         with open(result_file, 'w', encoding='utf-8') as f:
             f.write("Отчет об анализе лошади\n")
@@ -480,6 +469,10 @@ class HorseLamenessDetector:
             if labeled_video:
                 f.write(f"Видео с разметкой: {os.path.basename(labeled_video)}\n")
             f.write(f"Уверенность предсказания: {result['confidence']:.1f}%\n")
+            if signals is not None:
+                f.write(f"Кадров в анализе: {signals.n_frames} из {signals.raw.shape[1]}\n")
+                amp_fl, amp_fr, amp_bl, amp_br = signals.amplitudes
+                f.write(f"Амплитуды копыт (ПЛ/ПП/ЗЛ/ЗП): {amp_fl:.4f} / {amp_fr:.4f} / {amp_bl:.4f} / {amp_br:.4f}\n")
             
             f.write("\nРасположение файлов\n")
             f.write("-" * 50 + "\n")
@@ -543,6 +536,7 @@ class HorseLamenessDetector:
     
     def save_gait_analysis_report(self, result_file: Path, result: dict):
         print("Создание графического отчета анализа походки...")
+        import matplotlib.pyplot as plt
         
         if not hasattr(self, 'last_signals'):
             print("Нет данных для визуализации")
@@ -562,10 +556,8 @@ class HorseLamenessDetector:
             labels = {'front_left': 'Переднее левое', 'front_right': 'Переднее правое',
                     'back_left': 'Заднее левое', 'back_right': 'Заднее правое'}
             
-            for paw, signal in signals.items():
-                if len(signal) > 0:
-                    frames = np.arange(len(signal))
-                    ax1.plot(frames, signal, color=colors[paw], label=labels[paw], linewidth=1.5, alpha=0.8)
+            for paw, signal in signals.as_dict('masked').items():
+                ax1.plot(signals.frame_indices, signal, color=colors[paw], label=labels[paw], linewidth=1.5, alpha=0.8)
             
             ax1.set_title('Движение копыт в вертикальной плоскости', fontweight='bold')
             ax1.set_xlabel('Кадры видео')
@@ -577,13 +569,7 @@ class HorseLamenessDetector:
             ax2 = plt.subplot2grid((3, 3), (0, 2))
             paws = ['Перед\nлев', 'Перед\nправ', 'Зад\nлев', 'Зад\nправ']
             
-            if all(len(signal) > 0 for signal in signals.values()):
-                amplitudes = [np.ptp(signals['front_left']), 
-                            np.ptp(signals['front_right']),
-                            np.ptp(signals['back_left']), 
-                            np.ptp(signals['back_right'])]
-            else:
-                amplitudes = [0, 0, 0, 0]
+            amplitudes = list(signals.ranges)
             
             bars = ax2.bar(paws, amplitudes, color=['red', 'blue', 'green', 'orange'], alpha=0.7)
             ax2.set_title('Амплитуда движения копыт', fontweight='bold')
@@ -725,7 +711,16 @@ class HorseLamenessDetector:
             import traceback
             traceback.print_exc()
                 
-    def process(self, video_path: Path):
+    def process(self, video_path: Path, video_id=None, on_progress=None):
+        """Полный анализ видео; результат - в self.last_result
+
+        on_progress(stage, progress, message) вызывается на этапах:
+        'pose' (10), 'pose_done' (50), 'features' (70), 'prediction' (90).
+        """
+        def progress(stage, percent, message):
+            if on_progress is not None:
+                on_progress(stage, percent, message)
+
         print("=" * 70)
         print(f"Анализ: {os.path.basename(video_path)}")
         print("=" * 70)
@@ -734,29 +729,51 @@ class HorseLamenessDetector:
             results_dir = self.output_dir / "results"
             results_dir.mkdir(exist_ok=True)
             
+            progress('pose', 10, 'Разметка ключевых точек')
             h5_file, labeled_video = self.analyze_video_superanimal(video_path)
+            progress('pose_done', 50, 'DLC завершен')
             
             print(f"H5 файл: {os.path.basename(h5_file)}")
             if labeled_video:
-                print(f"Размеченное видео: {os.path.basename(labeled_video)}")
-            
-            import pandas as pd
-            df = pd.read_hdf(h5_file)
+                print(f"Размеченное видео (по запросу): {os.path.basename(labeled_video)}")
             
-            features = extract_features(df)
+            signals = load_paw_signals(h5_file)
+            features = None
+            if signals is not None:
+                try:
+                    features = get_or_extract_features(h5_file, video_id=video_id, signals=signals)
+                except Exception as e:
+                    print(f"Хранилище признаков недоступно: {e}")
+                    features = signals.features()
             
             if features is None:
                 print("Не удалось извлечь признаки")
                 return False
             
-            self.last_signals = self._extract_signals(df)
+            self.last_signals = signals
+            progress('features', 70, 'Признаки извлечены')
             
             result = self.predict_lameness(features)
+            result['timeline'] = signals.timeline(fps=video_fps(video_path))
+            result['video_name'] = os.path.basename(video_path)
+            result['h5_file'] = str(h5_file)
+            result['labeled_video'] = str(labeled_video) if labeled_video else None
+            progress('prediction', 90, 'Предсказание завершено')
             
             result_file = results_dir / f"{os.path.splitext(os.path.basename(video_path))[0]}_result.txt"
-            self._save_result_to_file(result_file, os.path.basename(video_path), result, h5_file, labeled_video)
+            self._save_result_to_file(result_file, os.path.basename(video_path), result, h5_file, labeled_video,
+                                      signals=signals)
             
             self.save_gait_analysis_report(result_file, result)
+            
+            # Отчеты попадают в манифест разметки: потребители не ищут их по папке
+            manifest = manifest_path(self.output_dir, video_path)
+            plot_file = result_file.with_suffix('.png')
+            result['graphic_report'] = str(plot_file) if plot_file.exists() else None
+            if update_manifest(manifest, text_report=result_file,
+                               graphic_report=plot_file if plot_file.exists() else None) is not None:
+                result['manifest'] = str(manifest)
+            self.last_result = result
 
             print(f"Видео {os.path.basename(video_path)} обработано успешно.")
             return True
@@ -768,8 +785,63 @@ class HorseLamenessDetector:
         return True
     
 
+    def preview(self, video_path: Path, step: int = PREVIEW_STEP, scale: float = PREVIEW_SCALE) -> Optional[dict]:
+        """Быстрая предварительная оценка по прореженному и уменьшенному видео
+
+        DLC размечает каждый step-й кадр в масштабе scale; координаты
+        возвращаются к полному размеру и частоте кадров (upsample_preview),
+        после чего признаки и модель те же, что в process. Результат
+        помечен 'provisional': True и не попадает в хранилище признаков
+        и кэш предсказаний. None, если разметка видео уже есть в кэше:
+        полный анализ и так обойдется без DLC.
+        """
+        start = time.time()
+        video_path = Path(video_path)
+        pose_cache, video_sha256 = self._pose_cache_lookup(video_path)
+        if pose_cache is not None and pose_cache.get(video_sha256) is not None:
+            print("Разметка есть в кэше, предпросмотр не нужен")
+            return None
+        preview_dir = self.output_dir / "preview"
+        preview_dir.mkdir(exist_ok=True)
+        preview_video = preview_dir / f"{video_path.stem}_preview.mp4"
+
+        print(f"Предпросмотр: каждый {step}-й кадр, масштаб {scale}")
+        frames = write_preview_video(video_path, preview_video, step, scale)
+        if not frames:
+            print("Не удалось подготовить видео для предпросмотра")
+            return None
+
+        run_superanimal([preview_video], 'mp4', str(preview_dir))
+        h5_file = find_pose_h5(preview_video, preview_dir)
+        if h5_file is None:
+            print(f"H5 файл предпросмотра не найден для {preview_video.stem}")
+            return None
+
+        paws = load_paw_arrays(h5_file, dtype=np.float64)
+        signals = PawSignals.from_raw(upsample_preview(-paws.y, step, scale)) if paws is not None else None
+        features = signals.features() if signals is not None else None
+        if features is None:
+            print("Не удалось извлечь признаки предпросмотра")
+            return None
+
+        result = self.predict_lameness(features, use_cache=False)
+        result.update({
+            'provisional': True,
+            'preview': {'step': step, 'scale': scale, 'frames_used': frames,
+                        'seconds': round(time.time() - start, 2)},
+        })
+        return result
+
     def get_last_result(self):
         return getattr(self, 'last_result', None)    
+
+    def predict_stored(self, video_id) -> Optional[Dict]:
+        """Повторное предсказание по сохраненным признакам, без DeepLabCut"""
+        features = get_feature_store().get_by_video(video_id)
+        if features is None:
+            print(f"Нет сохраненных признаков для видео {video_id}")
+            return None
+        return self.predict_lameness(features)
     
 def main():
     print("Запуск детектора хромоты")
@@ -0,0 +1,351 @@
+"""
+Пакет модели только на NumPy.
+
+export_bundle() раскладывает обученные scaler, случайный лес и
+полносвязную нейросеть гибридной модели в один .npz: массивы узлов
+деревьев, веса слоев и JSON-описание (пороги, способ объединения RF и NN,
+хэш исходного model.pkl). InferenceBundle считает те же вероятности
+чистым NumPy, поэтому веб-процессам не нужно импортировать фреймворк
+нейросети.
+
+Способ объединения RF и NN в hybrid_model не хранится в model.pkl явно:
+при экспорте он восстанавливается по ответам hybrid_model.predict_proba
+на сетке вероятностей и должен оказаться линейным, иначе экспорт
+прерывается.
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from frontend.ml_models import CompiledForest, CompiledTree, compile_forest
+from web.gait_features import FEATURE_NAMES
+from web.pose_data import file_sha256
+
+BUNDLE_VERSION = 1
+BUNDLE_SUFFIX = '_bundle.npz'
+
+# Допустимое расхождение вероятностей с исходной моделью
+TOLERANCE = 1e-5
+
+_ACTIVATIONS = {
+    'linear': lambda x: x,
+    'identity': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+    'logistic': lambda x: 1 / (1 + np.exp(-x)),
+    'tanh': np.tanh,
+    'softmax': lambda x: np.exp(x - x.max(axis=1, keepdims=True)) /
+                         np.exp(x - x.max(axis=1, keepdims=True)).sum(axis=1, keepdims=True),
+}
+
+
+def bundle_path(model_path: Union[str, Path]) -> Path:
+    """Путь пакета рядом с model.pkl"""
+    model_path = Path(model_path)
+    return model_path.with_name(model_path.stem + BUNDLE_SUFFIX)
+
+
+# ----------------------------------------------------------------------
+# Экспорт
+# ----------------------------------------------------------------------
+
+def _export_scaler(scaler) -> Tuple[Dict[str, np.ndarray], str]:
+    """Параметры StandardScaler ('standard') или MinMaxScaler ('minmax')
+
+    Формулы повторяют sklearn дословно: пороги деревьев совпадают со
+    значениями обучающих признаков, и даже ошибка округления в последнем
+    бите переводит такие точки в другую ветку.
+    """
+    if hasattr(scaler, 'min_') and hasattr(scaler, 'scale_'):
+        return {'scaler_scale': np.asarray(scaler.scale_, float),
+                'scaler_offset': np.asarray(scaler.min_, float)}, 'minmax'
+
+    scale = getattr(scaler, 'scale_', None)
+    mean = getattr(scaler, 'mean_', None)
+    if scale is None and mean is None:
+        raise ValueError(f"Неподдерживаемый scaler: {type(scaler).__name__}")
+    n = len(FEATURE_NAMES)
+    return {'scaler_scale': np.ones(n) if scale is None else np.asarray(scale, float),
+            'scaler_offset': np.zeros(n) if mean is None else np.asarray(mean, float)}, 'standard'
+
+
+def _export_forest(rf_model) -> Tuple[Dict[str, np.ndarray], bool]:
+    """Лес как CompiledForest со значением листа = вероятность класса 1
+
+    Второе значение - сравнивать ли признаки во float32 (как деревья sklearn).
+    """
+    estimators = getattr(rf_model, 'estimators_', None)
+    if estimators is not None and hasattr(estimators[0], 'tree_'):
+        # sklearn: лист - распределение классов, предсказание - среднее по деревьям
+        class_index = list(rf_model.classes_).index(1)
+        trees = []
+        for estimator in estimators:
+            tree = estimator.tree_
+            leaf = tree.children_left == -1
+            counts = tree.value[:, 0, :]
+            index = np.arange(tree.node_count)
+            trees.append(CompiledTree(
+                np.where(leaf, -1, tree.feature), np.where(leaf, np.inf, tree.threshold),
+                np.where(leaf, index, tree.children_left), np.where(leaf, index, tree.children_right),
+                counts[:, class_index] / counts.sum(axis=1), tree.max_depth
+            ))
+        forest, float32 = CompiledForest.from_trees(trees), True
+    else:
+        forest, float32 = compile_forest(rf_model), False
+        forest.value = (forest.value == 1).astype(np.float64)
+
+    return {'rf_' + name: np.asarray(getattr(forest, name)) for name in CompiledForest.__slots__}, float32
+
+
+def _export_network(nn_model) -> Tuple[Dict[str, np.ndarray], List[str]]:
+    """Полносвязная сеть (Keras Dense/BatchNormalization или sklearn MLP) как список слоев"""
+    arrays, activations = {}, []
+
+    if hasattr(nn_model, 'coefs_'):
+        for i, (W, b) in enumerate(zip(nn_model.coefs_, nn_model.intercepts_)):
+            last = i == len(nn_model.coefs_) - 1
+            arrays[f'nn_W{i}'], arrays[f'nn_b{i}'] = np.asarray(W, float), np.asarray(b, float)
+            activations.append(nn_model.out_activation_ if last else nn_model.activation)
+        return arrays, activations
+
+    for layer in nn_model.layers:
+        kind = type(layer).__name__
+        config = layer.get_config()
+        if kind == 'Dense':
+            W, b = layer.get_weights()
+            i = len(activations)
+            arrays[f'nn_W{i}'], arrays[f'nn_b{i}'] = np.asarray(W, float), np.asarray(b, float)
+            activations.append(config.get('activation', 'linear'))
+        elif kind == 'BatchNormalization':
+            gamma, beta, mean, var = layer.get_weights()
+            scale = gamma / np.sqrt(var + config.get('epsilon', 1e-3))
+            i = len(activations)
+            arrays[f'nn_W{i}'] = np.diag(scale)
+            arrays[f'nn_b{i}'] = beta - mean * scale
+            activations.append('linear')
+        elif kind in ('InputLayer', 'Dropout', 'GaussianNoise', 'Flatten'):
+            continue
+        else:
+            raise ValueError(f"Слой {kind} не поддерживается в пакете NumPy")
+
+    if activations and activations[-1] not in _ACTIVATIONS:
+        raise ValueError(f"Активация {activations[-1]} не поддерживается")
+    return arrays, activations
+
+
+def _probe_combination(hybrid_model, X_scaled: np.ndarray) -> List[float]:
+    """Веса линейного объединения hybrid = w_rf * rf + w_nn * nn + b"""
+    grid = np.linspace(0, 1, 11)
+    rf, nn = [g.ravel() for g in np.meshgrid(grid, grid)]
+    X = np.repeat(X_scaled[:1], len(rf), axis=0)
+    hybrid = np.asarray(hybrid_model.predict_proba(X, rf_proba=rf, nn_proba=nn), dtype=float).reshape(-1)
+
+    A = np.column_stack([rf, nn, np.ones_like(rf)])
+    weights, *_ = np.linalg.lstsq(A, hybrid, rcond=None)
+    if np.max(np.abs(A @ weights - hybrid)) > 1e-6:
+        raise ValueError("Объединение RF и NN в hybrid_model нелинейно, экспорт невозможен")
+    return [float(w) for w in weights]
+
+
+def export_bundle(model_path: Union[str, Path], output: Optional[Union[str, Path]] = None,
+                  model_data: Optional[dict] = None, X_check: Optional[np.ndarray] = None,
+                  tolerance: float = TOLERANCE) -> dict:
+    """Экспортировать model.pkl в пакет NumPy и сверить его с исходной моделью
+
+    X_check - признаки для сверки (по умолчанию 500 случайных векторов
+    вокруг среднего scaler). Пакет заменяет прежний только если все
+    расхождения не больше tolerance, иначе ValueError и прежний пакет
+    остается. Возвращает описание пакета с расхождениями.
+    """
+    model_path = Path(model_path)
+    output = Path(output) if output else bundle_path(model_path)
+    if model_data is None:
+        from web.model_registry import get_model_registry
+        model_data = get_model_registry().get(model_path).model_data
+
+    scaler = model_data['scaler']
+    hybrid_model = model_data['hybrid_model']
+
+    arrays, scaler_kind = _export_scaler(scaler)
+    forest_arrays, rf_float32 = _export_forest(hybrid_model.rf_model)
+    arrays.update(forest_arrays)
+    nn_arrays, activations = _export_network(hybrid_model.nn_model)
+    arrays.update(nn_arrays)
+
+    if X_check is None:
+        rng = np.random.default_rng(0)
+        X_scaled = rng.normal(size=(500, len(FEATURE_NAMES)))
+        X_check = scaler.inverse_transform(X_scaled)
+    X_check = np.asarray(X_check, dtype=float)
+    X_scaled = scaler.transform(X_check)
+
+    stat = model_path.stat()
+    meta = {
+        'version': BUNDLE_VERSION,
+        'feature_names': FEATURE_NAMES,
+        'source': model_path.name,
+        'source_sha256': file_sha256(model_path),
+        'source_size': stat.st_size,
+        'source_mtime': stat.st_mtime,
+        'scaler_kind': scaler_kind,
+        'rf_float32': rf_float32,
+        'nn_activations': activations,
+        'combination': _probe_combination(hybrid_model, X_scaled),
+        'threshold_rf': model_data.get('threshold_rf', 0.5),
+        'threshold_nn': model_data.get('threshold_nn', 0.5),
+        'threshold_hybrid': model_data.get('threshold_hybrid', 0.5),
+        'feature_thresholds': model_data.get('feature_thresholds', {}),
+        'cascade_margin': model_data.get('cascade_margin'),
+    }
+
+    # Сверка с исходными объектами
+    bundle = InferenceBundle(meta, arrays)
+    rf_proba = hybrid_model.rf_model.predict_proba(X_scaled)[:, 1]
+    try:
+        nn_proba = np.asarray(hybrid_model.nn_model.predict(X_scaled, verbose=0)).reshape(-1)
+    except TypeError:
+        nn_proba = np.asarray(hybrid_model.nn_model.predict(X_scaled)).reshape(-1)
+    hybrid_proba = np.asarray(hybrid_model.predict_proba(X_scaled, rf_proba=rf_proba, nn_proba=nn_proba),
+                              dtype=float).reshape(-1)
+
+    ours = bundle.predict_all(X_check)
+    meta['max_abs_diff'] = {
+        'scaler': float(np.max(np.abs(bundle.transform(X_check) - X_scaled))),
+        'rf': float(np.max(np.abs(ours['rf_proba'] - rf_proba))),
+        'nn': float(np.max(np.abs(ours['nn_proba'] - nn_proba))),
+        'hybrid': float(np.max(np.abs(ours['hybrid_proba'] - hybrid_proba))),
+    }
+
+    # Прежний пакет заменяется только сверенным: воркеры подхватят его сразу
+    worst = max(meta['max_abs_diff'].values())
+    if not worst <= tolerance:
+        raise ValueError(f"Расхождение пакета с моделью {worst:.2e} больше {tolerance:.0e}, пакет не записан")
+
+    tmp = output.with_name(output.name + '.tmp.npz')
+    try:
+        np.savez(tmp, meta=np.array(json.dumps(meta, ensure_ascii=False)), **arrays)
+    except Exception:
+        tmp.unlink(missing_ok=True)
+        raise
+    tmp.replace(output)
+    return meta
+
+
+# ----------------------------------------------------------------------
+# Инференс
+# ----------------------------------------------------------------------
+
+class InferenceBundle:
+    """Scaler, лес и нейросеть гибридной модели на чистом NumPy"""
+
+    def __init__(self, meta: dict, arrays: Dict[str, np.ndarray]):
+        self.meta = meta
+        self.scale = arrays['scaler_scale']
+        self.offset = arrays['scaler_offset']
+        self.forest = CompiledForest(**{name: arrays['rf_' + name] for name in CompiledForest.__slots__})
+        self.layers = [(arrays[f'nn_W{i}'], arrays[f'nn_b{i}'], _ACTIVATIONS[activation])
+                       for i, activation in enumerate(meta['nn_activations'])]
+        self.combination = meta['combination']
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> 'InferenceBundle':
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files if name != 'meta'}
+            meta = json.loads(str(data['meta']))
+        if meta.get('version') != BUNDLE_VERSION:
+            raise ValueError(f"Неподдерживаемая версия пакета: {meta.get('version')}")
+        return cls(meta, arrays)
+
+    def is_fresh(self, model_path: Union[str, Path]) -> bool:
+        """Пакет собран из текущего model.pkl (по размеру и mtime)
+
+        Если model.pkl рядом нет (на веб-сервер выложен только пакет),
+        пакет считается актуальным.
+        """
+        try:
+            stat = Path(model_path).stat()
+        except FileNotFoundError:
+            return True
+        return (stat.st_size, stat.st_mtime) == (self.meta['source_size'], self.meta['source_mtime'])
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        X = np.asarray(X, dtype=float)
+        if self.meta['scaler_kind'] == 'minmax':
+            return X * self.scale + self.offset
+        return (X - self.offset) / self.scale
+
+    def rf_proba(self, X_scaled: np.ndarray) -> np.ndarray:
+        if self.meta.get('rf_float32'):
+            X_scaled = np.asarray(X_scaled, dtype=np.float32)
+        return self.forest.leaf_values(X_scaled).mean(axis=1)
+
+    def nn_proba(self, X_scaled: np.ndarray) -> np.ndarray:
+        h = X_scaled
+        for W, b, activation in self.layers:
+            h = activation(h @ W + b)
+        # Выход softmax из двух нейронов - берем вероятность класса 1
+        return h[:, -1]
+
+    def hybrid_proba(self, rf_proba: np.ndarray, nn_proba: np.ndarray) -> np.ndarray:
+        w_rf, w_nn, bias = self.combination
+        return w_rf * rf_proba + w_nn * nn_proba + bias
+
+    def predict_all(self, X: np.ndarray) -> Dict[str, np.ndarray]:
+        """Вероятности RF, NN и гибрида для матрицы N x 12"""
+        X_scaled = self.transform(X)
+        rf = self.rf_proba(X_scaled)
+        nn = self.nn_proba(X_scaled)
+        return {'rf_proba': rf, 'nn_proba': nn, 'hybrid_proba': self.hybrid_proba(rf, nn)}
+
+    def model_data(self) -> dict:
+        """Объекты с интерфейсом model.pkl для HorseLamenessDetector"""
+        data = {name: self.meta[name] for name in
+                ('threshold_rf', 'threshold_nn', 'threshold_hybrid', 'feature_thresholds')}
+        if self.meta.get('cascade_margin') is not None:
+            data['cascade_margin'] = self.meta['cascade_margin']
+        data['scaler'] = _BundleScaler(self)
+        data['hybrid_model'] = _BundleHybrid(self)
+        data['bundle'] = self
+        return data
+
+
+class _BundleScaler:
+    def __init__(self, bundle: InferenceBundle):
+        self.bundle = bundle
+
+    def transform(self, X):
+        return self.bundle.transform(X)
+
+
+class _BundleForest:
+    def __init__(self, bundle: InferenceBundle):
+        self.bundle = bundle
+
+    def predict_proba(self, X_scaled):
+        p = self.bundle.rf_proba(X_scaled)
+        return np.column_stack([1 - p, p])
+
+
+class _BundleNetwork:
+    def __init__(self, bundle: InferenceBundle):
+        self.bundle = bundle
+
+    def predict(self, X_scaled, verbose=0):
+        return self.bundle.nn_proba(X_scaled)[:, None]
+
+
+class _BundleHybrid:
+    def __init__(self, bundle: InferenceBundle):
+        self.bundle = bundle
+        self.rf_model = _BundleForest(bundle)
+        self.nn_model = _BundleNetwork(bundle)
+
+    def predict_proba(self, X_scaled, rf_proba=None, nn_proba=None):
+        if rf_proba is None:
+            rf_proba = self.bundle.rf_proba(X_scaled)
+        if nn_proba is None:
+            nn_proba = self.bundle.nn_proba(X_scaled)
+        return self.bundle.hybrid_proba(np.asarray(rf_proba), np.asarray(nn_proba))
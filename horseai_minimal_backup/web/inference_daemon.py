@@ -0,0 +1,300 @@
+"""
+Постоянный демон анализа видео.
+
+Вместо запуска python3 final_real_detector*.py на каждое видео (старт
+интерпретатора, импорт deeplabcut/torch, загрузка модели) один процесс
+держит HorseLamenessDetector загруженным и принимает задания через
+Unix-сокет. Задания выполняются в порядке поступления, по одному на
+поток-исполнитель (workers); при нескольких исполнителях разметка поз
+одновременных заданий собирается в общие вызовы DLC (web/pose_batcher.py).
+
+С "preview": true сначала выполняется быстрый предпросмотр
+(HorseLamenessDetector.preview) и отправляется событие "preview", затем
+полный анализ ставится в очередь с низким приоритетом: предпросмотры
+новых видео обгоняют ожидающие полные анализы.
+
+Протокол - строки JSON. Клиент отправляет одну строку:
+    {"op": "analyze", "video": "...", "output": "...", "video_id": ..., "preview": false}
+    {"op": "ping"}
+и читает события до финального:
+    {"type": "queued", "position": 2}
+    {"type": "preview", "result": {...}}
+    {"type": "progress", "stage": "pose", "progress": 10, "message": "..."}
+    {"type": "result", "result": {...}, "processing_time": 41.2}
+    {"type": "error", "error": "..."}
+
+Запуск: python scripts/inference_daemon.py [--socket путь] (по умолчанию DEFAULT_SOCKET_PATH)
+Места вызова переключаются на демон при HORSEAI_INFERENCE_DAEMON=1.
+"""
+
+import itertools
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+
+DEFAULT_SOCKET_PATH = Path(os.environ.get('HORSEAI_INFERENCE_SOCKET', '/home/ais/shared/horseAI/run/inference.sock'))
+DEFAULT_TIMEOUT = 600
+
+# Приоритеты очереди: меньше - раньше
+PRIORITY_PREVIEW = 0
+PRIORITY_FULL = 1
+
+
+class DaemonUnavailable(Exception):
+    """Демон не запущен или не принимает соединения"""
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, Path):
+        return str(value)
+    raise TypeError(f"Не сериализуется в JSON: {type(value).__name__}")
+
+
+def _encode(message: dict) -> bytes:
+    return (json.dumps(message, ensure_ascii=False, default=_json_default) + '\n').encode('utf-8')
+
+
+# ----------------------------------------------------------------------
+# Сервер
+# ----------------------------------------------------------------------
+
+class _Job:
+    __slots__ = ('request', 'events', 'preview')
+
+    def __init__(self, request: dict):
+        self.request = request
+        self.events: 'queue.Queue[dict]' = queue.Queue()
+        self.preview = bool(request.get('preview'))
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        daemon = self.server.inference_daemon
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError as e:
+            self._send({'type': 'error', 'error': f"Неверный запрос: {e}"})
+            return
+
+        op = request.get('op')
+        if op == 'ping':
+            self._send({'type': 'pong', **daemon.stats()})
+            return
+        if op != 'analyze' or not request.get('video'):
+            self._send({'type': 'error', 'error': f"Неизвестная операция: {op}"})
+            return
+
+        job = _Job(request)
+        daemon.submit(job)
+        if not self._send({'type': 'queued', 'position': daemon.jobs.qsize()}):
+            return
+        while True:
+            event = job.events.get()
+            # Клиент отключился: задание все равно доводится до конца
+            if not self._send(event) or event['type'] in ('result', 'error'):
+                return
+
+    def _send(self, message: dict) -> bool:
+        try:
+            self.wfile.write(_encode(message))
+            self.wfile.flush()
+            return True
+        except OSError:
+            return False
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class InferenceDaemon:
+    """Детектор, загруженный один раз, и очередь заданий на анализ"""
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, workers: int = 1):
+        self.socket_path = Path(socket_path)
+        self.workers = max(1, int(workers))
+        self.jobs: 'queue.PriorityQueue[tuple]' = queue.PriorityQueue()
+        self._order = itertools.count()
+        self.started_at = None
+        self.completed = 0
+        self.failed = 0
+        self.current = set()
+        # Счетчики и current меняют несколько потоков-исполнителей
+        self._lock = threading.Lock()
+
+    def stats(self) -> dict:
+        from web.horse_detector import get_pose_batcher
+        batcher = get_pose_batcher()
+        with self._lock:
+            counters = {'current': sorted(self.current), 'completed': self.completed, 'failed': self.failed}
+        return {
+            'pid': os.getpid(),
+            'uptime': round(time.time() - self.started_at, 1) if self.started_at else None,
+            'workers': self.workers,
+            'queued': self.jobs.qsize(),
+            **counters,
+            'pose_batcher': batcher.stats() if batcher else None,
+        }
+
+    def submit(self, job: _Job):
+        priority = PRIORITY_PREVIEW if job.preview else PRIORITY_FULL
+        self.jobs.put((priority, next(self._order), job))
+
+    def _run_preview(self, detector, job: _Job):
+        """Предпросмотр и постановка полного анализа в очередь"""
+        video_path = Path(job.request['video'])
+        try:
+            result = detector.preview(video_path)
+            event = {'type': 'preview', 'result': json.loads(_encode(result)) if result else None}
+        except Exception as e:
+            print(f"Ошибка предпросмотра {video_path.name}: {e}")
+            event = {'type': 'preview', 'result': None, 'error': str(e)}
+        job.events.put(event)
+        job.preview = False
+        self.submit(job)
+
+    def _run_job(self, detector, job: _Job):
+        request = job.request
+        video_path = Path(request['video'])
+        with self._lock:
+            self.current.add(video_path.name)
+        start = time.time()
+
+        def on_progress(stage, progress, message):
+            job.events.put({'type': 'progress', 'stage': stage, 'progress': progress, 'message': message})
+
+        try:
+            if not video_path.exists():
+                raise FileNotFoundError(f"Файл не найден: {video_path}")
+            if not detector.process(video_path, video_id=request.get('video_id'), on_progress=on_progress):
+                raise RuntimeError("Детектор не смог обработать видео")
+
+            result = dict(detector.last_result)
+            result['processing_time'] = round(time.time() - start, 2)
+            if request.get('output'):
+                output_dir = Path(request['output'])
+                output_dir.mkdir(parents=True, exist_ok=True)
+                with open(output_dir / 'result.json', 'wb') as f:
+                    f.write(_encode(result))
+
+            with self._lock:
+                self.completed += 1
+            job.events.put({'type': 'result', 'result': json.loads(_encode(result)),
+                            'processing_time': result['processing_time']})
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            print(f"Ошибка анализа {video_path.name}: {e}")
+            job.events.put({'type': 'error', 'error': str(e)})
+        finally:
+            with self._lock:
+                self.current.discard(video_path.name)
+
+    def _worker(self, detector):
+        while True:
+            _, _, job = self.jobs.get()
+            if job.preview and Path(job.request['video']).exists():
+                self._run_preview(detector, job)
+            else:
+                self._run_job(detector, job)
+
+    def serve_forever(self):
+        from web.horse_detector import HorseLamenessDetector
+
+        print("Загрузка детектора...")
+        # Детекторы исполнителей делят модель через реестр моделей процесса
+        detectors = [HorseLamenessDetector() for _ in range(self.workers)]
+        self.started_at = time.time()
+
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        server = _Server(str(self.socket_path), _Handler)
+        server.inference_daemon = self
+        os.chmod(self.socket_path, 0o660)
+
+        for detector in detectors:
+            threading.Thread(target=self._worker, args=(detector,), daemon=True).start()
+        print(f"Демон анализа слушает {self.socket_path}")
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+
+
+# ----------------------------------------------------------------------
+# Клиент
+# ----------------------------------------------------------------------
+
+def daemon_enabled(socket_path=DEFAULT_SOCKET_PATH) -> bool:
+    """Включен ли демон (HORSEAI_INFERENCE_DAEMON=1) и есть ли его сокет"""
+    return os.environ.get('HORSEAI_INFERENCE_DAEMON', '0') == '1' and Path(socket_path).exists()
+
+
+def _request(message: dict, socket_path, timeout: float, on_event: Optional[Callable[[dict], None]] = None) -> dict:
+    """Отправить запрос и читать события до финального"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(5)
+        try:
+            sock.connect(str(socket_path))
+        except OSError as e:
+            raise DaemonUnavailable(str(e)) from e
+
+        sock.sendall(_encode(message))
+        deadline = time.monotonic() + timeout
+        with sock.makefile('rb') as stream:
+            while True:
+                sock.settimeout(max(deadline - time.monotonic(), 0.001))
+                line = stream.readline()
+                if not line:
+                    raise DaemonUnavailable("Демон закрыл соединение")
+                event = json.loads(line)
+                if event['type'] in ('result', 'error', 'pong'):
+                    return event
+                if on_event is not None:
+                    on_event(event)
+    finally:
+        sock.close()
+
+
+def ping(socket_path=DEFAULT_SOCKET_PATH, timeout: float = 5) -> dict:
+    """Состояние демона: очередь, текущее задание, счетчики"""
+    return _request({'op': 'ping'}, socket_path, timeout)
+
+
+def analyze_video(video_path, output_dir=None, video_id=None,
+                  on_progress: Optional[Callable[[dict], None]] = None,
+                  timeout: float = DEFAULT_TIMEOUT, socket_path=DEFAULT_SOCKET_PATH,
+                  preview: bool = False) -> dict:
+    """Проанализировать видео в демоне и вернуть результат детектора
+
+    on_progress получает события 'queued' и 'progress', а при preview=True
+    еще 'preview' с предварительным результатом. DaemonUnavailable -
+    демон не отвечает (можно перейти на запуск детектора отдельным
+    процессом), RuntimeError - ошибка анализа, TimeoutError - таймаут.
+    """
+    event = _request({
+        'op': 'analyze',
+        'video': str(video_path),
+        'output': str(output_dir) if output_dir else None,
+        'video_id': video_id,
+        'preview': preview,
+    }, socket_path, timeout, on_progress)
+    if event['type'] == 'error':
+        raise RuntimeError(event['error'])
+    return event['result']
@@ -0,0 +1,168 @@
+"""
+Видео с разметкой копыт, создаваемое по запросу.
+
+DLC больше не рендерит *labeled*.mp4 при каждом анализе: диагноз
+возвращается, как только готов H5. Путь размеченного видео известен
+заранее (<h5>_labeled.mp4), а рядом пишется задание <h5>_labeled.json
+с путями исходного видео и H5.
+
+Первый запрос видео (скачивание или прокси) ставит рендер в фоновую
+очередь процесса и сразу получает PENDING (HTTP 202); следующие
+запросы получают готовый файл.
+"""
+
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+import numpy as np
+
+from web.pose_data import load_paw_points
+
+logger = logging.getLogger(__name__)
+
+LABELED_SUFFIX = '_labeled'
+
+# Точки с меньшим likelihood не рисуются (как pcutoff в DLC)
+PCUTOFF = 0.1
+POINT_RADIUS = 6
+
+# Цвета копыт (BGR) в порядке PAW_NAMES: как на графиках отчета
+PAW_COLORS = [(0, 0, 255), (255, 0, 0), (0, 128, 0), (0, 165, 255)]
+
+# Состояния размеченного видео
+READY = 'ready'
+PENDING = 'pending'
+FAILED = 'failed'
+MISSING = 'missing'
+
+# Сколько видео рисуется одновременно в одном процессе
+RENDER_WORKERS = int(os.environ.get('HORSEAI_RENDER_WORKERS', '1'))
+
+_executor = None
+_renders: Dict[str, Future] = {}
+_renders_lock = threading.Lock()
+
+
+def labeled_video_path(h5_file: Union[str, Path]) -> Path:
+    """Путь размеченного видео для H5"""
+    h5_file = Path(h5_file)
+    return h5_file.with_name(h5_file.stem + LABELED_SUFFIX + '.mp4')
+
+
+def _job_path(labeled_video: Union[str, Path]) -> Path:
+    return Path(labeled_video).with_suffix('.json')
+
+
+def request_labeled_video(video_path: Union[str, Path], h5_file: Union[str, Path]) -> Path:
+    """Записать задание на размеченное видео и вернуть его будущий путь"""
+    labeled_video = labeled_video_path(h5_file)
+    job = {'video': str(Path(video_path).resolve()), 'h5': str(Path(h5_file).resolve())}
+    job_path = _job_path(labeled_video)
+    tmp_path = job_path.with_name(job_path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(job, f, ensure_ascii=False)
+    os.replace(tmp_path, job_path)
+    return labeled_video
+
+
+def render_labeled_video(video_path: Union[str, Path], h5_file: Union[str, Path],
+                         output_path: Union[str, Path], pcutoff: float = PCUTOFF) -> Optional[Path]:
+    """Нарисовать копыта из H5 поверх кадров видео (None без OpenCV или копыт в H5)"""
+    try:
+        import cv2
+    except ImportError:
+        return None
+
+    points = load_paw_points(h5_file)
+    if points is None:
+        return None
+    x, y, likelihood = points
+
+    output_path = Path(output_path)
+    # Временный файл с тем же расширением (по нему OpenCV выбирает контейнер)
+    # и pid: одно видео могут рисовать несколько воркеров
+    tmp_path = output_path.with_name(f"{output_path.stem}.part{os.getpid()}.mp4")
+    capture = cv2.VideoCapture(str(video_path))
+    writer = None
+    replaced = False
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        index = 0
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            if writer is None:
+                height, width = frame.shape[:2]
+                writer = cv2.VideoWriter(str(tmp_path), cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+            if index < x.shape[1]:
+                visible = (likelihood[:, index] > pcutoff) & np.isfinite(x[:, index]) & np.isfinite(y[:, index])
+                for paw in np.flatnonzero(visible):
+                    cv2.circle(frame, (int(x[paw, index]), int(y[paw, index])), POINT_RADIUS,
+                               PAW_COLORS[paw], -1)
+            writer.write(frame)
+            index += 1
+        if writer is not None:
+            writer.release()
+            os.replace(tmp_path, output_path)
+            replaced = True
+    finally:
+        capture.release()
+        if writer is not None:
+            writer.release()
+        # Недописанный файл не остается после ошибки (иначе каждый повтор добавит еще один)
+        if not replaced:
+            tmp_path.unlink(missing_ok=True)
+
+    return output_path if replaced else None
+
+
+def _render_job(labeled_video: Path) -> Optional[Path]:
+    with open(_job_path(labeled_video), encoding='utf-8') as f:
+        job = json.load(f)
+    logger.info(f"Рендер видео с разметкой: {labeled_video.name}")
+    result = render_labeled_video(job['video'], job['h5'], labeled_video)
+    if result is None:
+        logger.error(f"Видео с разметкой не создано: {labeled_video.name} (нет OpenCV или копыт в H5)")
+    return result
+
+
+def _log_failure(labeled_video: Path, future: Future):
+    error = future.exception()
+    if error is not None:
+        logger.error(f"Ошибка рендера {labeled_video.name}: {error}", exc_info=error)
+
+
+def request_render(labeled_video: Union[str, Path]) -> str:
+    """Состояние размеченного видео; при первом запросе рендер ставится в фоновую очередь
+
+    READY - файл готов, PENDING - рисуется, FAILED - рендер не удался
+    (следующий запрос поставит его снова), MISSING - нет ни файла, ни задания.
+    """
+    global _executor
+    labeled_video = Path(labeled_video)
+    if labeled_video.exists():
+        return READY
+    if not _job_path(labeled_video).exists():
+        return MISSING
+
+    key = str(labeled_video)
+    with _renders_lock:
+        future = _renders.get(key)
+        if future is None:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix='labeled-video')
+            future = _executor.submit(_render_job, labeled_video)
+            future.add_done_callback(lambda done: _log_failure(labeled_video, done))
+            _renders[key] = future
+            return PENDING
+        if not future.done():
+            return PENDING
+        del _renders[key]
+
+    return READY if labeled_video.exists() else FAILED
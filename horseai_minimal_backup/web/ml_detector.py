@@ -10,6 +10,8 @@ from pathlib import Path
 import subprocess
 import shutil
 
+from web.inference_daemon import DaemonUnavailable, analyze_video as analyze_in_daemon, daemon_enabled
+
 class SimpleHorseDetector:
     """Простая обертка вокруг вашего детектора"""
     
@@ -32,6 +34,16 @@ class SimpleHorseDetector:
                 return {"error": f"Файл не найден: {video_path}"}
             
             print(f"🔍 Анализируем видео: {video_path.name}")
+
+            if daemon_enabled():
+                try:
+                    return analyze_in_daemon(video_path, timeout=300)
+                except DaemonUnavailable as e:
+                    print(f"   Демон недоступен ({e}), запуск детектора отдельным процессом")
+                except TimeoutError:
+                    return {"error": "Таймаут анализа (более 5 минут)"}
+                except RuntimeError as e:
+                    return {"error": f"Ошибка анализа: {str(e)}"}
             
             # Создаем временную папку для результатов
             timestamp = int(time.time())
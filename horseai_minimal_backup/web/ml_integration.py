@@ -34,12 +34,9 @@ def run_ml_analysis(video_id, video_path):
                 video_path_obj = Path(video_path)
                 h5_file, labeled_video = detector.analyze_video_superanimal(video_path_obj)
                 
-                # Читаем данные
-                import pandas as pd
-                df = pd.read_hdf(h5_file)
-                
-                # Извлекаем признаки
-                features = detector.extract_features(df)
+                # Признаки из хранилища по хэшу H5, при промахе - из траекторий копыт
+                from web.feature_store import get_or_extract_features
+                features = get_or_extract_features(h5_file, video_id=video_id)
                 
                 if features is None:
                     raise ValueError("Не удалось извлечь признаки")
@@ -4,44 +4,54 @@ import joblib
 import pickle
 from pathlib import Path
 
-def load_your_model():
-    """Загружает вашу модель с исправленными импортами"""
-    
-    # Добавляем все нужные пути
-    sys.path.insert(0, '/home/ais/shared/horseAI')
-    sys.path.insert(0, '/home/ais/shared/horseAI/models')
-    sys.path.insert(0, '/home/ais/shared/horseAI/models/modules')
-    
-    # Создаем кастомный unpickler для исправления импортов
-    class ModelUnpickler(pickle.Unpickler):
-        def find_class(self, module, name):
-            # Исправляем неправильные импорты
-            # Модель ожидает: models.random_forest.MyRandomForest
-            # Но реальный путь: models.modules.random_forest.MyRandomForest
-            
-            if module.startswith('models.'):
-                # Заменяем models. на models.modules.
-                fixed_module = module.replace('models.', 'models.modules.', 1)
-                try:
-                    # Динамически импортируем модуль
-                    __import__(fixed_module)
-                    module_obj = sys.modules[fixed_module]
-                    return getattr(module_obj, name)
-                except (ImportError, AttributeError):
-                    # Если не получилось, пробуем оригинальный путь
-                    pass
-            
-            # Для остальных используем стандартный импорт
-            return super().find_class(module, name)
-    
-    # Загружаем модель
-    model_path = Path('/home/ais/shared/horseAI/models/trained/model.pkl')
-    
+# Добавляем все нужные пути
+for _path in ('/home/ais/shared/horseAI', '/home/ais/shared/horseAI/models',
+              '/home/ais/shared/horseAI/models/modules'):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+MODEL_PATH = Path('/home/ais/shared/horseAI/models/trained/model.pkl')
+
+
+# Создаем кастомный unpickler для исправления импортов
+class ModelUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        # Исправляем неправильные импорты
+        # Модель ожидает: models.random_forest.MyRandomForest
+        # Но реальный путь: models.modules.random_forest.MyRandomForest
+        
+        if module.startswith('models.'):
+            # Заменяем models. на models.modules.
+            fixed_module = module.replace('models.', 'models.modules.', 1)
+            try:
+                # Динамически импортируем модуль
+                __import__(fixed_module)
+                module_obj = sys.modules[fixed_module]
+                return getattr(module_obj, name)
+            except (ImportError, AttributeError):
+                # Если не получилось, пробуем оригинальный путь
+                pass
+        
+        # Для остальных используем стандартный импорт
+        return super().find_class(module, name)
+
+
+def load_model_file(model_path):
+    """Распаковать файл модели через ModelUnpickler (без кэша)"""
     with open(model_path, 'rb') as f:
         unpickler = ModelUnpickler(f)
-        model_data = unpickler.load()
-    
-    return model_data
+        return unpickler.load()
+
+
+def load_your_model():
+    """Загружает вашу модель с исправленными импортами
+
+    Модель берется из реестра процесса: повторные вызовы не распаковывают
+    файл заново, пока он не изменился. Возвращается поверхностная копия dict:
+    ключи можно менять, не затрагивая реестр, а сами модели общие.
+    """
+    from web.model_registry import get_model_registry
+    return dict(get_model_registry().get(MODEL_PATH).model_data)
 
 # Тест загрузки
 if __name__ == "__main__":
@@ -0,0 +1,191 @@
+"""
+Реестр моделей процесса.
+
+Каждый файл модели загружается один раз на процесс, все детекторы и
+потоки получают один и тот же экземпляр (только для чтения - не
+изменять). При каждом обращении проверяются размер и mtime файла; если
+они изменились и изменился SHA-256, модель загружается заново и
+подменяется целиком, без промежуточного состояния.
+
+Для нескольких воркеров gunicorn/uwsgi модель загружается в мастере до
+fork (preload_models из config/wsgi.py), и воркеры делят ее страницы.
+При HORSEAI_MODEL_MMAP=r большие массивы модели открываются через
+joblib.load(mmap_mode='r') и делятся через страничный кэш ОС.
+"""
+
+import gc
+import os
+import threading
+import time
+from pathlib import Path
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple, Union
+
+from web.pose_data import file_sha256
+
+DEFAULT_MODEL_PATH = Path("/home/ais/shared/horseAI/models/trained/model.pkl")
+
+
+def _rss_bytes() -> Optional[int]:
+    """Резидентная память процесса (Linux /proc, иначе None)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def process_memory(pid: Union[int, str] = 'self') -> Optional[Dict[str, int]]:
+    """Память процесса из /proc/<pid>/smaps_rollup в байтах (Rss, Pss, Shared_*, Private_*)"""
+    fields = ('Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty')
+    try:
+        with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+
+    memory = {}
+    for line in lines:
+        name, _, value = line.partition(':')
+        if name in fields:
+            memory[name.lower()] = int(value.split()[0]) * 1024
+    memory['shared'] = memory.get('shared_clean', 0) + memory.get('shared_dirty', 0)
+    memory['private'] = memory.get('private_clean', 0) + memory.get('private_dirty', 0)
+    return memory
+
+
+def _load_model_file(path: Path, mmap_mode: Optional[str] = None) -> dict:
+    """joblib.load, при ошибке импорта модулей модели - ModelUnpickler
+
+    Пакет NumPy (*_bundle.npz) загружается без joblib и фреймворка нейросети.
+    """
+    if path.suffix == '.npz':
+        from web.inference_bundle import InferenceBundle
+        return InferenceBundle.load(path).model_data()
+
+    import joblib
+    try:
+        return joblib.load(path, mmap_mode=mmap_mode)
+    except (ImportError, AttributeError):
+        from web.model_loader import load_model_file
+        return load_model_file(path)
+
+
+class LoadedModel:
+    """Загруженная версия модели и сведения о загрузке"""
+    __slots__ = ('path', 'mmap_mode', 'model_data', 'sha256', 'size', 'mtime',
+                 'loaded_at', 'load_seconds', 'memory_bytes')
+
+    def __init__(self, path: Path, mmap_mode: Optional[str], model_data: dict, sha256: str,
+                 size: int, mtime: float, load_seconds: float, memory_bytes: Optional[int]):
+        self.path = path
+        self.mmap_mode = mmap_mode
+        self.model_data: Mapping = MappingProxyType(model_data)
+        self.sha256 = sha256
+        self.size = size
+        self.mtime = mtime
+        self.loaded_at = time.time()
+        self.load_seconds = load_seconds
+        self.memory_bytes = memory_bytes
+
+    def info(self) -> dict:
+        return {
+            'path': str(self.path),
+            'mmap_mode': self.mmap_mode,
+            'sha256': self.sha256,
+            'file_size': self.size,
+            'loaded_at': self.loaded_at,
+            'load_seconds': round(self.load_seconds, 3),
+            'memory_bytes': self.memory_bytes,
+        }
+
+
+class ModelRegistry:
+    """Общие для процесса модели с ленивой загрузкой и горячей заменой"""
+
+    def __init__(self, mmap_mode: Optional[str] = None):
+        self.mmap_mode = mmap_mode
+        self._models: Dict[Tuple[Path, Optional[str]], LoadedModel] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: Union[str, Path] = DEFAULT_MODEL_PATH) -> LoadedModel:
+        """Актуальная версия модели (загружается при первом обращении или смене файла)"""
+        path = Path(path).resolve()
+        key = (path, self.mmap_mode)
+        stat = path.stat()
+
+        loaded = self._models.get(key)
+        if loaded is not None and (loaded.size, loaded.mtime) == (stat.st_size, stat.st_mtime):
+            return loaded
+
+        with self._lock:
+            loaded = self._models.get(key)
+            stat = path.stat()
+            if loaded is not None and (loaded.size, loaded.mtime) == (stat.st_size, stat.st_mtime):
+                return loaded
+
+            sha256 = file_sha256(path)
+            if loaded is not None and loaded.sha256 == sha256:
+                # Файл перезаписан тем же содержимым: обновляем только отметки
+                loaded.size, loaded.mtime = stat.st_size, stat.st_mtime
+                return loaded
+
+            print(f"Загрузка модели: {path}")
+            rss_before = _rss_bytes()
+            start = time.perf_counter()
+            model_data = _load_model_file(path, self.mmap_mode)
+            load_seconds = time.perf_counter() - start
+            rss_after = _rss_bytes()
+            memory_bytes = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+
+            new = LoadedModel(path, self.mmap_mode, model_data, sha256, stat.st_size, stat.st_mtime,
+                              load_seconds, memory_bytes)
+            self._models[key] = new
+            print(f"Модель загружена за {load_seconds:.2f} с"
+                  + (f", память: {memory_bytes / 2 ** 20:.1f} МБ" if memory_bytes is not None else ""))
+            return new
+
+    def get_current(self, path: Union[str, Path] = DEFAULT_MODEL_PATH) -> LoadedModel:
+        """Пакет NumPy рядом с model.pkl, если он есть и актуален, иначе сам model.pkl
+
+        HORSEAI_NUMPY_BUNDLE=0 отключает пакет.
+        """
+        from web.inference_bundle import bundle_path
+
+        bundle = bundle_path(path)
+        if os.environ.get('HORSEAI_NUMPY_BUNDLE', '1') == '1' and bundle.exists():
+            loaded = self.get(bundle)
+            if loaded.model_data['bundle'].is_fresh(path):
+                return loaded
+            print(f"Пакет {bundle.name} устарел, используется {Path(path).name}")
+        return self.get(path)
+
+    def stats(self) -> List[dict]:
+        """Сведения о загруженных моделях"""
+        return [loaded.info() for loaded in list(self._models.values())]
+
+
+_registry = ModelRegistry(mmap_mode=os.environ.get('HORSEAI_MODEL_MMAP') or None)
+
+
+def get_model_registry() -> ModelRegistry:
+    return _registry
+
+
+def preload_models(paths=(DEFAULT_MODEL_PATH,)):
+    """Загрузить модели в мастер-процессе до fork воркеров
+
+    Загружается то же, что возьмут воркеры: актуальный пакет NumPy, а
+    model.pkl - только если пакета нет или он устарел. После загрузки
+    объекты переносятся в постоянное поколение сборщика мусора
+    (gc.freeze), чтобы его обходы в воркерах не копировали страницы
+    с моделью.
+    """
+    for path in paths:
+        try:
+            get_model_registry().get_current(path)
+        except Exception as e:
+            print(f"Предзагрузка модели {path} не удалась: {e}")
+    gc.collect()
+    gc.freeze()
@@ -0,0 +1,131 @@
+"""
+Сбор видео в пакеты для разметки поз.
+
+Каждый вызов deeplabcut.video_inference_superanimal заново создает
+детектор и HRNet. PoseBatcher собирает видео, пришедшие в течение
+max_wait секунд после первого (не больше max_batch), и передает их в один
+вызов run_batch; результат раскладывается обратно по видео через Future.
+
+Одиночная загрузка ждет не дольше max_wait. Если пакетный вызов падает,
+видео пакета обрабатываются по одному, чтобы ошибка одного видео не
+затрагивала остальные. Видео, для которых результата нет (run_batch
+вернул меньше значений или поток пакетов остановлен), получают
+исключение, а не остаются ждать вечно.
+"""
+
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Hashable, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BATCH = 4
+DEFAULT_MAX_WAIT = 1.0
+
+
+def _fail_unresolved(group, error: BaseException):
+    """Завершить исключением все еще ожидающие Future группы"""
+    for _, future in group:
+        if not future.done():
+            future.set_exception(error)
+
+
+class PoseBatcher:
+    """Очередь видео с одним потоком, вызывающим run_batch(key, items)
+
+    run_batch возвращает по значению на каждый элемент (исключение на
+    месте значения - ошибка этого элемента). В один вызов попадают только
+    элементы с одинаковым key (например, расширение видео и папка вывода).
+    """
+
+    def __init__(self, run_batch: Callable[[Hashable, List], Sequence], max_batch: int = DEFAULT_MAX_BATCH,
+                 max_wait: float = DEFAULT_MAX_WAIT):
+        self.run_batch = run_batch
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max_wait
+        self._queue: 'queue.Queue[tuple]' = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, key: Hashable, item) -> Future:
+        future = Future()
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='pose-batcher', daemon=True)
+                self._thread.start()
+        self._queue.put((key, item, future))
+        return future
+
+    def _collect(self) -> list:
+        """Первое ожидающее видео и все, что пришло за max_wait после него"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            groups = OrderedDict()
+            for key, item, future in self._collect():
+                groups.setdefault(key, []).append((item, future))
+            try:
+                for key, group in groups.items():
+                    self._run(key, group)
+            finally:
+                for group in groups.values():
+                    _fail_unresolved(group, RuntimeError("Поток пакетной разметки остановлен"))
+
+    def _run(self, key, group):
+        self.batches += 1
+        self.items += len(group)
+        try:
+            try:
+                results = list(self.run_batch(key, [item for item, _ in group]))
+            except Exception as e:
+                if len(group) == 1:
+                    _fail_unresolved(group, e)
+                    return
+                logger.error(f"Пакетная разметка не удалась ({e}), видео обрабатываются по одному")
+                self.batches -= 1
+                self.items -= len(group)
+                for single in group:
+                    self._run(key, [single])
+                return
+
+            if len(results) != len(group):
+                _fail_unresolved(group, RuntimeError(
+                    f"run_batch вернул {len(results)} результатов для {len(group)} видео"))
+                return
+
+            for (_, future), result in zip(group, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        finally:
+            _fail_unresolved(group, RuntimeError("Разметка видео не вернула результата"))
+
+    def stats(self) -> dict:
+        return {
+            'max_batch': self.max_batch,
+            'max_wait': self.max_wait,
+            'waiting': self._queue.qsize(),
+            'batches': self.batches,
+            'videos': self.items,
+            'mean_batch': round(self.items / self.batches, 2) if self.batches else None,
+        }
@@ -0,0 +1,141 @@
+"""
+Кэш разметки поз по содержимому видео.
+
+Одно и то же видео часто загружают дважды (с телефона и со страницы),
+и каждая загрузка сохраняется под новым uuid-именем. При сохранении
+загрузки считается SHA-256 содержимого (save_upload, в том же проходе,
+что и запись на диск), а после DeepLabCut хэш связывается с манифестом
+разметки. Повторная загрузка того же видео берет готовые H5 и
+файл-спутник и сразу переходит к признакам и предсказанию.
+
+Хранится в SQLite, общем для веб-процесса и демона анализа:
+uploads - хэши сохраненных загрузок (путь, размер, mtime),
+poses - хэш видео -> манифест разметки.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Union
+
+from web.pose_data import file_sha256
+from web.pose_manifest import read_manifest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = Path("/home/ais/shared/horseAI/data/pose_cache.sqlite3")
+
+
+class PoseCache:
+    """Хэши загрузок и разметка поз по хэшу видео"""
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_CACHE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime REAL NOT NULL, "
+                "sha256 TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS poses ("
+                "video_sha256 TEXT PRIMARY KEY, manifest TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        """Соединение на одну операцию: commit при успехе, всегда close"""
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def remember_upload(self, video_path: Union[str, Path], sha256: str):
+        """Запомнить хэш сохраненного файла"""
+        video_path = Path(video_path).resolve()
+        stat = video_path.stat()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO uploads (path, size, mtime, sha256, created_at) VALUES (?, ?, ?, ?, ?)",
+                (str(video_path), stat.st_size, stat.st_mtime, sha256, time.time())
+            )
+
+    def video_hash(self, video_path: Union[str, Path]) -> str:
+        """SHA-256 видео: из записи о загрузке, если файл не менялся, иначе чтением файла"""
+        video_path = Path(video_path).resolve()
+        stat = video_path.stat()
+        with self._connect() as conn:
+            row = conn.execute("SELECT size, mtime, sha256 FROM uploads WHERE path = ?",
+                               (str(video_path),)).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            return row[2]
+
+        sha256 = file_sha256(video_path)
+        self.remember_upload(video_path, sha256)
+        return sha256
+
+    def get(self, video_sha256: str) -> Optional[dict]:
+        """Манифест разметки видео с этим хэшем (None, если разметки нет или она устарела)"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT manifest FROM poses WHERE video_sha256 = ?",
+                               (video_sha256,)).fetchone()
+        manifest = read_manifest(row[0]) if row else None
+        if manifest is None or (manifest.get('video') or {}).get('sha256') != video_sha256:
+            if row:
+                with self._lock, self._connect() as conn:
+                    conn.execute("DELETE FROM poses WHERE video_sha256 = ?", (video_sha256,))
+            return None
+        return manifest
+
+    def put(self, video_sha256: str, manifest: Union[str, Path]):
+        """Связать хэш видео с манифестом его разметки"""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO poses (video_sha256, manifest, created_at) VALUES (?, ?, ?)",
+                (video_sha256, str(Path(manifest).resolve()), time.time())
+            )
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_pose_cache() -> Optional[PoseCache]:
+    """Общий кэш разметки процесса (None при HORSEAI_POSE_CACHE=0)"""
+    global _default_cache
+    if os.environ.get('HORSEAI_POSE_CACHE', '1') == '0':
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PoseCache()
+        return _default_cache
+
+
+def save_upload(uploaded_file, destination: Union[str, Path], cache: Optional[PoseCache] = None) -> str:
+    """Записать загруженный файл Django по частям, посчитав SHA-256 в том же проходе
+
+    Хэш запоминается в кэше разметки, чтобы анализ не читал файл повторно.
+    """
+    digest = hashlib.sha256()
+    with open(destination, 'wb+') as f:
+        for chunk in uploaded_file.chunks():
+            digest.update(chunk)
+            f.write(chunk)
+    sha256 = digest.hexdigest()
+
+    cache = cache or get_pose_cache()
+    if cache is not None:
+        try:
+            cache.remember_upload(destination, sha256)
+        except Exception as e:
+            logger.error(f"Кэш разметки недоступен: {e}")
+    return sha256
@@ -0,0 +1,319 @@
+"""
+Чтение траекторий копыт из файлов поз DeepLabCut.
+
+Вместо pd.read_hdf всего файла читаются только y- и likelihood-столбцы
+четырех копыт, порциями строк, сразу в непрерывные массивы NumPy
+(по умолчанию float32).
+
+После разметки рядом с H5 пишется компактный файл-спутник
+(<h5>_paws.npy + <h5>_paws.json): матрица 8 x T (y и likelihood копыт)
+и заголовок со схемой, хэшем исходного H5, fps и числом кадров.
+Повторные чтения открывают его через np.load(mmap_mode='r').
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from web.gait_features import PAW_NAMES, PawSignals, resolve_paw_columns
+
+# Сколько строк таблицы поз читать за один раз
+CHUNK_ROWS = 8192
+
+SIDECAR_VERSION = 1
+SIDECAR_SUFFIX = '_paws'
+
+
+class PawArrays(NamedTuple):
+    """Траектории копыт одного видео (строки в порядке PAW_NAMES)"""
+    y: np.ndarray
+    likelihood: np.ndarray
+
+    @property
+    def n_frames(self) -> int:
+        return self.y.shape[1]
+
+
+def _pose_key(store: pd.HDFStore) -> str:
+    """Ключ таблицы поз (DLC пишет df_with_missing)"""
+    keys = store.keys()
+    if '/df_with_missing' in keys:
+        return '/df_with_missing'
+    if not keys:
+        raise ValueError(f"Пустой файл поз: {store.filename}")
+    return keys[0]
+
+
+def _read_rows(store: pd.HDFStore, key: str, columns: pd.Index, positions: list,
+               start: int, stop: int) -> np.ndarray:
+    """Строки [start, stop) только для нужных позиций столбцов"""
+    storer = store.get_storer(key)
+
+    # Таблица DLC: все координаты лежат в одном блоке values_block_0
+    if storer.is_table and len(storer.values_axes) == 1:
+        block_labels = list(storer.values_axes[0].values)
+        if block_labels == list(columns):
+            block = storer.table.read(start=start, stop=stop, field=storer.values_axes[0].cname)
+            return block[:, positions]
+
+    chunk = store.select(key, start=start, stop=stop)
+    return chunk.take(positions, axis=1).to_numpy()
+
+
+def _paw_layout(store: pd.HDFStore):
+    """Ключ, схема, позиции столбцов копыт и число кадров (None, если копыт нет в схеме)"""
+    key = _pose_key(store)
+    columns = store.select(key, start=0, stop=0).columns
+    paw_columns = resolve_paw_columns(columns)
+    if not paw_columns.complete:
+        return None
+
+    storer = store.get_storer(key)
+    n_frames = storer.nrows if storer.is_table else storer.group.axis1.shape[0]
+
+    # Позиции likelihood, которых нет в схеме, заполняются NaN
+    likelihood_rows = [i for i, pos in enumerate(paw_columns.likelihood) if pos is not None]
+    positions = list(paw_columns.y) + [paw_columns.likelihood[i] for i in likelihood_rows]
+    return key, columns, positions, likelihood_rows, n_frames
+
+
+def load_paw_arrays(h5_file: Union[str, Path], chunk_rows: int = CHUNK_ROWS,
+                    dtype=np.float32) -> Optional[PawArrays]:
+    """Прочитать y и likelihood четырех копыт из H5 (None, если копыт нет в схеме)"""
+    with pd.HDFStore(str(h5_file), mode='r') as store:
+        layout = _paw_layout(store)
+        if layout is None:
+            return None
+        key, columns, positions, likelihood_rows, n_frames = layout
+
+        y = np.empty((len(PAW_NAMES), n_frames), dtype=dtype)
+        likelihood = np.full((len(PAW_NAMES), n_frames), np.nan, dtype=dtype)
+
+        for start in range(0, n_frames, chunk_rows):
+            stop = min(start + chunk_rows, n_frames)
+            values = _read_rows(store, key, columns, positions, start, stop).T
+            y[:, start:stop] = values[:len(PAW_NAMES)]
+            likelihood[likelihood_rows, start:stop] = values[len(PAW_NAMES):]
+
+    return PawArrays(y=y, likelihood=likelihood)
+
+
+def load_paw_points(h5_file: Union[str, Path], chunk_rows: int = CHUNK_ROWS,
+                    dtype=np.float32) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """x, y и likelihood четырех копыт (4 x T каждый) для отрисовки поверх видео
+
+    None, если в схеме нет копыт или их x-столбцов (x стоит перед y той же точки).
+    """
+    with pd.HDFStore(str(h5_file), mode='r') as store:
+        layout = _paw_layout(store)
+        if layout is None:
+            return None
+        key, columns, positions, likelihood_rows, n_frames = layout
+
+        y_positions = positions[:len(PAW_NAMES)]
+        x_positions = [pos - 1 for pos in y_positions]
+        if any(pos < 0 or str(columns[pos][-1]) != 'x' or columns[pos][:-1] != columns[pos + 1][:-1]
+               for pos in x_positions):
+            return None
+
+        x = np.empty((len(PAW_NAMES), n_frames), dtype=dtype)
+        y = np.empty((len(PAW_NAMES), n_frames), dtype=dtype)
+        likelihood = np.full((len(PAW_NAMES), n_frames), np.nan, dtype=dtype)
+        for start in range(0, n_frames, chunk_rows):
+            stop = min(start + chunk_rows, n_frames)
+            values = _read_rows(store, key, columns, x_positions + positions, start, stop).T
+            x[:, start:stop] = values[:len(PAW_NAMES)]
+            y[:, start:stop] = values[len(PAW_NAMES):2 * len(PAW_NAMES)]
+            likelihood[likelihood_rows, start:stop] = values[2 * len(PAW_NAMES):]
+
+    return x, y, likelihood
+
+
+def file_sha256(path: Union[str, Path], block_size: int = 1 << 20) -> str:
+    """SHA-256 файла, читаемого блоками"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def pose_file_hash(h5_file: Union[str, Path]) -> str:
+    """SHA-256 файла поз; берется из актуального файла-спутника, если он есть"""
+    sidecar = open_paw_sidecar(h5_file)
+    if sidecar is not None and sidecar.header.get('source_sha256'):
+        return sidecar.header['source_sha256']
+    return file_sha256(h5_file)
+
+
+def sidecar_paths(h5_file: Union[str, Path]):
+    """Пути файла-спутника (данные, заголовок) для H5"""
+    h5_file = Path(h5_file)
+    base = h5_file.with_name(h5_file.stem + SIDECAR_SUFFIX)
+    return base.with_suffix('.npy'), base.with_suffix('.json')
+
+
+def video_fps(video_path: Union[str, Path, None]) -> Optional[float]:
+    """Частота кадров видео через OpenCV (None, если недоступно)"""
+    if video_path is None:
+        return None
+    try:
+        import cv2
+    except ImportError:
+        return None
+
+    capture = cv2.VideoCapture(str(video_path))
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS)
+    finally:
+        capture.release()
+    return float(fps) if fps and fps > 0 else None
+
+
+def write_preview_video(video_path: Union[str, Path], output_path: Union[str, Path],
+                        step: int, scale: float) -> Optional[int]:
+    """Записать каждый step-й кадр видео, уменьшенный в 1/scale раз, с частотой fps / step
+
+    Пропускаемые кадры только захватываются (grab), без преобразования
+    в изображение. Возвращает число записанных кадров (None без OpenCV).
+    """
+    try:
+        import cv2
+    except ImportError:
+        return None
+
+    capture = cv2.VideoCapture(str(video_path))
+    writer = None
+    written = 0
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        index = 0
+        while capture.grab():
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+                if writer is None:
+                    height, width = frame.shape[:2]
+                    writer = cv2.VideoWriter(str(output_path), cv2.VideoWriter_fourcc(*'mp4v'),
+                                             fps / step, (width, height))
+                writer.write(frame)
+                written += 1
+            index += 1
+    finally:
+        capture.release()
+        if writer is not None:
+            writer.release()
+    return written
+
+
+def write_paw_sidecar(h5_file: Union[str, Path], fps: Optional[float] = None) -> Optional[Path]:
+    """Записать файл-спутник с траекториями копыт рядом с H5"""
+    h5_file = Path(h5_file)
+    paws = load_paw_arrays(h5_file, dtype=np.float64)
+    if paws is None:
+        return None
+
+    with pd.HDFStore(str(h5_file), mode='r') as store:
+        columns = store.select(_pose_key(store), start=0, stop=0).columns
+    paw_columns = resolve_paw_columns(columns)
+
+    data_path, header_path = sidecar_paths(h5_file)
+    stat = h5_file.stat()
+    header = {
+        'version': SIDECAR_VERSION,
+        'source': h5_file.name,
+        'source_sha256': file_sha256(h5_file),
+        'source_size': stat.st_size,
+        'source_mtime': stat.st_mtime,
+        'rows': [f'{paw}_y' for paw in PAW_NAMES] + [f'{paw}_likelihood' for paw in PAW_NAMES],
+        'schema': {
+            'y': [list(map(str, columns[pos])) for pos in paw_columns.y],
+            'likelihood': [list(map(str, columns[pos])) if pos is not None else None
+                           for pos in paw_columns.likelihood],
+        },
+        'dtype': 'float64',
+        'n_frames': paws.n_frames,
+        'fps': fps,
+    }
+
+    # Сначала данные, потом заголовок: заголовок без данных не появится
+    tmp_data = data_path.with_name(data_path.name + '.tmp')
+    with open(tmp_data, 'wb') as f:
+        np.save(f, np.ascontiguousarray(np.vstack([paws.y, paws.likelihood])))
+    os.replace(tmp_data, data_path)
+
+    tmp_header = header_path.with_name(header_path.name + '.tmp')
+    with open(tmp_header, 'w', encoding='utf-8') as f:
+        json.dump(header, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_header, header_path)
+
+    return data_path
+
+
+class PawSidecar(NamedTuple):
+    """Открытый файл-спутник: заголовок и массивы, отображенные в память"""
+    header: dict
+    paws: PawArrays
+
+    @property
+    def fps(self) -> Optional[float]:
+        return self.header.get('fps')
+
+
+def open_paw_sidecar(h5_file: Union[str, Path], verify_hash: bool = False) -> Optional[PawSidecar]:
+    """Открыть файл-спутник H5 (None, если его нет или он устарел)"""
+    h5_file = Path(h5_file)
+    data_path, header_path = sidecar_paths(h5_file)
+    if not data_path.exists() or not header_path.exists():
+        return None
+
+    try:
+        with open(header_path, 'r', encoding='utf-8') as f:
+            header = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if header.get('version') != SIDECAR_VERSION:
+        return None
+
+    # Быстрая проверка актуальности по размеру и времени, полная - по хэшу
+    if h5_file.exists():
+        stat = h5_file.stat()
+        unchanged = (stat.st_size == header.get('source_size') and
+                     stat.st_mtime == header.get('source_mtime'))
+        if verify_hash:
+            if file_sha256(h5_file) != header.get('source_sha256'):
+                return None
+        elif not unchanged:
+            return None
+
+    data = np.load(data_path, mmap_mode='r')
+    n_paws = len(PAW_NAMES)
+    if data.shape != (2 * n_paws, header.get('n_frames')):
+        return None
+
+    return PawSidecar(header=header, paws=PawArrays(y=data[:n_paws], likelihood=data[n_paws:]))
+
+
+def load_paw_signals(h5_file: Union[str, Path]) -> Optional[PawSignals]:
+    """Сигналы копыт для extract_features без загрузки всего DataFrame
+
+    Сначала используется файл-спутник, иначе читается H5. Координаты
+    берутся в float64: округление до float32 сдвигает признаки на ~1e-5
+    относительно обучающего пайплайна.
+    """
+    sidecar = open_paw_sidecar(h5_file)
+    if sidecar is not None:
+        paws = sidecar.paws
+    else:
+        paws = load_paw_arrays(h5_file, dtype=np.float64)
+    if paws is None:
+        return None
+    return PawSignals.from_raw(-paws.y)
@@ -0,0 +1,120 @@
+"""
+Манифест выходов разметки поз.
+
+После DLC для каждого видео пишется <output_dir>/<stem видео>_pose.json
+с точными путями, размерами и SHA-256 исходного видео, H5 и файла-спутника
+копыт, а также будущим путем размеченного видео. Потребители (process,
+save_annotated_video, api_find_analysis_files) открывают манифест по
+известному пути вместо glob по папке результатов, где тысячи файлов и
+где stem одного видео может быть подстрокой другого.
+"""
+
+import glob
+import json
+import os
+from pathlib import Path
+from typing import Optional, Union
+
+from web.pose_data import file_sha256, pose_file_hash, sidecar_paths
+
+MANIFEST_VERSION = 1
+MANIFEST_SUFFIX = '_pose.json'
+
+# Начало имени H5 после stem видео: DLC 2.x (<stem>DLC_...) и SuperAnimal (<stem>_superanimal_...)
+POSE_H5_TAGS = ('DLC', '_superanimal')
+
+
+def manifest_path(output_dir: Union[str, Path], video_path: Union[str, Path]) -> Path:
+    """Путь манифеста видео в папке вывода"""
+    return Path(output_dir) / f"{Path(video_path).stem}{MANIFEST_SUFFIX}"
+
+
+def find_pose_h5(video_path: Union[str, Path], output_dir: Union[str, Path]) -> Optional[Path]:
+    """H5, который DLC записал для видео (None, если его нет)
+
+    Ищется только по префиксу stem + метка DLC, поэтому видео horse
+    не подхватит H5 видео horse_2. Используется один раз, при записи
+    манифеста.
+    """
+    stem = Path(video_path).stem
+    candidates = [Path(path) for path in glob.glob(os.path.join(glob.escape(str(output_dir)),
+                                                                glob.escape(stem) + '*.h5'))]
+    tagged = [path for path in candidates if path.name[len(stem):].startswith(POSE_H5_TAGS)]
+    if not tagged:
+        return None
+    return max(tagged, key=lambda path: path.stat().st_mtime)
+
+
+def artifact(path: Union[str, Path, None], sha256: Optional[str] = None) -> Optional[dict]:
+    """Запись о файле: абсолютный путь, размер и хэш (size None - файла еще нет)"""
+    if path is None:
+        return None
+    path = Path(path).resolve()
+    if not path.exists():
+        return {'path': str(path), 'size': None, 'sha256': None}
+    return {'path': str(path), 'size': path.stat().st_size, 'sha256': sha256 or file_sha256(path)}
+
+
+def _write(path: Path, manifest: dict):
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def write_manifest(video_path: Union[str, Path], output_dir: Union[str, Path], h5_file: Union[str, Path],
+                   labeled_video: Union[str, Path, None] = None, video_sha256: Optional[str] = None) -> Path:
+    """Записать манифест после разметки поз (video_sha256 - уже посчитанный хэш видео)"""
+    sidecar_data, sidecar_header = sidecar_paths(h5_file)
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'video': artifact(video_path, sha256=video_sha256),
+        'artifacts': {
+            'h5_file': artifact(h5_file, sha256=pose_file_hash(h5_file)),
+            'paw_sidecar': artifact(sidecar_data) if sidecar_data.exists() else None,
+            'paw_sidecar_header': artifact(sidecar_header) if sidecar_header.exists() else None,
+            'labeled_video': artifact(labeled_video),
+        },
+    }
+    path = manifest_path(output_dir, video_path)
+    _write(path, manifest)
+    return path
+
+
+def read_manifest(path: Union[str, Path, None]) -> Optional[dict]:
+    """Манифест или None, если его нет, другая версия или H5 изменился"""
+    if path is None:
+        return None
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION:
+        return None
+
+    h5_entry = manifest['artifacts'].get('h5_file') or {}
+    try:
+        if os.path.getsize(h5_entry['path']) != h5_entry['size']:
+            return None
+    except (KeyError, TypeError, OSError):
+        return None
+    return manifest
+
+
+def artifact_path(manifest: Optional[dict], name: str) -> Optional[Path]:
+    """Путь файла из манифеста по имени ('h5_file', 'labeled_video', 'text_report', ...)"""
+    entry = (manifest or {}).get('artifacts', {}).get(name)
+    return Path(entry['path']) if entry else None
+
+
+def update_manifest(path: Union[str, Path], **files) -> Optional[dict]:
+    """Добавить в манифест файлы, появившиеся позже (отчеты, размеченное видео)"""
+    path = Path(path)
+    manifest = read_manifest(path)
+    if manifest is None:
+        return None
+    for name, file_path in files.items():
+        manifest['artifacts'][name] = artifact(file_path)
+    _write(path, manifest)
+    return manifest
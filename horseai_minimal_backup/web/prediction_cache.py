@@ -0,0 +1,170 @@
+"""
+Кэш предсказаний хромоты.
+
+Ключ - 12 признаков, округленные до DECIMALS знаков, плюс SHA-256 файла
+модели и режим предсказания: повторный анализ того же видео или пересчет
+в админке с неизменными признаками не запускает модель заново, а смена
+модели автоматически делает старые записи недостижимыми.
+
+Локально - LRU с ограничением размера и временем жизни записей. При
+PREDICTION_CACHE['BACKEND'] = '<алиас из CACHES>' записи дублируются в
+кэш Django (Redis, memcached, база), и промахи одного воркера
+закрываются результатами других.
+"""
+
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_MAX_SIZE = 1024
+DEFAULT_TTL = 3600
+DEFAULT_DECIMALS = 6
+
+
+def prediction_key(features: Sequence[float], model_hash: str, mode: str = '', decimals: int = DEFAULT_DECIMALS) -> str:
+    """Ключ кэша: квантованный вектор признаков, хэш модели и режим"""
+    x = np.round(np.asarray(features, dtype=np.float64), decimals) + 0.0  # -0.0 -> 0.0
+    digest = hashlib.sha256()
+    digest.update(f"{model_hash}:{mode}:{decimals}:".encode())
+    digest.update(x.tobytes())
+    return f"horseai:prediction:{digest.hexdigest()}"
+
+
+class PredictionCache:
+    """LRU результатов predict_lameness с TTL и счетчиками"""
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl: float = DEFAULT_TTL,
+                 decimals: int = DEFAULT_DECIMALS, backend: Optional[str] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.decimals = decimals
+        self.backend = backend
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, features: Sequence[float], model_hash: str, mode: str = '') -> str:
+        return prediction_key(features, model_hash, mode, self.decimals)
+
+    def _shared(self):
+        """Кэш Django или None (не настроен или недоступен)"""
+        if not self.backend:
+            return None
+        try:
+            from django.core.cache import caches
+            return caches[self.backend]
+        except Exception as e:
+            print(f"Общий кэш предсказаний недоступен: {e}")
+            self.backend = None
+            return None
+
+    def get(self, key: str) -> Optional[dict]:
+        """Копия сохраненного результата или None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+
+        shared = self._shared()
+        if shared is not None:
+            try:
+                value = shared.get(key)
+            except Exception as e:
+                print(f"Ошибка чтения общего кэша: {e}")
+                value = None
+            if value is not None:
+                self._store(key, value)
+                with self._lock:
+                    self.shared_hits += 1
+                return copy.deepcopy(value)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: dict):
+        value = copy.deepcopy(value)
+        self._store(key, value)
+        shared = self._shared()
+        if shared is not None:
+            try:
+                shared.set(key, value, timeout=self.ttl)
+            except Exception as e:
+                print(f"Ошибка записи в общий кэш: {e}")
+
+    def _store(self, key: str, value: dict):
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.max_size:
+                # Сначала вытесняются просроченные записи, затем давно не читанные
+                for stale in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                    del self._entries[stale]
+                    self.evictions += 1
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'backend': self.backend,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits + self.shared_hits) / lookups, 4) if lookups else None,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _settings() -> dict:
+    try:
+        from django.conf import settings
+        return dict(getattr(settings, 'PREDICTION_CACHE', {}))
+    except Exception:
+        return {}
+
+
+def get_prediction_cache() -> Optional[PredictionCache]:
+    """Общий кэш процесса (None, если отключен: PREDICTION_CACHE['MAX_SIZE'] = 0)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            config = _settings()
+            max_size = config.get('MAX_SIZE', DEFAULT_MAX_SIZE)
+            if not max_size:
+                return None
+            _cache = PredictionCache(
+                max_size=max_size,
+                ttl=config.get('TTL', DEFAULT_TTL),
+                decimals=config.get('DECIMALS', DEFAULT_DECIMALS),
+                backend=config.get('BACKEND'),
+            )
+        return _cache
@@ -13,6 +13,11 @@ from pathlib import Path
 import threading
 import base64
 
+from web.inference_daemon import DaemonUnavailable, analyze_video as analyze_in_daemon, daemon_enabled
+from web.labeled_video import FAILED, MISSING, PENDING, READY, request_render
+from web.pose_cache import save_upload
+from web.pose_manifest import artifact_path, read_manifest
+
 # Хранилище статусов анализа
 analysis_status = {}
 analysis_logs = {}
@@ -1030,18 +1035,17 @@ def upload_lameness_video(request):
     upload_dir = Path("/home/ais/shared/horseAI/data/input")
     upload_dir.mkdir(parents=True, exist_ok=True)
     
-    # Сохраняем видео
+    # Сохраняем видео (хэш содержимого считается при записи)
     video_path = upload_dir / f"{video_id}_{video_file.name}"
-    with open(video_path, 'wb+') as destination:
-        for chunk in video_file.chunks():
-            destination.write(chunk)
+    video_sha256 = save_upload(video_file, video_path)
     
     # Инициализируем статус анализа
     analysis_status[video_id] = {
         'status': 'processing',
         'video_name': video_file.name,
         'start_time': time.time(),
-        'video_path': str(video_path)
+        'video_path': str(video_path),
+        'video_sha256': video_sha256
     }
     
     # Запускаем анализ в отдельном потоке
@@ -1060,6 +1064,33 @@ def run_lameness_analysis(video_id, video_path):
         add_analysis_log(video_id, "🚀 Начало анализа видео")
         add_analysis_log(video_id, f"📁 Видео: {video_path.name}")
         add_analysis_log(video_id, "⏳ Инициализация анализа...")
+
+        if daemon_enabled():
+            def on_progress(event):
+                if event['type'] == 'progress':
+                    add_analysis_log(video_id, f"⏳ {event['message']}")
+                elif event['type'] == 'preview' and event.get('result'):
+                    analysis_status[video_id]['preview'] = event['result']
+                    add_analysis_log(video_id, f"👁 Предварительно: {event['result']['diagnosis']} "
+                                               f"({event['result']['lameness_probability']:.1f}%)")
+
+            try:
+                add_analysis_log(video_id, "⚡ Анализ в постоянном демоне...")
+                result_json = analyze_in_daemon(video_path, video_id=video_id, on_progress=on_progress,
+                                                timeout=300, preview=True)
+                add_analysis_log(video_id, "🎯 Результаты анализа получены")
+                analysis_status[video_id] = {
+                    'status': 'completed',
+                    'result': result_json,
+                    'processing_time': round(time.time() - analysis_status[video_id]['start_time'], 2)
+                }
+                return
+            except DaemonUnavailable as e:
+                add_analysis_log(video_id, f"⚠️ Демон недоступен ({e}), запуск детектора отдельным процессом")
+            except TimeoutError:
+                add_analysis_log(video_id, "⏰ Таймаут анализа: занял слишком много времени")
+                analysis_status[video_id] = {'status': 'timeout', 'error': 'Анализ занял слишком много времени'}
+                return
         
         # Проверяем наличие детектора
         detector_path = Path("/home/ais/shared/horseAI/final_real_detector.py")
@@ -1157,15 +1188,16 @@ def get_lameness_graphs(request, video_id):
         output_dir = Path("/home/ais/shared/horseAI/data/output")
         graphs = []
         
-        # Ищем графики для этого видео
-        pattern = f"*{video_id}*.png"
-        matches = list(output_dir.glob(pattern))
-        
-        if not matches:
-            # Ищем любые графики в output
-            matches = list(output_dir.glob("*.png"))
-            matches += list(output_dir.glob("*.jpg"))
-            matches += list(output_dir.glob("*.svg"))
+        # Демон пишет отчеты в свою папку результатов: путь графика берется
+        # из манифеста разметки этого видео или из результата
+        result = analysis_status.get(video_id, {}).get('result') or {}
+        graph = (artifact_path(read_manifest(result.get('manifest')), 'graphic_report')
+                 or result.get('graphic_report'))
+        if graph and Path(graph).exists():
+            matches = [Path(graph)]
+        else:
+            # Детектор отдельным процессом: графики с video_id в имени
+            matches = list(output_dir.glob(f"*{video_id}*.png"))
         
         for graph_path in matches[:10]:  # Ограничиваем 10 графиками
             try:
@@ -1202,14 +1234,27 @@ def download_annotated_video(request, video_id):
     try:
         output_dir = Path("/home/ais/shared/horseAI/data/output")
 
-        # Ищем файл
-        pattern = f"*{video_id}*labeled*.mp4"
-        matches = list(output_dir.glob(pattern))
-
-        if not matches:
-            return JsonResponse({'error': 'Видео не найдено'}, status=404)
-
-        video_path = matches[0]
+        # Размеченное видео из демона рисуется в фоне после первого запроса
+        result = analysis_status.get(video_id, {}).get('result') or {}
+        state = request_render(result['labeled_video']) if result.get('labeled_video') else MISSING
+        if state == PENDING:
+            response = JsonResponse({'status': 'pending', 'message': 'Видео с разметкой готовится, повторите запрос'},
+                                    status=202)
+            response['Retry-After'] = '5'
+            return response
+        if state == FAILED:
+            return JsonResponse({'error': 'Не удалось создать видео с разметкой'}, status=500)
+        video_path = Path(result['labeled_video']) if state == READY else None
+
+        if video_path is None:
+            # Ищем файл
+            pattern = f"*{video_id}*labeled*.mp4"
+            matches = list(output_dir.glob(pattern))
+
+            if not matches:
+                return JsonResponse({'error': 'Видео не найдено'}, status=404)
+
+            video_path = matches[0]
 
         response = FileResponse(open(video_path, 'rb'))
         response['Content-Type'] = 'video/mp4'
@@ -11,6 +11,9 @@ from pathlib import Path
 import subprocess
 import shutil
 
+from web.inference_daemon import DaemonUnavailable, analyze_video as analyze_in_daemon, daemon_enabled
+from web.pose_cache import save_upload
+
 class VideoProcessor:
     def __init__(self):
         self.media_root = "/home/ais/shared/horseAI/media"
@@ -30,16 +33,15 @@ class VideoProcessor:
         
         filepath = os.path.join(self.videos_dir, filename)
         
-        # Сохраняем файл
-        with open(filepath, 'wb+') as f:
-            for chunk in video_file.chunks():
-                f.write(chunk)
+        # Сохраняем файл (хэш содержимого для кэша разметки считается при записи)
+        sha256 = save_upload(video_file, filepath)
         
         return {
             'success': True,
             'filename': filename,
             'filepath': filepath,
-            'video_url': f'/media/videos/{filename}'
+            'video_url': f'/media/videos/{filename}',
+            'sha256': sha256
         }
     
     def analyze_video(self, video_path, video_id, animal_id):
@@ -52,6 +54,20 @@ class VideoProcessor:
                 # Создаем папку для результатов
                 output_dir = os.path.join(self.results_dir, f"video_{video_id}")
                 os.makedirs(output_dir, exist_ok=True)
+
+                # Постоянный демон пишет result.json в output_dir
+                if daemon_enabled():
+                    try:
+                        result = analyze_in_daemon(video_path, output_dir=output_dir, video_id=video_id)
+                        print(f"⏱️  Анализ в демоне занял: {result['processing_time']:.1f} секунд")
+                        self.update_analysis_status(video_id, True, output_dir)
+                        return
+                    except DaemonUnavailable as e:
+                        print(f"⚠️ Демон недоступен ({e}), запуск детектора отдельным процессом")
+                    except TimeoutError:
+                        print(f"⏰ Таймаут анализа видео {video_id}")
+                        self.update_analysis_status(video_id, False, "Таймаут анализа")
+                        return
                 
                 # Запускаем детектор
                 detector_script = "/home/ais/shared/horseAI/final_real_detector_correct.py"